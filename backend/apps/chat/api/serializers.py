@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from apps.chat.models import Message
+from apps.users.api.serializers import CachedUserField, CachedUserListSerializer
 
 
 class MessageUserSerializer(serializers.Serializer):
@@ -9,16 +10,9 @@ class MessageUserSerializer(serializers.Serializer):
 
 
 class MessageSerializer(serializers.ModelSerializer):
-    user = serializers.SerializerMethodField()
+    user = CachedUserField('user_id', kind='summary')
 
     class Meta:
         model = Message
         fields = ['id', 'user', 'content', 'created_at']
-
-    def get_user(self, obj):
-        user = obj.user
-        return {
-            'id': user.id,
-            'email': getattr(user, 'email', ''),
-            'name': getattr(user, 'name', ''),
-        }
+        list_serializer_class = CachedUserListSerializer
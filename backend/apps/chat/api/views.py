@@ -1,11 +1,22 @@
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Case, Count, IntegerField, OuterRef, Subquery, Value, When
+from django.http import StreamingHttpResponse
 from django.utils.dateparse import parse_datetime
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
 from apps.rooms.models import Room
-from apps.chat.models import Message
+from apps.chat.models import Message, RoomReadState
 from apps.chat.api.serializers import MessageSerializer
+from apps.chat import tickets
+from apps.chat.export import (
+    EXPORT_CHUNK_SIZE,
+    aiter_ndjson,
+    agzip_stream,
+    gzip_stream,
+    iter_ndjson,
+)
 
 
 class RoomMessagesListView(APIView):
@@ -37,3 +48,103 @@ class RoomMessagesListView(APIView):
 
         data = MessageSerializer(messages, many=True).data
         return Response({'results': data}, status=status.HTTP_200_OK)
+
+
+class RoomWebSocketTicketView(APIView):
+    """Issue a short-lived, single-use ticket for connecting to the room's WebSocket"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, room_id: int):
+        if not Room.objects.filter(id=room_id, is_active=True).exists():
+            return Response({'detail': 'Room not found.'}, status=status.HTTP_404_NOT_FOUND)
+        ttl = tickets.ticket_ttl()
+        ticket = tickets.get_store().issue(request.user, room_id, ttl)
+        return Response({'ticket': ticket, 'expires_in': ttl}, status=status.HTTP_201_CREATED)
+
+
+class RoomMessagesExportView(APIView):
+    """Stream the full history of a room as NDJSON (optionally gzip-compressed)"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, room_id: int):
+        if not Room.objects.filter(id=room_id, is_active=True).exists():
+            return Response({'detail': 'Room not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        queryset = Message.objects.filter(room_id=room_id)
+        for param, lookup in (('after', 'created_at__gte'), ('before', 'created_at__lt')):
+            value = request.query_params.get(param)
+            if value:
+                dt = parse_datetime(value)
+                if dt is None:
+                    return Response({'detail': f'Invalid "{param}" timestamp.'}, status=status.HTTP_400_BAD_REQUEST)
+                queryset = queryset.filter(**{lookup: dt})
+
+        use_gzip = request.query_params.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+        # Under ASGI a sync iterator would be drained into a list before the
+        # first byte is sent, so hand Django an async iterator there instead.
+        if isinstance(request._request, ASGIRequest):
+            chunks = aiter_ndjson(queryset, EXPORT_CHUNK_SIZE)
+            if use_gzip:
+                chunks = agzip_stream(chunks)
+        else:
+            chunks = iter_ndjson(queryset, EXPORT_CHUNK_SIZE)
+            if use_gzip:
+                chunks = gzip_stream(chunks)
+
+        # A .gz file rather than Content-Encoding: gzip, which clients would
+        # undo on download and then save plain NDJSON under the .gz name
+        content_type = 'application/gzip' if use_gzip else 'application/x-ndjson'
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        filename = f'room-{room_id}-messages.ndjson' + ('.gz' if use_gzip else '')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+UNREAD_DEFAULT_CAP = 99
+UNREAD_MAX_CAP = 999
+
+
+class RoomUnreadCountsView(APIView):
+    """Unread message counts for every room the user has a read watermark in"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            cap = int(request.query_params.get('cap', UNREAD_DEFAULT_CAP))
+            cap = max(1, min(cap, UNREAD_MAX_CAP))
+        except ValueError:
+            cap = UNREAD_DEFAULT_CAP
+
+        unread = Message.objects.filter(
+            room_id=OuterRef('room_id'),
+            id__gt=OuterRef('last_read_message_id'),
+        )
+        # The id of the (cap + 1)-th unread message, if any. When it exists the
+        # room is reported as "cap+" and the exact COUNT is never evaluated.
+        overflow = unread.order_by('id').values('id')[cap:cap + 1]
+        exact = unread.order_by().values('room_id').annotate(c=Count('id')).values('c')
+
+        states = (
+            RoomReadState.objects
+            .filter(user=request.user, room__is_active=True)
+            .annotate(overflow_id=Subquery(overflow))
+            .annotate(unread=Case(
+                When(overflow_id__isnull=False, then=Value(cap)),
+                default=Subquery(exact, output_field=IntegerField()),
+                output_field=IntegerField(),
+            ))
+            .order_by('room_id')
+            .values('room_id', 'last_read_message_id', 'overflow_id', 'unread')
+        )
+
+        results = [
+            {
+                'room_id': row['room_id'],
+                'last_read_message_id': row['last_read_message_id'],
+                'unread': row['unread'] or 0,
+                'capped': row['overflow_id'] is not None,
+            }
+            for row in states
+        ]
+        return Response({'cap': cap, 'results': results}, status=status.HTTP_200_OK)
@@ -1,72 +1,218 @@
+import asyncio
 import json
 import logging
+import random
+import time
+import uuid
 
+from django.conf import settings
 from django.utils import timezone
 
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 
+from apps.chat.drain import DRAIN_CLOSE_CODE, drainer
+from apps.chat.fanout import get_fanout
+from apps.common import profiling, query_profiler, tracing
 from apps.common.logging_utils import set_request_context
+from apps.common.metrics import (
+    channel_layer_group_send_duration,
+    channel_layer_send_failures,
+    chat_messages_received,
+    chat_messages_sent,
+    ws_connections_active,
+)
+from apps.rooms.activity import room_activity
+from apps.users.representations import user_representations
 
 
 logger = logging.getLogger('apps.chat')
 
+# Read receipts arrive once per rendered message; persist at most one
+# watermark write per connection per interval.
+READ_FLUSH_INTERVAL = 2.0
+
+
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
         self.group_name = f'room_{self.room_id}'
+        self.read_watermark = 0
+        self.saved_read_watermark = 0
+        self.read_flush_task = None
+        self.counted_connection = False
+        self.profiler = None
+        self.profile_frames_left = 0
+        self.fanout = None
 
         user = self.scope.get('user')
-        set_request_context(user_id=str(getattr(user, 'id', '-')), room_id=str(self.room_id))
-        logger.info(f"WS CONNECT room={self.room_id} user={getattr(user, 'id', '-')}")
+        # Each connection runs in its own task, so this context stays with
+        # this socket for its lifetime and follows it into DB threads.
+        set_request_context(
+            req_id=f'ws-{uuid.uuid4().hex[:9]}',
+            user_id=str(getattr(user, 'id', '-')),
+            room_id=str(self.room_id),
+        )
+        logger.info("WS CONNECT room=%s user=%s", self.room_id, getattr(user, 'id', '-'))
+
+        if drainer.is_draining():
+            logger.info("WS REJECT draining")
+            await self.close(code=DRAIN_CLOSE_CODE)
+            return
 
         if not user or not user.is_authenticated:
             logger.warning("WS REJECT unauthorized")
             await self.close(code=4401)
             return
 
-        room_exists = await self.room_exists(self.room_id)
-        if not room_exists:
+        # A connect ticket names the room it was issued for, after checking it
+        ticket_room_id = self.scope.get('ticket_room_id')
+        if ticket_room_id is not None and str(ticket_room_id) != str(self.room_id):
+            logger.warning("WS REJECT ticket_room_mismatch ticket_room=%s", ticket_room_id)
+            await self.close(code=4401)
+            return
+
+        if ticket_room_id is None and not await self.room_exists(self.room_id):
             logger.warning("WS REJECT room_not_found")
             await self.close(code=4404)
             return
 
         await self.accept()
+        ws_connections_active.inc()
+        self.counted_connection = True
         logger.info("WS ACCEPT")
+        # Register before anything else awaits, then look again: a drain that
+        # started since the check above has no other way to reach this socket
+        await drainer.register(self)
+        if drainer.is_draining():
+            logger.info("WS DRAIN during connect")
+            await self.drain(random.uniform(0, settings.WS_DRAIN_WINDOW))
+            return
         try:
-            await self.channel_layer.group_add(self.group_name, self.channel_name)
-            logger.debug(f"WS GROUP_ADD {self.group_name}")
+            if settings.CHAT_LOCAL_FANOUT:
+                self.fanout = get_fanout(self.channel_layer)
+                await self.fanout.join(self.group_name, self)
+            else:
+                await self.channel_layer.group_add(self.group_name, self.channel_name)
+            logger.debug("WS GROUP_ADD %s", self.group_name)
         except Exception as e:
-            logger.exception(f"WS GROUP_ADD failed: {e}")
+            logger.exception("WS GROUP_ADD failed: %s", e)
             await self.close(code=1011)
             return
 
     async def disconnect(self, close_code):
+        if getattr(self, 'counted_connection', False):
+            ws_connections_active.dec()
+            self.counted_connection = False
+            await drainer.unregister(self)
         try:
-            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            if getattr(self, 'fanout', None) is not None:
+                await self.fanout.leave(self.group_name, self)
+            else:
+                await self.channel_layer.group_discard(self.group_name, self.channel_name)
         except Exception:
             pass
-        logger.info(f"WS DISCONNECT code={close_code}")
+        if self.read_flush_task is not None:
+            self.read_flush_task.cancel()
+            self.read_flush_task = None
+        await self.flush_read_watermark()
+        if getattr(self, 'profiler', None) is not None:
+            await self.save_profile()
+        logger.info("WS DISCONNECT code=%s", close_code)
+
+    async def drain(self, delay: float):
+        """Flush pending work, tell the client when to reconnect, and close"""
+        if self.read_flush_task is not None:
+            self.read_flush_task.cancel()
+            self.read_flush_task = None
+        await self.flush_read_watermark()
+        try:
+            await self.send(text_data=json.dumps({'type': 'reconnect-after', 'delay_ms': int(delay * 1000)}))
+        finally:
+            await self.close(code=DRAIN_CLOSE_CODE)
 
     async def receive(self, text_data):
+        if self.profiler is not None:
+            return await self.receive_profiled(text_data)
+        with tracing.start_trace('chat.receive', room_id=str(self.room_id)):
+            if not query_profiler.enabled():
+                return await self.handle_frame(text_data)
+            with query_profiler.profile_queries(f'WS room={self.room_id}') as profile:
+                await self.handle_frame(text_data)
+            profile.log(logger)
+
+    async def receive_profiled(self, text_data):
+        profiler, self.profiler = self.profiler, None
+        profiler.start()
+        try:
+            await self.receive(text_data)
+        finally:
+            profiler.stop()
+            self.profiler = profiler
+        self.profile_frames_left -= 1
+        if self.profile_frames_left <= 0:
+            await self.save_profile()
+
+    async def start_profiling(self, payload, user):
+        """Profile the next N frames of this connection (staff or a signed token)"""
+        frames = payload.get('frames', 10)
+        if not profiling.enabled() or not (user.is_staff or profiling.valid_token(payload.get('token'))):
+            logger.warning("WS PROFILE denied")
+            return
+        if not isinstance(frames, int) or frames < 1:
+            return
+        if not profiling.claim_ws_profiler(self):
+            # The profiler hooks the whole event loop thread; one connection at a time
+            logger.warning("WS PROFILE busy")
+            return await self.send(text_data=json.dumps({'type': 'profile-busy'}))
+        self.profile_frames_left = min(frames, profiling.MAX_WS_FRAMES)
+        self.profiler = profiling.make_collector(payload.get('mode', 'cprofile'))
+        logger.info("WS PROFILE next %s frames", self.profile_frames_left)
+
+    async def save_profile(self):
+        profiler, self.profiler = self.profiler, None
+        self.profile_frames_left = 0
+        profiling.release_ws_profiler(self)
+        path = profiling.profile_path(f'ws room {self.room_id}', profiler.extension)
+        await asyncio.to_thread(profiler.write, path)
+        logger.info("WS PROFILE saved %s", path)
+        try:
+            await self.send(text_data=json.dumps({'type': 'profile-saved', 'file': path.name}))
+        except Exception:
+            pass
+
+    async def handle_frame(self, text_data):
         user = self.scope.get('user')
         if not user or not user.is_authenticated:
             logger.warning("WS DROP message unauthenticated")
             return
 
         try:
-            payload = json.loads(text_data or '{}')
+            with tracing.span('chat.parse', size=len(text_data or '')):
+                payload = json.loads(text_data or '{}')
             msg_type = payload.get('type')
             if msg_type in {"webrtc-offer", "webrtc-answer", "webrtc-ice-candidate", "webrtc-hangup"}:
                 payload.setdefault('sender_id', user.id)
-                await self.channel_layer.group_send(
-                    self.group_name,
+                await self.group_send(
                     {
                         'type': 'webrtc.signal',
                         'payload': payload,
                     }
                 )
-                logger.debug(f"WS SIGNAL type={msg_type} size={len(text_data)}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    size = len(text_data)
+                    logger.debug("WS SIGNAL type=%s size=%s", msg_type, size,
+                                 extra={'signal_type': msg_type, 'size': size})
+                return
+
+            if msg_type == 'profile':
+                await self.start_profiling(payload, user)
+                return
+
+            if msg_type == 'read':
+                message_id = payload.get('message_id')
+                if isinstance(message_id, int) and message_id > 0:
+                    self.mark_read(message_id)
                 return
 
             content = (payload.get('content') or '').strip()
@@ -76,31 +222,98 @@ class ChatConsumer(AsyncWebsocketConsumer):
             logger.exception("WS RECEIVE parse_error")
             return
 
-        message = await self.save_message(self.room_id, user.id, content)
-        logger.info(f"WS CHAT msg_id={message['id']} len={len(content)}")
+        chat_messages_received.inc()
+        with tracing.span('chat.save_message'):
+            message = await self.save_message(self.room_id, user.id, content)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("WS CHAT msg_id=%s len=%s", message['id'], len(content),
+                        extra={'msg_id': message['id'], 'length': len(content)})
+        if room_activity.has_pending():
+            room_activity.schedule_flush()
 
         event = {
             'type': 'chat.message',
             'message': {
                 'id': message['id'],
-                'user': {'id': user.id, 'email': getattr(user, 'email', ''), 'name': getattr(user, 'name', '')},
+                'user': message['user'],
                 'content': message['content'],
                 'created_at': message['created_at'],
             }
         }
-        await self.channel_layer.group_send(self.group_name, event)
+        await self.group_send(event)
+
+    async def group_send(self, event):
+        started = time.perf_counter()
+        with tracing.span('chat.group_send', event_type=event['type']) as span:
+            if span is not None:
+                # Receivers continue the trace from here (see chat_message)
+                event['traceparent'] = span.traceparent()
+            # Lets a process-level fan-out channel find the local listeners
+            event['room_group'] = self.group_name
+            try:
+                await self.channel_layer.group_send(self.group_name, event)
+            except Exception:
+                channel_layer_send_failures.inc()
+                raise
+            finally:
+                channel_layer_group_send_duration.observe(time.perf_counter() - started)
+
+    def mark_read(self, message_id: int):
+        if message_id <= self.read_watermark:
+            return
+        self.read_watermark = message_id
+        if self.read_flush_task is None:
+            self.read_flush_task = asyncio.ensure_future(self.flush_read_watermark_later())
+
+    async def flush_read_watermark_later(self):
+        await asyncio.sleep(READ_FLUSH_INTERVAL)
+        self.read_flush_task = None
+        await self.flush_read_watermark()
+
+    async def flush_read_watermark(self):
+        user = self.scope.get('user')
+        watermark = getattr(self, 'read_watermark', 0)
+        if watermark <= getattr(self, 'saved_read_watermark', 0) or not user or not user.is_authenticated:
+            return
+        try:
+            await self.save_read_watermark(self.room_id, user.id, watermark)
+            self.saved_read_watermark = watermark
+            logger.debug("WS READ watermark=%s", watermark)
+        except Exception:
+            logger.exception("WS READ save failed")
 
     async def chat_message(self, event):
-        await self.send(text_data=json.dumps(event['message']))
+        with tracing.continue_trace('chat.deliver', event.get('traceparent'),
+                                    room_id=str(self.room_id), msg_id=event['message']['id']):
+            await self.send(text_data=event.get('text') or self.render_event(event))
+        chat_messages_sent.inc()
 
     async def webrtc_signal(self, event):
-        await self.send(text_data=json.dumps(event['payload']))
+        with tracing.continue_trace('chat.deliver_signal', event.get('traceparent'), room_id=str(self.room_id)):
+            await self.send(text_data=event.get('text') or self.render_event(event))
+
+    @staticmethod
+    def render_event(event) -> str:
+        """Frame text for a group event; rendered once per process in local fan-out mode"""
+        return json.dumps(event['message'] if event['type'] == 'chat.message' else event['payload'])
 
     @database_sync_to_async
     def room_exists(self, room_id: int) -> bool:
         from apps.rooms.models import Room
         return Room.objects.filter(id=room_id, is_active=True).exists()
 
+    @database_sync_to_async
+    def save_read_watermark(self, room_id: int, user_id: int, message_id: int):
+        from apps.chat.models import RoomReadState
+        updated = RoomReadState.objects.filter(
+            room_id=room_id, user_id=user_id, last_read_message_id__lt=message_id,
+        ).update(last_read_message_id=message_id, updated_at=timezone.now())
+        if not updated:
+            RoomReadState.objects.get_or_create(
+                room_id=room_id, user_id=user_id,
+                defaults={'last_read_message_id': message_id},
+            )
+
     @database_sync_to_async
     def save_message(self, room_id: int, user_id: int, content: str):
         from apps.chat.models import Message
@@ -110,8 +323,14 @@ class ChatConsumer(AsyncWebsocketConsumer):
             content=content,
             created_at=timezone.now(),
         )
+        if room_activity.record(int(room_id), msg.created_at):
+            try:
+                room_activity.flush()
+            except Exception:
+                logger.exception("WS CHAT activity flush failed")
         return {
             'id': msg.id,
+            'user': user_representations.get('summary', user_id),
             'content': msg.content,
             'created_at': msg.created_at.isoformat(),
         }
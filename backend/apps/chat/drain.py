@@ -0,0 +1,182 @@
+"""Graceful draining of chat WebSockets before a worker restarts.
+
+Without it every socket of a restarting worker drops at once and all
+clients reconnect together, each re-running auth and the room lookup and
+refetching history. A drain instead:
+
+- refuses new sockets in this process (close code 4503);
+- tells each open socket to reconnect after a random delay within
+  WS_DRAIN_WINDOW seconds (a `reconnect-after` frame), after flushing its
+  read watermark, and closes it with code 4503;
+- writes the buffered room activity counters.
+
+It is started by WS_DRAIN_SIGNAL (SIGUSR1 by default) sent to a server
+process, or by `manage.py drain_connections`, which reaches one process
+(by host and pid) or every process with open chat sockets over the channel
+layer. A process that was not restarted accepts sockets again after
+WS_DRAIN_TIMEOUT seconds or when the drain is cancelled.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import re
+import signal
+import socket
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from apps.rooms.activity import room_activity
+
+logger = logging.getLogger('apps.chat')
+
+DRAIN_CLOSE_CODE = 4503
+CONTROL_GROUP = 'chat_control'
+
+
+def process_group(host: str = None, pid: int = None) -> str:
+    """Control group of one server process (this one by default)"""
+    host = re.sub(r'[^a-zA-Z0-9_.-]', '-', host or socket.gethostname())
+    return f'{CONTROL_GROUP}.{host}.{pid or os.getpid()}'[:99]
+
+
+class ConnectionDrainer:
+    """Process-wide registry of open ChatConsumers and the drain state"""
+
+    def __init__(self):
+        self.draining = False
+        self.drain_until = 0.0
+        self.drain_task = None
+        self.consumers = set()
+        self.loop = None
+        self.control_layer = None
+        self.control_channel = None
+        self.control_task = None
+        self.control_refresh_at = 0.0
+
+    async def register(self, consumer):
+        self.consumers.add(consumer)
+        self.loop = asyncio.get_running_loop()
+        layer = consumer.channel_layer
+        if layer is None:
+            return
+        try:
+            if self.control_layer is not layer or time.monotonic() >= self.control_refresh_at:
+                await self._listen(layer)
+        except Exception:
+            logger.exception("WS DRAIN control subscribe failed")
+
+    async def unregister(self, consumer):
+        self.consumers.discard(consumer)
+        if self.consumers or self.control_task is None:
+            return
+        layer, channel, task = self.control_layer, self.control_channel, self.control_task
+        self.control_layer = self.control_channel = self.control_task = None
+        task.cancel()
+        try:
+            await layer.group_discard(CONTROL_GROUP, channel)
+            await layer.group_discard(process_group(), channel)
+        except Exception:
+            pass
+
+    async def _listen(self, layer):
+        # Group memberships expire after group_expiry; re-add well before that.
+        # Set before awaiting so concurrent connects don't subscribe again.
+        self.control_refresh_at = time.monotonic() + getattr(layer, 'group_expiry', 86400) / 2
+        if self.control_layer is not layer:
+            if self.control_task is not None:
+                self.control_task.cancel()
+            self.control_layer = layer
+            self.control_channel = await layer.new_channel('chat.control.')
+            # Not tied to the logging context of the socket that happened to start it
+            self.control_task = asyncio.get_running_loop().create_task(
+                self._read(layer, self.control_channel), context=contextvars.Context(),
+            )
+        await layer.group_add(CONTROL_GROUP, self.control_channel)
+        await layer.group_add(process_group(), self.control_channel)
+
+    async def _read(self, layer, channel):
+        while True:
+            try:
+                message = await layer.receive(channel)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("WS DRAIN control receive failed")
+                await asyncio.sleep(1)
+                continue
+            if message.get('type') == 'chat.drain':
+                self.start_drain(message.get('window'))
+            elif message.get('type') == 'chat.undrain':
+                self.undrain()
+
+    def is_draining(self) -> bool:
+        if self.draining and time.monotonic() >= self.drain_until:
+            logger.warning("WS DRAIN expired; accepting connections again")
+            self.draining = False
+        return self.draining
+
+    def _start_draining(self):
+        self.draining = True
+        self.drain_until = time.monotonic() + settings.WS_DRAIN_TIMEOUT
+
+    def undrain(self):
+        if self.draining:
+            logger.warning("WS DRAIN cancelled; accepting connections again")
+        self.draining = False
+
+    def start_drain(self, window=None) -> asyncio.Task:
+        """Run drain() in a task kept on the drainer; a drain in progress is reused"""
+        if self.drain_task is None or self.drain_task.done():
+            self.drain_task = asyncio.get_running_loop().create_task(self.drain(window))
+            self.drain_task.add_done_callback(self._drain_done)
+        return self.drain_task
+
+    def _drain_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("WS DRAIN failed", exc_info=task.exception())
+
+    async def drain(self, window=None) -> int:
+        """Close every open socket of this process; returns how many were drained"""
+        if self.is_draining():
+            return 0
+        self._start_draining()
+        window = settings.WS_DRAIN_WINDOW if window is None else float(window)
+        consumers = list(self.consumers)
+        logger.warning("WS DRAIN start connections=%s window=%ss", len(consumers), window)
+        results = await asyncio.gather(
+            *(consumer.drain(random.uniform(0, window)) for consumer in consumers),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("WS DRAIN close failed: %r", result)
+        if room_activity.has_pending():
+            try:
+                await sync_to_async(room_activity.flush)()
+            except Exception:
+                logger.exception("WS DRAIN activity flush failed")
+        logger.warning("WS DRAIN done connections=%s", len(consumers))
+        return len(consumers)
+
+    def install_signal_handler(self):
+        """Drain on WS_DRAIN_SIGNAL; call from the server's main thread"""
+        sig = getattr(signal, settings.WS_DRAIN_SIGNAL or '', None)
+        if sig is None or threading.current_thread() is not threading.main_thread():
+            return
+        signal.signal(sig, self._on_signal)
+
+    def _on_signal(self, signum, frame):
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            # No socket has connected yet: only refuse new ones
+            self._start_draining()
+            return
+        loop.call_soon_threadsafe(self.start_drain)
+
+
+drainer = ConnectionDrainer()
@@ -0,0 +1,79 @@
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = ('id', 'user_id', 'user__email', 'user__name', 'content', 'created_at')
+
+_encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+
+def export_queryset(queryset):
+    """Narrow a Message queryset to the columns written by the export"""
+    return queryset.order_by('created_at', 'id').values_list(*EXPORT_FIELDS)
+
+
+def encode_row(row) -> str:
+    msg_id, user_id, email, name, content, created_at = row
+    return _encoder.encode({
+        'id': msg_id,
+        'user': {'id': user_id, 'email': email or '', 'name': name or ''},
+        'content': content,
+        'created_at': created_at,
+    })
+
+
+def _flush(lines) -> bytes:
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def iter_ndjson(queryset, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Yield NDJSON bytes, one piece per `chunk_size` rows, from a server-side cursor"""
+    lines = []
+    for row in export_queryset(queryset).iterator(chunk_size=chunk_size):
+        lines.append(encode_row(row))
+        if len(lines) >= chunk_size:
+            yield _flush(lines)
+            lines = []
+    if lines:
+        yield _flush(lines)
+
+
+async def aiter_ndjson(queryset, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Async counterpart of iter_ndjson so ASGI can stream without buffering.
+
+    The sync generator keeps its cursor open between pieces; each piece costs
+    one hop to the DB thread.
+    """
+    pieces = iter_ndjson(queryset, chunk_size)
+    fetch = sync_to_async(next, thread_sensitive=True)
+    while True:
+        piece = await fetch(pieces, None)
+        if piece is None:
+            break
+        yield piece
+
+
+def _gzip_compressor():
+    return zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+
+def gzip_stream(chunks):
+    compressor = _gzip_compressor()
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def agzip_stream(chunks):
+    compressor = _gzip_compressor()
+    async for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
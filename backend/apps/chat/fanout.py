@@ -0,0 +1,146 @@
+"""Process-local fan-out of room events (CHAT_LOCAL_FANOUT=true).
+
+By default every ChatConsumer joins its room group, so a group_send to a
+room with 5,000 listeners is 5,000 deliveries through the channel layer
+(5,000 Redis queue writes and reads with channels_redis). In fan-out mode
+each process subscribes one channel of its own to the group of every room
+it has listeners in and hands events to its local consumers in memory.
+Layer traffic per event then grows with the number of processes, not
+listeners, and the frame text is rendered once per process. The process
+channel renews its memberships before the layer's group_expiry on its own,
+so long-lived listeners keep receiving when nobody new joins.
+
+Events carry the group they were sent to (`room_group`, set by
+ChatConsumer.group_send), which is how the process channel picks the local
+listeners. Processes with and without fan-out can share a layer during a
+rollout: both deliver each event once per listener.
+"""
+import asyncio
+import contextvars
+import logging
+import time
+import weakref
+
+from channels.consumer import get_handler_name
+
+from apps.common.logging_utils import get_request_context, request_context
+from apps.common.metrics import chat_fanout_events, chat_fanout_rooms
+
+logger = logging.getLogger('apps.chat')
+
+_fanouts = weakref.WeakKeyDictionary()  # event loop -> RoomFanout
+
+
+class RoomFanout:
+    def __init__(self, layer):
+        self.layer = layer
+        self.channel_name = None
+        self.rooms = {}  # group -> {local consumer: its logging context}
+        self.subscribed = {}  # group -> monotonic time the membership needs refreshing
+        # Layers drop group members after group_expiry; re-add well before that
+        self.refresh_interval = getattr(layer, 'group_expiry', 86400) / 2
+        self.lock = asyncio.Lock()
+        self.reader = None
+        self.refresher = None
+
+    async def join(self, group: str, consumer):
+        self.rooms.setdefault(group, {})[consumer] = get_request_context()
+        refresh_at = self.subscribed.get(group)
+        if refresh_at is None or time.monotonic() >= refresh_at:
+            await self._sync(group)
+
+    async def leave(self, group: str, consumer):
+        members = self.rooms.get(group)
+        if members is not None:
+            members.pop(consumer, None)
+            if not members:
+                del self.rooms[group]
+        if group in self.subscribed and group not in self.rooms:
+            await self._sync(group)
+
+    async def _sync(self, group: str):
+        """Bring the layer membership of the process channel in line with self.rooms"""
+        async with self.lock:
+            now = time.monotonic()
+            if group in self.rooms:
+                if self.channel_name is None:
+                    self.channel_name = await self.layer.new_channel('chat.fanout.')
+                if self.reader is None:
+                    # Started from the first joining socket's task: don't let them
+                    # inherit that connection's logging and trace context
+                    loop = asyncio.get_running_loop()
+                    self.reader = loop.create_task(self._read(), context=contextvars.Context())
+                    self.refresher = loop.create_task(self._refresh(), context=contextvars.Context())
+                refresh_at = self.subscribed.get(group)
+                if refresh_at is None or now >= refresh_at:
+                    await self.layer.group_add(group, self.channel_name)
+                    if refresh_at is None:
+                        chat_fanout_rooms.inc()
+                        logger.debug("FANOUT SUBSCRIBE %s", group)
+                    self.subscribed[group] = now + self.refresh_interval
+            elif group in self.subscribed:
+                del self.subscribed[group]
+                chat_fanout_rooms.dec()
+                logger.debug("FANOUT UNSUBSCRIBE %s", group)
+                await self.layer.group_discard(group, self.channel_name)
+                if not self.subscribed and self.reader is not None:
+                    self.reader.cancel()
+                    self.refresher.cancel()
+                    self.reader = self.refresher = None
+
+    async def _read(self):
+        while True:
+            try:
+                event = await self.layer.receive(self.channel_name)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("FANOUT receive failed")
+                await asyncio.sleep(1)
+                continue
+            await self.deliver(event)
+
+    async def _refresh(self):
+        """Re-add memberships as they come due, even in rooms nobody joins any more"""
+        while True:
+            now = time.monotonic()
+            next_at = min(self.subscribed.values(), default=now + self.refresh_interval)
+            await asyncio.sleep(max(next_at - now, 0.01))
+            for group, refresh_at in list(self.subscribed.items()):
+                if time.monotonic() < refresh_at:
+                    continue
+                try:
+                    await self._sync(group)
+                except Exception:
+                    logger.exception("FANOUT refresh failed group=%s", group)
+
+    async def deliver(self, event: dict):
+        consumers = self.rooms.get(event.get('room_group'))
+        if not consumers:
+            return
+        chat_fanout_events.inc()
+        consumers = list(consumers.items())
+        render = getattr(consumers[0][0], 'render_event', None)
+        if render is not None:
+            # The layer may share this message with other receivers; don't mutate it
+            event = {**event, 'text': render(event)}
+        handler_name = get_handler_name(event)
+        for consumer, context in consumers:
+            handler = getattr(consumer, handler_name, None)
+            if handler is None:
+                continue
+            try:
+                # Log and trace as the receiving connection, as its own task would
+                with request_context(**context):
+                    await handler(event)
+            except Exception:
+                logger.exception("FANOUT deliver failed type=%s", event.get('type'))
+
+
+def get_fanout(layer) -> RoomFanout:
+    """The fan-out for `layer` in the running event loop"""
+    loop = asyncio.get_running_loop()
+    fanout = _fanouts.get(loop)
+    if fanout is None or fanout.layer is not layer:
+        fanout = _fanouts[loop] = RoomFanout(layer)
+    return fanout
@@ -0,0 +1,112 @@
+"""Health probe for the Redis shards behind the channel layer.
+
+Uses a minimal blocking RESP client instead of the layer's connection
+pools, so each shard is measured on its own fresh socket and the probe
+works from a management command without an event loop. For every shard it
+reports PING latency, the number of channel queues, how many of them are
+at capacity right now, and the ChannelFull counter the layer keeps there.
+"""
+import socket
+import statistics
+import time
+from urllib.parse import urlparse
+
+from apps.chat.sharding import channel_full_key
+
+
+class RedisError(Exception):
+    pass
+
+
+class RespClient:
+    def __init__(self, url: str, timeout: float = 2.0):
+        parsed = urlparse(url)
+        if parsed.scheme != 'redis':
+            raise RedisError(f'Unsupported scheme in {url!r}')
+        self.sock = socket.create_connection((parsed.hostname or '127.0.0.1', parsed.port or 6379), timeout=timeout)
+        self.reader = self.sock.makefile('rb')
+        if parsed.password:
+            self.command('AUTH', *([parsed.username] if parsed.username else []), parsed.password)
+        db = parsed.path.strip('/')
+        if db and db != '0':
+            self.command('SELECT', db)
+
+    def command(self, *args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        self.sock.sendall(b''.join(parts))
+        return self._read()
+
+    def _read(self):
+        line = self.reader.readline()
+        if not line:
+            raise RedisError('Connection closed')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise RedisError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            return self.reader.read(length + 2)[:-2]
+        if kind == b'*':
+            length = int(rest)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise RedisError(f'Unexpected reply {line!r}')
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def probe_shard(url: str, prefix: str, capacity_for, pings: int = 5, timeout: float = 2.0) -> dict:
+    """Stats for one shard; `capacity_for(channel_name)` gives the capacity of a channel"""
+    result = {'shard': url, 'ok': False}
+    try:
+        client = RespClient(url, timeout=timeout)
+    except (OSError, RedisError) as exc:
+        result['error'] = str(exc)
+        return result
+    try:
+        latencies = []
+        for _ in range(max(pings, 1)):
+            started = time.perf_counter()
+            client.command('PING')
+            latencies.append(time.perf_counter() - started)
+        result['latency_ms'] = round(statistics.median(latencies) * 1000, 3)
+        result['latency_max_ms'] = round(max(latencies) * 1000, 3)
+
+        channels = full = 0
+        group_prefix = f'{prefix}:group:'.encode()
+        stats_prefix = f'{prefix}:stats:'.encode()
+        cursor = '0'
+        while True:
+            cursor, keys = client.command('SCAN', cursor, 'MATCH', f'{prefix}*', 'COUNT', 1000)
+            for key in keys:
+                if key.startswith(group_prefix) or key.startswith(stats_prefix):
+                    continue
+                channels += 1
+                name = key[len(prefix):].decode(errors='replace')
+                if client.command('ZCARD', key) >= capacity_for(name):
+                    full += 1
+            cursor = cursor.decode() if isinstance(cursor, bytes) else str(cursor)
+            if cursor == '0':
+                break
+        result['channels'] = channels
+        result['full_channels'] = full
+        result['channel_full_total'] = int(client.command('GET', channel_full_key(prefix)) or 0)
+        result['ok'] = True
+    except (OSError, RedisError, ValueError) as exc:
+        result['error'] = str(exc)
+    finally:
+        client.close()
+    return result
@@ -0,0 +1,186 @@
+"""In-process channel layer for single-process deployments.
+
+Selected with CHANNEL_LAYER=local. Channels' InMemoryChannelLayer scans
+every channel and group on each receive and group_send, starts a task per
+member and deep-copies the message per member. This layer instead keeps:
+
+- per-channel bounded deques whose messages expire after `expiry` seconds,
+  checked at the head only (messages are queued in expiry order);
+- group membership as dicts plus a channel -> groups index, so add,
+  discard and dropping an expired channel from its groups are O(1) per
+  membership;
+- group_send as a direct loop over members that copies the message once
+  per call. Receivers share that copy and must not mutate it, which holds
+  for ChatConsumer's handlers.
+
+Idle channels and expired memberships are swept at most once per `expiry`
+interval. It only connects consumers inside one process: with several
+workers, use the Redis layer.
+"""
+import asyncio
+import collections
+import random
+import string
+import time
+from copy import deepcopy
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+from apps.chat.sharding import parse_channel_capacity
+from apps.common.metrics import channel_layer_channel_full
+
+
+class _Channel:
+    __slots__ = ('messages', 'waiters', 'capacity')
+
+    def __init__(self, capacity: int):
+        self.messages = collections.deque()  # (expires, message)
+        self.waiters = collections.deque()  # futures of blocked receive() calls
+        self.capacity = capacity
+
+
+class LocalChannelLayer(BaseChannelLayer):
+    extensions = ['groups', 'flush']
+
+    def __init__(self, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(parse_channel_capacity(channel_capacity))
+        self._full = channel_layer_channel_full.labels('local')
+        self.group_expiry = group_expiry
+        self.channels = {}
+        self.groups = {}  # group -> {channel: joined at}
+        self.memberships = {}  # channel -> set of groups
+        self._next_sweep = time.monotonic() + self.expiry
+
+    def _channel(self, name: str) -> _Channel:
+        channel = self.channels.get(name)
+        if channel is None:
+            channel = self.channels[name] = _Channel(self.get_capacity(name))
+        return channel
+
+    def _drop_expired(self, name: str, channel: _Channel, now: float):
+        messages = channel.messages
+        if messages and messages[0][0] < now:
+            while messages and messages[0][0] < now:
+                messages.popleft()
+            # Nobody is reading this channel; stop routing group messages to it
+            self._remove_from_groups(name)
+
+    def _put(self, name: str, message: dict, now: float):
+        channel = self._channel(name)
+        while channel.waiters:
+            waiter = channel.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(message)
+                return
+        self._drop_expired(name, channel, now)
+        if len(channel.messages) >= channel.capacity:
+            self._full.inc()
+            raise ChannelFull(name)
+        channel.messages.append((now + self.expiry, message))
+
+    def _maybe_sweep(self, now: float):
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.expiry
+        for name, channel in list(self.channels.items()):
+            self._drop_expired(name, channel, now)
+            if not channel.messages and not channel.waiters:
+                del self.channels[name]
+        cutoff = now - self.group_expiry
+        for group, members in list(self.groups.items()):
+            for name, joined in list(members.items()):
+                if joined < cutoff:
+                    self._discard(group, name)
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        assert '__asgi_channel__' not in message
+        now = time.monotonic()
+        self._maybe_sweep(now)
+        self._put(channel, deepcopy(message), now)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        queue = self._channel(channel)
+        now = time.monotonic()
+        self._drop_expired(channel, queue, now)
+        if queue.messages:
+            message = queue.messages.popleft()[1]
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            queue.waiters.append(waiter)
+            try:
+                message = await waiter
+            finally:
+                if not waiter.done():
+                    waiter.cancel()
+                try:
+                    queue.waiters.remove(waiter)
+                except ValueError:
+                    pass
+        if not queue.messages and not queue.waiters and self.channels.get(channel) is queue:
+            del self.channels[channel]
+        return message
+
+    async def new_channel(self, prefix='specific.'):
+        return '%s.local!%s' % (prefix, ''.join(random.choices(string.ascii_letters, k=12)))
+
+    async def flush(self):
+        for channel in self.channels.values():
+            for waiter in channel.waiters:
+                waiter.cancel()
+        self.channels = {}
+        self.groups = {}
+        self.memberships = {}
+
+    async def close(self):
+        pass
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        self.groups.setdefault(group, {})[channel] = time.monotonic()
+        self.memberships.setdefault(channel, set()).add(group)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_channel_name(channel)
+        self.require_valid_group_name(group)
+        self._discard(group, channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'Message is not a dict'
+        self.require_valid_group_name(group)
+        members = self.groups.get(group)
+        if not members:
+            return
+        now = time.monotonic()
+        self._maybe_sweep(now)
+        message = deepcopy(message)
+        for channel in list(members):
+            try:
+                self._put(channel, message, now)
+            except ChannelFull:
+                pass
+
+    def _discard(self, group, channel):
+        members = self.groups.get(group)
+        if members is not None:
+            members.pop(channel, None)
+            if not members:
+                del self.groups[group]
+        groups = self.memberships.get(channel)
+        if groups is not None:
+            groups.discard(group)
+            if not groups:
+                del self.memberships[channel]
+
+    def _remove_from_groups(self, channel):
+        for group in list(self.memberships.get(channel, ())):
+            self._discard(group, channel)
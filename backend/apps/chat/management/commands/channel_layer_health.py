@@ -0,0 +1,54 @@
+import json
+
+from channels.layers import BaseChannelLayer
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.chat.sharding import parse_channel_capacity, parse_shards
+
+
+class Command(BaseCommand):
+    help = 'Report latency, queue and ChannelFull stats for each Redis shard of the channel layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--layer', default='default', help='Channel layer alias')
+        parser.add_argument('--pings', type=int, default=5, help='PINGs per shard for the latency figure')
+        parser.add_argument('--timeout', type=float, default=2.0, help='Socket timeout per shard, in seconds')
+        parser.add_argument('--json', action='store_true', help='Print one JSON object per shard')
+
+    def handle(self, *args, **options):
+        layer = settings.CHANNEL_LAYERS.get(options['layer'])
+        if layer is None:
+            raise CommandError(f'No channel layer {options["layer"]!r}')
+        config = layer.get('CONFIG', {})
+        if 'redis' not in layer['BACKEND'].lower():
+            self.stdout.write(f'{layer["BACKEND"]} runs in-process; no shards to probe')
+            return
+
+        from apps.chat.layer_health import probe_shard
+
+        shards = parse_shards(config.get('shards') or config.get('hosts') or ['127.0.0.1:6379'])
+        prefix = config.get('prefix', 'asgi')
+        capacities = BaseChannelLayer(capacity=config.get('capacity', 100))
+        capacities.channel_capacity = capacities.compile_capacities(parse_channel_capacity(config.get('channel_capacity')))
+
+        failed = 0
+        for index, url in enumerate(shards):
+            stats = probe_shard(url, prefix, capacities.get_capacity, pings=options['pings'], timeout=options['timeout'])
+            stats['index'] = index
+            if options['json']:
+                self.stdout.write(json.dumps(stats))
+            elif stats['ok']:
+                self.stdout.write(
+                    f'shard {index} {url}: ping {stats["latency_ms"]} ms (max {stats["latency_max_ms"]}), '
+                    f'{stats["channels"]} channels, {stats["full_channels"]} full, '
+                    f'{stats["channel_full_total"]} ChannelFull since start'
+                )
+            else:
+                self.stdout.write(self.style.ERROR(f'shard {index} {url}: {stats["error"]}'))
+            failed += not stats['ok']
+
+        if failed:
+            raise CommandError(f'{failed} of {len(shards)} shards unreachable')
+        if not options['json']:
+            self.stdout.write(self.style.SUCCESS(f'{len(shards)} shards healthy'))
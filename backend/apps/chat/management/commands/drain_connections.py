@@ -0,0 +1,42 @@
+import socket
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.chat.drain import CONTROL_GROUP, process_group
+
+
+class Command(BaseCommand):
+    help = 'Ask a server process (or all of them) to drain its chat sockets before a restart'
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--pid', type=int, help='Process id of the server process to drain')
+        target.add_argument('--all', action='store_true', help='Drain every process with open chat sockets')
+        parser.add_argument('--host', default=None, help='Host of --pid (default: this host)')
+        parser.add_argument('--layer', default='default', help='Channel layer alias')
+        parser.add_argument('--window', type=float, default=None,
+                            help='Clients reconnect at random within this many seconds (default WS_DRAIN_WINDOW)')
+        parser.add_argument('--cancel', action='store_true', help='Accept connections again instead of draining')
+
+    def handle(self, *args, **options):
+        layer = get_channel_layer(options['layer'])
+        if layer is None:
+            raise CommandError(f'No channel layer {options["layer"]!r}')
+        window = settings.WS_DRAIN_WINDOW if options['window'] is None else options['window']
+        if window < 0:
+            raise CommandError('--window must not be negative')
+        if options['all']:
+            group, target = CONTROL_GROUP, 'every process'
+        else:
+            host = options['host'] or socket.gethostname()
+            group, target = process_group(host, options['pid']), f'process {options["pid"]} on {host}'
+
+        if options['cancel']:
+            async_to_sync(layer.group_send)(group, {'type': 'chat.undrain'})
+            self.stdout.write(self.style.SUCCESS(f'Drain cancelled for {target}'))
+            return
+        async_to_sync(layer.group_send)(group, {'type': 'chat.drain', 'window': window})
+        self.stdout.write(self.style.SUCCESS(f'Drain requested for {target}; clients reconnect within {window:g} s'))
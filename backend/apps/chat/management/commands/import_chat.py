@@ -0,0 +1,212 @@
+import csv
+import json
+import os
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.chat.models import ImportCheckpoint, Message
+from apps.rooms.activity import apply_activity
+from apps.rooms.models import Room
+
+User = get_user_model()
+
+
+def read_ndjson(fh):
+    for line in fh:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_csv(fh):
+    yield from csv.DictReader(fh)
+
+
+@contextmanager
+def deferred_indexes(model, enabled: bool):
+    """Drop the indexes declared in `model`'s Meta for the duration of the block and rebuild them after.
+
+    Foreign key indexes stay: the load looks rows up and cascades through them.
+    """
+    indexes = list(model._meta.indexes) if enabled else []
+    if indexes:
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.remove_index(model, index)
+    try:
+        yield [index.name for index in indexes]
+    finally:
+        if indexes:
+            with connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.add_index(model, index)
+
+
+class Command(BaseCommand):
+    help = 'Bulk import rooms and messages from an NDJSON or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file; each row has room or room_id, email, content and created_at')
+        parser.add_argument('--format', choices=['ndjson', 'csv'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--checkpoint', help='Checkpoint name (default: the absolute path of the file)')
+        parser.add_argument('--no-resume', action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument('--create-missing-users', action='store_true',
+                            help='Create inactive users with unusable passwords for unknown emails')
+        parser.add_argument('--defer-indexes', action='store_true',
+                            help='Drop secondary Message indexes during the load and rebuild them at the end')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        reader = read_csv if fmt == 'csv' else read_ndjson
+        source = (options['checkpoint'] or os.path.abspath(path))[-255:]
+
+        done = 0
+        if options['no_resume']:
+            ImportCheckpoint.objects.filter(source=source).delete()
+        else:
+            done = ImportCheckpoint.objects.filter(source=source).values_list('rows', flat=True).first() or 0
+            if done:
+                self.stdout.write(f'Resuming after row {done}')
+
+        self.create_missing_users = options['create_missing_users']
+        self.user_ids = {}
+        self.room_ids = {}
+        self.ambiguous_rooms = set()
+
+        imported = skipped = 0
+        started = time.perf_counter()
+        with open(path, newline='', encoding='utf-8') as fh, \
+                deferred_indexes(Message, options['defer_indexes']) as dropped:
+            if dropped:
+                self.stdout.write(f'Deferred indexes: {", ".join(dropped)}')
+            rows = islice(reader(fh), done, None)
+            while True:
+                chunk = list(islice(rows, batch_size))
+                if not chunk:
+                    break
+                # The checkpoint commits with the rows, so a crash can't repeat or lose a batch
+                with transaction.atomic():
+                    created, missing = self.import_chunk(chunk)
+                    ImportCheckpoint.objects.update_or_create(source=source, defaults={'rows': done + len(chunk)})
+                done += len(chunk)
+                imported += created
+                skipped += missing
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{done} rows processed, {imported} imported ({imported / elapsed:.0f} rows/s)')
+
+        elapsed = time.perf_counter() - started
+        rate = imported / elapsed if elapsed else 0
+        if self.ambiguous_rooms:
+            self.stderr.write(self.style.WARNING(
+                f'Skipped rows for room names shared by several active rooms (give room_id): '
+                f'{", ".join(sorted(self.ambiguous_rooms))}'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} messages, skipped {skipped} rows in {elapsed:.1f}s ({rate:.0f} rows/s)'
+        ))
+        ImportCheckpoint.objects.filter(source=source).delete()
+
+    def import_chunk(self, chunk):
+        self.resolve_users({(row.get('email') or '').strip() for row in chunk} - {''})
+        self.resolve_rooms(chunk)
+
+        now = timezone.now()
+        messages = []
+        skipped = 0
+        for row in chunk:
+            user_id = self.user_ids.get((row.get('email') or '').strip())
+            room_id = self.room_id(row)
+            content = (row.get('content') or '').strip()
+            if not user_id or not room_id or not content:
+                skipped += 1
+                continue
+            created_at = parse_datetime(row.get('created_at') or '') or now
+            messages.append(Message(room_id=room_id, user_id=user_id, content=content, created_at=created_at))
+
+        Message.objects.bulk_create(messages)
+
+        activity = {}
+        for msg in messages:
+            count, last_at = activity.get(msg.room_id, (0, msg.created_at))
+            activity[msg.room_id] = (count + 1, max(last_at, msg.created_at))
+        apply_activity(activity)
+        return len(messages), skipped
+
+    def resolve_users(self, emails):
+        pending = emails - self.user_ids.keys()
+        if not pending:
+            return
+        self.user_ids.update(User.objects.filter(email__in=pending).values_list('email', 'id'))
+        pending -= self.user_ids.keys()
+        if pending and self.create_missing_users:
+            unusable = make_password(None)
+            User.objects.bulk_create(
+                [User(email=email, name=email.split('@')[0], password=unusable, is_active=False) for email in pending],
+                ignore_conflicts=True,
+            )
+            self.user_ids.update(User.objects.filter(email__in=pending).values_list('email', 'id'))
+
+    @staticmethod
+    def room_key(row):
+        """('id', pk) when the row names its room by id, else ('name', name)"""
+        room_id = str(row.get('room_id') or '').strip()
+        if room_id:
+            return ('id', int(room_id)) if room_id.isdigit() else None
+        name = (row.get('room') or '').strip()
+        return ('name', name) if name else None
+
+    def room_id(self, row):
+        return self.room_ids.get(self.room_key(row))
+
+    def resolve_rooms(self, chunk):
+        pending = {}
+        for row in chunk:
+            key = self.room_key(row)
+            if key and key not in self.room_ids and key not in pending:
+                pending[key] = row
+        if not pending:
+            return
+
+        ids = [value for kind, value in pending if kind == 'id']
+        found = set(Room.objects.filter(id__in=ids, is_active=True).values_list('id', flat=True))
+        for room_id in ids:
+            self.room_ids[('id', room_id)] = room_id if room_id in found else None
+
+        # Names aren't unique: use a name only when one active room has it
+        names = {value for kind, value in pending if kind == 'name'}
+        matches = {}
+        for name, room_id in Room.objects.filter(name__in=names, is_active=True).values_list('name', 'id'):
+            matches.setdefault(name, []).append(room_id)
+        for name, room_ids in matches.items():
+            if len(room_ids) == 1:
+                self.room_ids[('name', name)] = room_ids[0]
+            else:
+                self.room_ids[('name', name)] = None
+                self.ambiguous_rooms.add(name)
+
+        to_create = []
+        for (kind, name), row in pending.items():
+            if kind != 'name' or name in matches:
+                continue
+            creator_id = self.user_ids.get((row.get('email') or '').strip())
+            if creator_id:
+                room_type = row.get('room_type') if row.get('room_type') in ('chat', 'video') else 'chat'
+                to_create.append(Room(name=name, creator_id=creator_id, room_type=room_type))
+        for room in Room.objects.bulk_create(to_create):
+            self.room_ids[('name', room.name)] = room.id
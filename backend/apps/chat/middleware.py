@@ -2,13 +2,16 @@ import logging
 from urllib.parse import parse_qs
 
 from django.contrib.auth.models import AnonymousUser
-from django.db import close_old_connections
 
 from rest_framework_simplejwt.tokens import UntypedToken
-from rest_framework_simplejwt.authentication import JWTAuthentication
 
 from channels.auth import AuthMiddlewareStack
-from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+
+from apps.chat import tickets
+from apps.common import tracing
+from apps.common.logging_utils import set_request_context
+from apps.users.authentication import RevocationCheckingJWTAuthentication
 
 logger = logging.getLogger('apps.chat')
 
@@ -16,7 +19,7 @@ logger = logging.getLogger('apps.chat')
 class TokenAuthMiddleware:
     def __init__(self, inner):
         self.inner = inner
-        self.jwt_auth = JWTAuthentication()
+        self.jwt_auth = RevocationCheckingJWTAuthentication()
 
     def _validate_and_get_user(self, raw_token):
         UntypedToken(raw_token)
@@ -28,23 +31,36 @@ class TokenAuthMiddleware:
         query_string = scope.get('query_string', b'').decode()
         params = parse_qs(query_string)
         token_list = params.get('token', [])
+        ticket_list = params.get('ticket', [])
 
         scope['user'] = AnonymousUser()
 
-        if token_list:
+        if ticket_list:
+            redeemed = await tickets.get_store().redeem(ticket_list[0])
+            if redeemed is not None:
+                user, room_id = redeemed
+                scope['user'] = user
+                scope['ticket_room_id'] = room_id
+                set_request_context(user_id=str(user.id))
+                logger.info("WS AUTH: ticket user_id=%s room=%s", user.id, room_id)
+            else:
+                logger.warning("WS AUTH: invalid or expired ticket")
+        elif token_list:
             raw_token = token_list[0]
             try:
                 logger.debug("WS AUTH: validating token present")
-                user = await sync_to_async(self._validate_and_get_user, thread_sensitive=True)(raw_token)
+                # database_sync_to_async closes stale connections around the
+                # call, so validation and cleanup share a single thread hop.
+                with tracing.start_trace('ws.auth', path=scope.get('path', '')):
+                    user = await database_sync_to_async(self._validate_and_get_user)(raw_token)
                 scope['user'] = user
-                logger.info(f"WS AUTH: success user_id={getattr(user, 'id', None)}")
+                set_request_context(user_id=str(user.id))
+                logger.info("WS AUTH: success user_id=%s", getattr(user, 'id', None))
             except Exception as e:
-                logger.warning(f"WS AUTH: failed token validation: {e}")
+                logger.warning("WS AUTH: failed token validation: %s", e)
                 scope['user'] = AnonymousUser()
-            finally:
-                await sync_to_async(close_old_connections, thread_sensitive=True)()
         else:
-            logger.warning("WS AUTH: no token provided in query string")
+            logger.warning("WS AUTH: no ticket or token provided in query string")
 
         return await self.inner(scope, receive, send)
 
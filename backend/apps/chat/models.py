@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 from apps.rooms.models import Room
 
@@ -8,10 +9,40 @@ class Message(models.Model):
     room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='messages')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='messages')
     content = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add, so imports can keep the original timestamps
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['room', 'id'], name='chat_msg_room_id_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user} @ {self.room}: {self.content[:30]}'
+
+
+class RoomReadState(models.Model):
+    """Per-user read watermark: the newest message the user has seen in a room"""
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='read_states')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='read_states')
+    last_read_message_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'room'], name='chat_readstate_user_room_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} @ {self.room}: {self.last_read_message_id}'
+
+
+class ImportCheckpoint(models.Model):
+    """Rows of an import_chat source already loaded; saved in each batch's transaction"""
+    source = models.CharField(max_length=255, unique=True)
+    rows = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.source}: {self.rows}'
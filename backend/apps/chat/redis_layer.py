@@ -0,0 +1,39 @@
+"""channels_redis layer configured from a shard list, with consistent hashing.
+
+Same protocol and key layout as RedisChannelLayer; only shard selection
+differs (see apps.chat.sharding), so every process must use the same shard
+list. Sends rejected with ChannelFull are counted per shard, both in this
+process's metrics and in a `<prefix>:stats:channel_full` counter on the
+shard, which the channel_layer_health command reports.
+"""
+import logging
+
+from channels.exceptions import ChannelFull
+from channels_redis.core import RedisChannelLayer
+
+from apps.chat.sharding import channel_full_key, parse_channel_capacity, parse_shards, shard_index
+from apps.common.metrics import channel_layer_channel_full
+
+logger = logging.getLogger('apps.chat')
+
+
+class ShardedRedisChannelLayer(RedisChannelLayer):
+    def __init__(self, shards=None, hosts=None, channel_capacity=None, **kwargs):
+        if shards is not None:
+            hosts = parse_shards(shards)
+        super().__init__(hosts=hosts, channel_capacity=parse_channel_capacity(channel_capacity), **kwargs)
+
+    def consistent_hash(self, value):
+        return shard_index(value, self.ring_size)
+
+    async def send(self, channel, message):
+        try:
+            await super().send(channel, message)
+        except ChannelFull:
+            index = self.consistent_hash(self.non_local_name(channel))
+            channel_layer_channel_full.labels(str(index)).inc()
+            try:
+                await self.connection(index).incr(channel_full_key(self.prefix))
+            except Exception:
+                logger.debug("LAYER channel_full counter update failed shard=%s", index)
+            raise
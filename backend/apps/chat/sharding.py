@@ -0,0 +1,61 @@
+"""Channel layer configuration helpers: Redis shard lists, consistent hashing, capacities.
+
+CHANNEL_REDIS_SHARDS lists the Redis servers channels and groups are spread
+over, e.g. `redis://10.0.0.1:6379/0, redis://10.0.0.2:6379/0` (a bare
+`host:port` works too). Names are placed with jump consistent hashing, so
+appending a shard moves only about 1/N of the channels and groups instead
+of reshuffling most of them.
+CHANNEL_LAYER_CHANNEL_CAPACITY holds per-channel capacities as
+`pattern=capacity` pairs, e.g. `http.request=200, websocket.send!*=20`.
+"""
+import hashlib
+
+
+def parse_shards(value) -> list:
+    """Redis URLs from a comma- or whitespace-separated string (or a list)"""
+    items = value.replace(',', ' ').split() if isinstance(value, str) else list(value or ())
+    shards = []
+    for item in items:
+        if '://' not in item:
+            host, _, port = item.partition(':')
+            item = f'redis://{host}:{port or 6379}/0'
+        shards.append(item)
+    return shards
+
+
+def parse_channel_capacity(value) -> dict:
+    """{pattern: capacity} from 'pattern=capacity, ...' (a dict is returned as is)"""
+    if not isinstance(value, str):
+        return dict(value or {})
+    capacities = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        pattern, sep, capacity = item.partition('=')
+        if not sep or not pattern.strip():
+            raise ValueError(f'Invalid channel capacity {item!r}; expected pattern=capacity')
+        capacities[pattern.strip()] = int(capacity)
+    return capacities
+
+
+def _jump_hash(key: int, buckets: int) -> int:
+    # Lamping & Veach, "A Fast, Minimal Memory, Consistent Hash Algorithm"
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+def shard_index(name, shards: int) -> int:
+    if shards <= 1:
+        return 0
+    if isinstance(name, str):
+        name = name.encode('utf-8')
+    return _jump_hash(int.from_bytes(hashlib.blake2b(name, digest_size=8).digest(), 'big'), shards)
+
+
+def channel_full_key(prefix: str) -> str:
+    """Per-shard Redis counter of sends rejected with ChannelFull"""
+    return f'{prefix}:stats:channel_full'
@@ -4,12 +4,14 @@ from channels.testing import WebsocketCommunicator
 from channels.db import database_sync_to_async
 from django.test import override_settings
 import json
+import os
 import time
 import asyncio
 
 from apps.chat.consumers import ChatConsumer
 from apps.rooms.models import Room
-from apps.chat.models import Message
+from apps.chat.models import Message, RoomReadState
+from apps.rooms.activity import room_activity
 
 User = get_user_model()
 
@@ -134,6 +136,10 @@ class ChatConsumerTest(TestCase):
         
         message_count = await database_sync_to_async(Message.objects.filter(room=self.room).count)()
         self.assertEqual(message_count, 1)
+        await database_sync_to_async(room_activity.flush)()
+        await database_sync_to_async(self.room.refresh_from_db)()
+        self.assertEqual(self.room.message_count, 1)
+        self.assertIsNotNone(self.room.last_message_at)
         
         await communicator.disconnect()
     
@@ -262,3 +268,299 @@ class ChatConsumerTest(TestCase):
         
         await communicator.disconnect()
 
+
+    async def test_read_watermark_saved_on_disconnect(self):
+        """Test read frames are coalesced and the highest id is persisted"""
+        token = await self.get_access_token(self.user)
+        communicator = WebsocketCommunicator(
+            self.application,
+            f'/ws/chat/{self.room.id}/?token={token}'
+        )
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+
+        for message_id in (3, 7, 5):
+            await communicator.send_json_to({'type': 'read', 'message_id': message_id})
+        await communicator.disconnect()
+
+        state = await database_sync_to_async(RoomReadState.objects.get)(room=self.room, user=self.user)
+        self.assertEqual(state.last_read_message_id, 7)
+
+    async def test_read_watermark_never_moves_backwards(self):
+        """Test a stale read frame does not lower a stored watermark"""
+        await database_sync_to_async(RoomReadState.objects.create)(
+            room=self.room, user=self.user, last_read_message_id=10
+        )
+        token = await self.get_access_token(self.user)
+        communicator = WebsocketCommunicator(
+            self.application,
+            f'/ws/chat/{self.room.id}/?token={token}'
+        )
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+
+        await communicator.send_json_to({'type': 'read', 'message_id': 4})
+        await communicator.disconnect()
+
+        state = await database_sync_to_async(RoomReadState.objects.get)(room=self.room, user=self.user)
+        self.assertEqual(state.last_read_message_id, 10)
+
+    async def test_connection_and_message_metrics(self):
+        """Test the consumer records connection and message metrics"""
+        from apps.common.metrics import ws_connections_active, chat_messages_received, chat_messages_sent
+        active, received, sent = ws_connections_active.labels().value, chat_messages_received.labels().value, chat_messages_sent.labels().value
+        token = await self.get_access_token(self.user)
+        communicator = WebsocketCommunicator(
+            self.application,
+            f'/ws/chat/{self.room.id}/?token={token}'
+        )
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(ws_connections_active.labels().value, active + 1)
+
+        await communicator.send_json_to({'type': 'chat-message', 'content': 'Hi'})
+        await communicator.receive_json_from()
+        self.assertEqual(chat_messages_received.labels().value, received + 1)
+        self.assertEqual(chat_messages_sent.labels().value, sent + 1)
+
+        await communicator.disconnect()
+        self.assertEqual(ws_connections_active.labels().value, active)
+
+    async def test_chat_message_traced(self):
+        """Test a sampled message records receive, save, send and delivery spans in one trace"""
+        from unittest import mock
+        from apps.common import tracing
+        exported = []
+        token = await self.get_access_token(self.user)
+        with self.settings(TRACE_SAMPLE_RATE=1.0), mock.patch.object(tracing, 'export', exported.append):
+            communicator = WebsocketCommunicator(
+                self.application,
+                f'/ws/chat/{self.room.id}/?token={token}'
+            )
+            connected, subprotocol = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.send_json_to({'type': 'chat-message', 'content': 'Hi'})
+            response = await communicator.receive_json_from()
+            await communicator.disconnect()
+
+        self.assertNotIn('traceparent', response)
+        names = [[s.name for s in trace.spans] for trace in exported]
+        self.assertIn(['ws.auth'], names)
+        self.assertIn(['chat.receive', 'chat.parse', 'chat.save_message', 'chat.group_send'], names)
+        self.assertIn(['chat.deliver'], names)
+        receive = next(t for t in exported if t.spans[0].name == 'chat.receive')
+        deliver = next(t for t in exported if t.spans[0].name == 'chat.deliver')
+        self.assertEqual(deliver.trace_id, receive.trace_id)
+        self.assertEqual(deliver.spans[0].parent_id, receive.spans[3].span_id)
+
+    async def test_profile_next_frames(self):
+        """Test a staff user can profile the next frames of a connection"""
+        import tempfile
+        from pathlib import Path
+        staff = await database_sync_to_async(User.objects.create_user)(
+            email='staff@example.com', name='Staff', password='pass123', is_staff=True,
+        )
+        token = await self.get_access_token(staff)
+        with tempfile.TemporaryDirectory() as log_dir, \
+                self.settings(REQUEST_PROFILING_ENABLED=True, LOG_DIR=Path(log_dir)):
+            communicator = WebsocketCommunicator(
+                self.application,
+                f'/ws/chat/{self.room.id}/?token={token}'
+            )
+            connected, subprotocol = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.send_json_to({'type': 'profile', 'frames': 1})
+            await communicator.send_json_to({'type': 'chat-message', 'content': 'Hi'})
+            frames = [await communicator.receive_json_from(), await communicator.receive_json_from()]
+            await communicator.disconnect()
+            saved = next(f for f in frames if f.get('type') == 'profile-saved')
+            self.assertIn('Hi', [f.get('content') for f in frames])
+            self.assertTrue((Path(log_dir) / 'profiles' / saved['file']).exists())
+
+    async def test_profile_refused_while_another_connection_profiles(self):
+        """Test a second connection cannot profile while one already does"""
+        import tempfile
+        from pathlib import Path
+        staff = await database_sync_to_async(User.objects.create_user)(
+            email='staff@example.com', name='Staff', password='pass123', is_staff=True,
+        )
+        token = await self.get_access_token(staff)
+        with tempfile.TemporaryDirectory() as log_dir, \
+                self.settings(REQUEST_PROFILING_ENABLED=True, LOG_DIR=Path(log_dir)):
+            first = WebsocketCommunicator(self.application, f'/ws/chat/{self.room.id}/?token={token}')
+            second = WebsocketCommunicator(self.application, f'/ws/chat/{self.room.id}/?token={token}')
+            await first.connect()
+            await second.connect()
+            await first.send_json_to({'type': 'profile', 'frames': 5})
+            self.assertTrue(await first.receive_nothing())
+            await second.send_json_to({'type': 'profile', 'frames': 5})
+            self.assertEqual(await second.receive_json_from(), {'type': 'profile-busy'})
+            await first.disconnect()
+            await second.send_json_to({'type': 'profile', 'frames': 5})
+            self.assertTrue(await second.receive_nothing())
+            await second.disconnect()
+
+    async def test_profile_denied_for_regular_user(self):
+        """Test non-staff users without a token cannot start profiling"""
+        token = await self.get_access_token(self.user)
+        with self.settings(REQUEST_PROFILING_ENABLED=True):
+            communicator = WebsocketCommunicator(
+                self.application,
+                f'/ws/chat/{self.room.id}/?token={token}'
+            )
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'profile', 'frames': 1})
+            await communicator.send_json_to({'type': 'chat-message', 'content': 'Hi'})
+            await communicator.receive_json_from()
+            self.assertTrue(await communicator.receive_nothing())
+            await communicator.disconnect()
+
+    async def test_connect_with_ticket(self):
+        """Test a ticket connects without JWT validation or a room lookup, and only once"""
+        from unittest import mock
+        from apps.chat.middleware import TokenAuthMiddleware
+        from apps.chat.tickets import get_store
+        ticket = get_store().issue(self.user, self.room.id, 10)
+        with mock.patch.object(TokenAuthMiddleware, '_validate_and_get_user') as validate, \
+                mock.patch.object(ChatConsumer, 'room_exists') as room_exists:
+            communicator = WebsocketCommunicator(self.application, f'/ws/chat/{self.room.id}/?ticket={ticket}')
+            connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        validate.assert_not_called()
+        room_exists.assert_not_called()
+        await communicator.disconnect()
+
+        reused = WebsocketCommunicator(self.application, f'/ws/chat/{self.room.id}/?ticket={ticket}')
+        connected, _ = await reused.connect()
+        self.assertFalse(connected)
+        await reused.disconnect()
+
+    async def test_ticket_bound_to_room(self):
+        """Test a ticket for one room cannot open another"""
+        from apps.chat.tickets import get_store
+        other = await database_sync_to_async(Room.objects.create)(name='Other', creator=self.creator)
+        ticket = get_store().issue(self.user, self.room.id, 10)
+        communicator = WebsocketCommunicator(self.application, f'/ws/chat/{other.id}/?ticket={ticket}')
+        connected, code = await communicator.connect()
+        self.assertFalse(connected)
+        self.assertEqual(code, 4401)
+        await communicator.disconnect()
+
+    async def test_expired_ticket_rejected(self):
+        from apps.chat.tickets import get_store
+        ticket = get_store().issue(self.user, self.room.id, -1)
+        communicator = WebsocketCommunicator(self.application, f'/ws/chat/{self.room.id}/?ticket={ticket}')
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+        await communicator.disconnect()
+
+    @override_settings(
+        WS_TICKET_CACHE='tickets',
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'tickets': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'ws-tickets'},
+        },
+    )
+    async def test_connect_with_shared_store_ticket(self):
+        """Test tickets kept in a Django cache are redeemed once"""
+        from apps.chat.tickets import get_store
+        ticket = get_store().issue(self.user, self.room.id, 10)
+        communicator = WebsocketCommunicator(self.application, f'/ws/chat/{self.room.id}/?ticket={ticket}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.disconnect()
+        self.assertIsNone(await get_store().redeem(ticket))
+
+    @override_settings(CHAT_LOCAL_FANOUT=True)
+    async def test_local_fanout(self):
+        """Test listeners in one process share a single group membership"""
+        from channels.layers import get_channel_layer
+        communicators = []
+        for user in (self.user, self.creator):
+            token = await self.get_access_token(user)
+            communicator = WebsocketCommunicator(self.application, f'/ws/chat/{self.room.id}/?token={token}')
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            communicators.append(communicator)
+        layer = get_channel_layer()
+        self.assertEqual(len(layer.groups[f'room_{self.room.id}']), 1)
+
+        await communicators[0].send_json_to({'type': 'chat-message', 'content': 'Hello, all'})
+        for communicator in communicators:
+            response = await communicator.receive_json_from()
+            self.assertEqual(response['content'], 'Hello, all')
+
+        for communicator in communicators:
+            await communicator.disconnect()
+        self.assertNotIn(f'room_{self.room.id}', layer.groups)
+
+    async def test_drain(self):
+        """Test draining flushes watermarks, sends reconnect-after frames and refuses new sockets"""
+        from asgiref.sync import sync_to_async
+        from django.core.management import call_command
+        from apps.chat.drain import DRAIN_CLOSE_CODE, drainer
+        communicators = []
+        for user in (self.user, self.creator):
+            token = await self.get_access_token(user)
+            communicator = WebsocketCommunicator(self.application, f'/ws/chat/{self.room.id}/?token={token}')
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            communicators.append(communicator)
+        await communicators[0].send_json_to({'type': 'read', 'message_id': 7})
+        await asyncio.sleep(0.05)
+
+        try:
+            # Another process is not affected
+            await sync_to_async(call_command)('drain_connections', pid=os.getpid() + 1, window=2)
+            self.assertTrue(await communicators[0].receive_nothing())
+            self.assertFalse(drainer.is_draining())
+
+            await sync_to_async(call_command)('drain_connections', pid=os.getpid(), window=2)
+            for communicator in communicators:
+                frame = await communicator.receive_json_from()
+                self.assertEqual(frame['type'], 'reconnect-after')
+                self.assertTrue(0 <= frame['delay_ms'] <= 2000)
+                closed = await communicator.receive_output()
+                self.assertEqual(closed, {'type': 'websocket.close', 'code': DRAIN_CLOSE_CODE})
+            self.assertTrue(drainer.is_draining())
+
+            state = await database_sync_to_async(RoomReadState.objects.get)(room=self.room, user=self.user)
+            self.assertEqual(state.last_read_message_id, 7)
+
+            token = await self.get_access_token(self.user)
+            late = WebsocketCommunicator(self.application, f'/ws/chat/{self.room.id}/?token={token}')
+            connected, code = await late.connect()
+            self.assertFalse(connected)
+            self.assertEqual(code, DRAIN_CLOSE_CODE)
+        finally:
+            drainer.undrain()
+            for communicator in communicators:
+                await communicator.disconnect()
+        self.assertEqual(drainer.consumers, set())
+        self.assertIsNone(drainer.control_task)
+
+    async def test_drain_started_during_connect(self):
+        """Test a socket accepted while a drain begins is drained too"""
+        from unittest import mock
+        from apps.chat.drain import DRAIN_CLOSE_CODE, drainer
+        register = drainer.register
+
+        async def register_as_drain_starts(consumer):
+            # The drain has taken its snapshot of the sockets without this one
+            await drainer.drain(window=0)
+            await register(consumer)
+
+        token = await self.get_access_token(self.user)
+        communicator = WebsocketCommunicator(self.application, f'/ws/chat/{self.room.id}/?token={token}')
+        try:
+            with mock.patch.object(drainer, 'register', register_as_drain_starts):
+                connected, _ = await communicator.connect()
+                self.assertTrue(connected)
+                frame = await communicator.receive_json_from()
+                self.assertEqual(frame['type'], 'reconnect-after')
+                closed = await communicator.receive_output()
+                self.assertEqual(closed, {'type': 'websocket.close', 'code': DRAIN_CLOSE_CODE})
+        finally:
+            drainer.undrain()
+            await communicator.disconnect()
+        self.assertEqual(drainer.consumers, set())
@@ -0,0 +1,85 @@
+import asyncio
+import signal
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.chat.drain import ConnectionDrainer, process_group
+
+
+class FakeConsumer:
+    channel_layer = None
+
+    def __init__(self):
+        self.delays = []
+
+    async def drain(self, delay):
+        self.delays.append(delay)
+
+
+class ConnectionDrainerTest(SimpleTestCase):
+    """Test ConnectionDrainer"""
+
+    def setUp(self):
+        self.drainer = ConnectionDrainer()
+
+    async def test_drain_spreads_reconnects_over_window(self):
+        consumers = [FakeConsumer() for _ in range(20)]
+        for consumer in consumers:
+            await self.drainer.register(consumer)
+        self.assertEqual(await self.drainer.drain(window=5), 20)
+        delays = [consumer.delays[0] for consumer in consumers]
+        self.assertTrue(all(0 <= delay <= 5 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+        self.assertEqual(await self.drainer.drain(window=5), 0)
+
+    async def test_start_drain_keeps_one_task(self):
+        """Test drain requests share the task kept on the drainer until it finishes"""
+        await self.drainer.register(FakeConsumer())
+        task = self.drainer.start_drain(window=0)
+        self.assertIs(self.drainer.start_drain(window=0), task)
+        self.assertEqual(await task, 1)
+        self.assertIsNot(self.drainer.start_drain(window=0), task)
+
+    async def test_failed_drain_is_logged(self):
+        with mock.patch.object(self.drainer, 'drain', mock.AsyncMock(side_effect=RuntimeError('boom'))), \
+                self.assertLogs('apps.chat', 'ERROR') as logs:
+            task = self.drainer.start_drain()
+            await asyncio.gather(task, return_exceptions=True)
+            await asyncio.sleep(0)
+        self.assertIn('WS DRAIN failed', logs.output[0])
+
+    def test_signal_without_connections_refuses_new_sockets(self):
+        self.drainer._on_signal(signal.SIGUSR1, None)
+        self.assertTrue(self.drainer.is_draining())
+
+    @override_settings(WS_DRAIN_TIMEOUT=0)
+    async def test_drain_expires(self):
+        await self.drainer.drain(window=0)
+        self.assertFalse(self.drainer.is_draining())
+
+    async def test_undrain(self):
+        await self.drainer.drain(window=0)
+        self.assertTrue(self.drainer.is_draining())
+        self.drainer.undrain()
+        self.assertFalse(self.drainer.is_draining())
+
+    def test_process_group_is_a_valid_group_name(self):
+        from channels.layers import BaseChannelLayer
+        group = process_group('web-1.example.com:8000', 1234)
+        self.assertTrue(group.endswith('.1234'))
+        self.assertTrue(BaseChannelLayer().require_valid_group_name(group))
+
+    async def test_signal_drains_on_server_loop(self):
+        consumer = FakeConsumer()
+        await self.drainer.register(consumer)
+        self.drainer._on_signal(signal.SIGUSR1, None)
+        for _ in range(10):
+            await asyncio.sleep(0)
+        self.assertEqual(len(consumer.delays), 1)
+
+    @override_settings(WS_DRAIN_SIGNAL='')
+    def test_signal_handler_disabled(self):
+        previous = signal.getsignal(signal.SIGUSR1)
+        self.drainer.install_signal_handler()
+        self.assertIs(signal.getsignal(signal.SIGUSR1), previous)
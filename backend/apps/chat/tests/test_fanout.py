@@ -0,0 +1,106 @@
+import asyncio
+
+from channels.layers import InMemoryChannelLayer
+from django.test import SimpleTestCase
+
+from apps.chat.fanout import RoomFanout, get_fanout
+
+
+class FakeConsumer:
+    def __init__(self):
+        self.frames = []
+
+    @staticmethod
+    def render_event(event):
+        return event['message']['content']
+
+    async def chat_message(self, event):
+        self.frames.append(event['text'])
+
+
+class CountingLayer(InMemoryChannelLayer):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.deliveries = 0
+
+    async def receive(self, channel):
+        message = await super().receive(channel)
+        self.deliveries += 1
+        return message
+
+
+class RoomFanoutTest(SimpleTestCase):
+    """Test RoomFanout"""
+
+    def setUp(self):
+        self.layer = CountingLayer()
+
+    async def wait_for(self, condition):
+        for _ in range(100):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        self.fail('condition not met')
+
+    async def test_one_layer_delivery_per_process(self):
+        processes = [RoomFanout(self.layer) for _ in range(2)]
+        consumers = [FakeConsumer() for _ in range(6)]
+        for i, consumer in enumerate(consumers):
+            await processes[i % 2].join('room_1', consumer)
+        self.assertEqual(len(self.layer.groups['room_1']), 2)
+
+        await self.layer.group_send('room_1', {'type': 'chat.message', 'room_group': 'room_1', 'message': {'content': 'hi'}})
+        await self.wait_for(lambda: all(c.frames for c in consumers))
+        self.assertEqual([c.frames for c in consumers], [['hi']] * 6)
+        self.assertEqual(self.layer.deliveries, 2)
+
+        for i, consumer in enumerate(consumers):
+            await processes[i % 2].leave('room_1', consumer)
+        self.assertNotIn('room_1', self.layer.groups)
+        self.assertTrue(all(process.reader is None for process in processes))
+
+    async def test_delivery_uses_receiving_connection_context(self):
+        from apps.common.logging_utils import get_request_context, set_request_context
+        seen = {}
+
+        class ContextConsumer(FakeConsumer):
+            async def chat_message(self, event):
+                seen[self] = get_request_context().get('req_id')
+
+        fanout = RoomFanout(self.layer)
+        first, second = ContextConsumer(), ContextConsumer()
+        set_request_context(req_id='ws-first')
+        await fanout.join('room_1', first)
+        set_request_context(req_id='ws-second')
+        await fanout.join('room_1', second)
+        message = {'type': 'chat.message', 'room_group': 'room_1', 'message': {'content': 'hi'}}
+        await self.layer.group_send('room_1', message)
+        await self.wait_for(lambda: len(seen) == 2)
+        self.assertEqual(seen, {first: 'ws-first', second: 'ws-second'})
+        self.assertNotIn('text', message)
+        await fanout.leave('room_1', first)
+        await fanout.leave('room_1', second)
+
+    async def test_events_for_other_rooms_ignored(self):
+        fanout = RoomFanout(self.layer)
+        consumer = FakeConsumer()
+        await fanout.join('room_1', consumer)
+        await fanout.deliver({'type': 'chat.message', 'room_group': 'room_2', 'message': {'content': 'x'}})
+        self.assertEqual(consumer.frames, [])
+        await fanout.leave('room_1', consumer)
+
+    async def test_membership_refreshed_before_group_expiry(self):
+        """Test memberships are renewed while listeners stay, without new joins"""
+        fanout = RoomFanout(self.layer)
+        fanout.refresh_interval = 0.05
+        consumer = FakeConsumer()
+        await fanout.join('room_1', consumer)
+        joined = self.layer.groups['room_1'][fanout.channel_name]
+        await self.wait_for(lambda: self.layer.groups['room_1'][fanout.channel_name] > joined)
+        await fanout.leave('room_1', consumer)
+        self.assertIsNone(fanout.refresher)
+
+    async def test_get_fanout_per_layer(self):
+        fanout = get_fanout(self.layer)
+        self.assertIs(get_fanout(self.layer), fanout)
+        self.assertIsNot(get_fanout(CountingLayer()), fanout)
@@ -0,0 +1,183 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.test import TestCase, TransactionTestCase
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+
+from apps.rooms.models import Room
+from apps.chat.models import ImportCheckpoint, Message
+
+User = get_user_model()
+
+
+def write_file(suffix, content):
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+        fh.write(content)
+    return path
+
+
+def ndjson(rows):
+    return ''.join(json.dumps(row) + '\n' for row in rows)
+
+
+class ImportChatCommandTest(TestCase):
+    """Test the import_chat management command"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='user@example.com',
+            name='Test User',
+            password='pass123'
+        )
+        self.room = Room.objects.create(
+            name='General',
+            creator=self.user,
+            room_type='chat'
+        )
+        self.paths = []
+
+    def tearDown(self):
+        for path in self.paths:
+            os.remove(path)
+
+    def make_file(self, suffix, content):
+        path = write_file(suffix, content)
+        self.paths.append(path)
+        return path
+
+    def run_command(self, *args, **kwargs):
+        out = StringIO()
+        call_command('import_chat', *args, stdout=out, **kwargs)
+        return out.getvalue()
+
+    def test_import_ndjson(self):
+        """Test NDJSON rows are imported into existing and new rooms"""
+        path = self.make_file('.ndjson', ndjson([
+            {'room': 'General', 'email': 'user@example.com', 'content': 'Hello', 'created_at': '2020-01-01T10:00:00Z'},
+            {'room': 'Archive', 'email': 'user@example.com', 'content': 'Old news', 'created_at': '2020-01-01T11:00:00Z'},
+            {'room': 'General', 'email': 'user@example.com', 'content': 'World', 'created_at': '2020-01-01T12:00:00Z'},
+        ]))
+        output = self.run_command(path, batch_size=2)
+        self.assertIn('Imported 3 messages', output)
+        self.assertIn('rows/s', output)
+        self.assertEqual(Message.objects.filter(room=self.room).count(), 2)
+        archive = Room.objects.get(name='Archive')
+        self.assertEqual(archive.creator, self.user)
+        first = Message.objects.filter(room=self.room).order_by('created_at').first()
+        self.assertEqual(first.created_at.year, 2020)
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_import_csv(self):
+        """Test CSV input is detected from the extension"""
+        path = self.make_file('.csv', (
+            'room,email,content,created_at\n'
+            'General,user@example.com,From CSV,2021-05-01T00:00:00Z\n'
+        ))
+        self.run_command(path)
+        self.assertTrue(Message.objects.filter(content='From CSV').exists())
+
+    def test_unknown_users_are_skipped(self):
+        """Test rows for unknown emails are skipped by default"""
+        path = self.make_file('.ndjson', ndjson([
+            {'room': 'General', 'email': 'ghost@example.com', 'content': 'Boo'},
+        ]))
+        output = self.run_command(path)
+        self.assertIn('skipped 1 rows', output)
+        self.assertEqual(Message.objects.count(), 0)
+
+    def test_create_missing_users(self):
+        """Test unknown emails become inactive users when requested"""
+        path = self.make_file('.ndjson', ndjson([
+            {'room': 'General', 'email': 'ghost@example.com', 'content': 'Boo'},
+        ]))
+        self.run_command(path, create_missing_users=True)
+        ghost = User.objects.get(email='ghost@example.com')
+        self.assertFalse(ghost.is_active)
+        self.assertFalse(ghost.has_usable_password())
+        self.assertEqual(Message.objects.filter(user=ghost).count(), 1)
+
+    def test_resume_from_checkpoint(self):
+        """Test rows already recorded in the checkpoint are not imported again"""
+        path = self.make_file('.ndjson', ndjson([
+            {'room': 'General', 'email': 'user@example.com', 'content': f'Message {i}'} for i in range(4)
+        ]))
+        ImportCheckpoint.objects.create(source=os.path.abspath(path), rows=3)
+        output = self.run_command(path)
+        self.assertIn('Resuming after row 3', output)
+        self.assertEqual(list(Message.objects.values_list('content', flat=True)), ['Message 3'])
+
+    def test_checkpoint_commits_with_batch(self):
+        """Test a failed batch rolls back its checkpoint along with its rows"""
+        from unittest import mock
+        from apps.chat.management.commands.import_chat import Command
+        path = self.make_file('.ndjson', ndjson([
+            {'room': 'General', 'email': 'user@example.com', 'content': f'Message {i}'} for i in range(4)
+        ]))
+        original = Command.import_chunk
+        calls = []
+
+        def failing_second_batch(command, chunk):
+            calls.append(chunk)
+            result = original(command, chunk)
+            if len(calls) == 2:
+                raise RuntimeError('crash')
+            return result
+
+        with mock.patch.object(Command, 'import_chunk', failing_second_batch), self.assertRaises(RuntimeError):
+            self.run_command(path, batch_size=2)
+        self.assertEqual(ImportCheckpoint.objects.get().rows, 2)
+        self.assertEqual(Message.objects.count(), 2)
+
+        self.run_command(path, batch_size=2)
+        self.assertEqual(Message.objects.count(), 4)
+
+    def test_room_id_and_ambiguous_names(self):
+        """Test rows can name rooms by id, and shared names are not guessed"""
+        twin = Room.objects.create(name='General', creator=self.user)
+        path = self.make_file('.ndjson', ndjson([
+            {'room_id': twin.id, 'email': 'user@example.com', 'content': 'By id'},
+            {'room': 'General', 'email': 'user@example.com', 'content': 'By name'},
+            {'room_id': 999999, 'email': 'user@example.com', 'content': 'Nowhere'},
+        ]))
+        err = StringIO()
+        output = self.run_command(path, stderr=err)
+        self.assertIn('skipped 2 rows', output)
+        self.assertIn('General', err.getvalue())
+        self.assertEqual(list(Message.objects.values_list('room_id', 'content')), [(twin.id, 'By id')])
+        self.assertEqual(Room.objects.filter(name='General').count(), 2)
+
+    def test_missing_file(self):
+        """Test a missing input file raises CommandError"""
+        with self.assertRaises(CommandError):
+            self.run_command('/nonexistent/file.ndjson')
+
+
+class ImportChatDeferredIndexesTest(TransactionTestCase):
+    """Test import_chat --defer-indexes (schema changes need to run outside a transaction)"""
+
+    def test_indexes_are_rebuilt(self):
+        user = User.objects.create_user(email='user@example.com', name='Test User', password='pass123')
+        Room.objects.create(name='General', creator=user)
+        path = write_file('.ndjson', ndjson([
+            {'room': 'General', 'email': 'user@example.com', 'content': 'Hello'},
+        ]))
+        self.addCleanup(os.remove, path)
+
+        def index_names():
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, Message._meta.db_table)
+            return {name for name, info in constraints.items() if info['index'] and not info['primary_key']}
+
+        before = index_names()
+        out = StringIO()
+        call_command('import_chat', path, defer_indexes=True, stdout=out)
+        # Only the declared indexes; foreign key indexes stay in place
+        self.assertIn('Deferred indexes: chat_msg_room_id_idx\n', out.getvalue())
+        self.assertEqual(index_names(), before)
+        self.assertEqual(Message.objects.count(), 1)
@@ -0,0 +1,118 @@
+import asyncio
+from unittest import mock
+
+from channels.exceptions import ChannelFull
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.chat.layers import LocalChannelLayer
+from apps.rooms.models import Room
+
+User = get_user_model()
+
+
+class LocalChannelLayerTest(SimpleTestCase):
+    """Test LocalChannelLayer"""
+
+    def setUp(self):
+        self.layer = LocalChannelLayer(capacity=3, expiry=60, channel_capacity={'small.*': 1})
+
+    async def test_send_receive(self):
+        await self.layer.send('test.channel', {'type': 'a'})
+        await self.layer.send('test.channel', {'type': 'b'})
+        self.assertEqual(await self.layer.receive('test.channel'), {'type': 'a'})
+        self.assertEqual(await self.layer.receive('test.channel'), {'type': 'b'})
+        self.assertNotIn('test.channel', self.layer.channels)
+
+    async def test_receive_waits_for_send(self):
+        channel = await self.layer.new_channel()
+        receiver = asyncio.ensure_future(self.layer.receive(channel))
+        await asyncio.sleep(0)
+        await self.layer.send(channel, {'type': 'hello'})
+        self.assertEqual(await asyncio.wait_for(receiver, 1), {'type': 'hello'})
+
+    async def test_capacity(self):
+        for i in range(3):
+            await self.layer.send('test.channel', {'type': 'm', 'i': i})
+        with self.assertRaises(ChannelFull):
+            await self.layer.send('test.channel', {'type': 'm'})
+        await self.layer.send('small.one', {'type': 'm'})
+        with self.assertRaises(ChannelFull):
+            await self.layer.send('small.one', {'type': 'm'})
+
+    async def test_expired_messages_dropped_and_channel_leaves_groups(self):
+        await self.layer.group_add('room_1', 'stale.channel')
+        await self.layer.send('stale.channel', {'type': 'old'})
+        with mock.patch('apps.chat.layers.time.monotonic', return_value=10 ** 9):
+            await self.layer.send('stale.channel', {'type': 'new'})
+        self.assertNotIn('room_1', self.layer.groups)
+        self.assertEqual(await self.layer.receive('stale.channel'), {'type': 'new'})
+
+    async def test_group_send_fans_out_one_copy(self):
+        await self.layer.group_add('room_1', 'a.channel')
+        await self.layer.group_add('room_1', 'b.channel')
+        await self.layer.group_add('room_2', 'c.channel')
+        message = {'type': 'chat.message', 'message': {'id': 1}}
+        await self.layer.group_send('room_1', message)
+        first = await self.layer.receive('a.channel')
+        second = await self.layer.receive('b.channel')
+        self.assertEqual(first, message)
+        self.assertIsNot(first, message)
+        self.assertIs(first, second)
+        self.assertNotIn('c.channel', self.layer.channels)
+
+    async def test_group_send_skips_full_members(self):
+        await self.layer.group_add('room_1', 'small.full')
+        await self.layer.group_add('room_1', 'test.ok')
+        await self.layer.send('small.full', {'type': 'm'})
+        await self.layer.group_send('room_1', {'type': 'g'})
+        self.assertEqual(await self.layer.receive('test.ok'), {'type': 'g'})
+
+    async def test_group_discard_and_flush(self):
+        await self.layer.group_add('room_1', 'a.channel')
+        await self.layer.group_discard('room_1', 'a.channel')
+        self.assertEqual(self.layer.groups, {})
+        self.assertEqual(self.layer.memberships, {})
+        await self.layer.group_add('room_1', 'a.channel')
+        await self.layer.send('a.channel', {'type': 'm'})
+        await self.layer.flush()
+        self.assertEqual(self.layer.channels, {})
+        self.assertEqual(self.layer.groups, {})
+
+    async def test_group_expiry(self):
+        layer = LocalChannelLayer(expiry=1, group_expiry=10)
+        await layer.group_add('room_1', 'a.channel')
+        with mock.patch('apps.chat.layers.time.monotonic', return_value=10 ** 9):
+            await layer.group_send('room_1', {'type': 'g'})
+        self.assertNotIn('room_1', layer.groups)
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'apps.chat.layers.LocalChannelLayer'}},
+    DEBUG=True,
+    ALLOWED_HOSTS=['testserver'],
+)
+class LocalChannelLayerChatTest(TestCase):
+    """Test chat fan-out between two sockets over LocalChannelLayer"""
+
+    def setUp(self):
+        from channels.routing import URLRouter
+        from apps.chat.middleware import TokenAuthMiddlewareStack
+        from apps.chat.routing import websocket_urlpatterns
+        self.application = TokenAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+        self.user = User.objects.create_user(email='user@example.com', name='User', password='pass12345')
+        self.room = Room.objects.create(name='Room', creator=self.user)
+
+    async def test_message_reaches_other_socket(self):
+        token = str(AccessToken.for_user(self.user))
+        sockets = [WebsocketCommunicator(self.application, f'/ws/chat/{self.room.id}/?token={token}') for _ in range(2)]
+        for socket in sockets:
+            connected, _ = await socket.connect()
+            self.assertTrue(connected)
+        await sockets[0].send_json_to({'type': 'chat-message', 'content': 'Hi'})
+        for socket in sockets:
+            self.assertEqual((await socket.receive_json_from(timeout=2))['content'], 'Hi')
+        for socket in sockets:
+            await socket.disconnect()
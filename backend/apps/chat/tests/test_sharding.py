@@ -0,0 +1,142 @@
+import fnmatch
+import importlib.util
+import io
+import json
+import socketserver
+import threading
+import unittest
+from collections import Counter
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, override_settings
+
+from apps.chat.sharding import parse_channel_capacity, parse_shards, shard_index
+
+
+class RedisStandIn(socketserver.ThreadingTCPServer):
+    """Just enough of Redis (RESP2) for the channel layer health probe"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), RedisStandInHandler)
+        self.zsets = {}
+        self.strings = {}
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f'redis://127.0.0.1:{self.server_address[1]}/0'
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class RedisStandInHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+            self.wfile.write(self.reply(args[0].decode().upper(), args[1:]))
+
+    def reply(self, command, args):
+        store = self.server
+        if command == 'PING':
+            return b'+PONG\r\n'
+        if command == 'SCAN':
+            pattern = args[args.index(b'MATCH') + 1].decode()
+            keys = [k for k in list(store.zsets) + list(store.strings) if fnmatch.fnmatchcase(k, pattern)]
+            body = b''.join(b'$%d\r\n%s\r\n' % (len(k.encode()), k.encode()) for k in keys)
+            return b'*2\r\n$1\r\n0\r\n*%d\r\n%s' % (len(keys), body)
+        if command == 'ZCARD':
+            return b':%d\r\n' % store.zsets.get(args[0].decode(), 0)
+        if command == 'GET':
+            value = store.strings.get(args[0].decode())
+            return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value.encode())
+        return b'-ERR unknown command\r\n'
+
+
+class ShardingHelpersTest(SimpleTestCase):
+    """Test shard list parsing, capacities and consistent hashing"""
+
+    def test_parse_shards(self):
+        self.assertEqual(
+            parse_shards('redis://a:6380/1, b:6379  c'),
+            ['redis://a:6380/1', 'redis://b:6379/0', 'redis://c:6379/0'],
+        )
+
+    def test_parse_channel_capacity(self):
+        self.assertEqual(parse_channel_capacity('http.request=200, websocket.send!*=20'),
+                         {'http.request': 200, 'websocket.send!*': 20})
+        self.assertEqual(parse_channel_capacity(''), {})
+        with self.assertRaises(ValueError):
+            parse_channel_capacity('oops')
+
+    def test_shard_index_is_balanced_and_stable(self):
+        names = [f'specific.{i}!' for i in range(4000)]
+        counts = Counter(shard_index(name, 4) for name in names)
+        self.assertEqual(set(counts), {0, 1, 2, 3})
+        self.assertGreater(min(counts.values()), 800)
+        moved = sum(shard_index(name, 4) != shard_index(name, 5) for name in names)
+        # Adding a fifth shard moves about a fifth of the names, all onto the new shard
+        self.assertLess(moved, 1000)
+        self.assertTrue(all(shard_index(n, 5) == 4 for n in names if shard_index(n, 4) != shard_index(n, 5)))
+
+    @unittest.skipUnless(importlib.util.find_spec('channels_redis'), 'channels_redis is not installed')
+    def test_sharded_layer_uses_consistent_hash(self):
+        from apps.chat.redis_layer import ShardedRedisChannelLayer
+        layer = ShardedRedisChannelLayer(shards='a:6379, b:6379, c:6379', channel_capacity='small.*=1')
+        self.assertEqual(layer.ring_size, 3)
+        self.assertEqual(layer.consistent_hash('room_1'), shard_index('room_1', 3))
+
+
+class ChannelLayerHealthCommandTest(SimpleTestCase):
+    """Test the channel_layer_health command against Redis stand-ins"""
+
+    def setUp(self):
+        self.shards = [RedisStandIn(), RedisStandIn()]
+        for shard in self.shards:
+            self.addCleanup(shard.stop)
+        self.shards[0].zsets.update({'asgispecific.a!': 2, 'asgispecific.b!': 5, 'asgi:group:room_1': 2})
+        self.shards[0].strings['asgi:stats:channel_full'] = '7'
+        self.shards[1].zsets.update({'asgismall.x': 1})
+
+    def layers(self, shards):
+        return {'default': {
+            'BACKEND': 'apps.chat.redis_layer.ShardedRedisChannelLayer',
+            'CONFIG': {'shards': shards, 'capacity': 5, 'channel_capacity': 'small.*=1'},
+        }}
+
+    def test_reports_each_shard(self):
+        out = io.StringIO()
+        with override_settings(CHANNEL_LAYERS=self.layers(','.join(s.url for s in self.shards))):
+            call_command('channel_layer_health', '--json', '--pings', '2', stdout=out)
+        first, second = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertTrue(first['ok'])
+        self.assertEqual((first['channels'], first['full_channels'], first['channel_full_total']), (2, 1, 7))
+        self.assertGreaterEqual(first['latency_ms'], 0)
+        self.assertEqual((second['channels'], second['full_channels'], second['channel_full_total']), (1, 1, 0))
+
+    def test_unreachable_shard_fails(self):
+        dead = RedisStandIn()
+        dead_url = dead.url
+        dead.stop()
+        out = io.StringIO()
+        with override_settings(CHANNEL_LAYERS=self.layers(f'{self.shards[0].url},{dead_url}')):
+            with self.assertRaises(CommandError):
+                call_command('channel_layer_health', '--timeout', '0.5', stdout=out)
+        self.assertIn('shard 0', out.getvalue())
+
+    def test_local_layer_has_nothing_to_probe(self):
+        out = io.StringIO()
+        with override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'apps.chat.layers.LocalChannelLayer'}}):
+            call_command('channel_layer_health', stdout=out)
+        self.assertIn('in-process', out.getvalue())
@@ -1,10 +1,15 @@
-from django.test import TestCase
+import gzip
+import json
+from datetime import timedelta
+
+from django.test import TestCase, AsyncClient
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
 from apps.rooms.models import Room
-from apps.chat.models import Message
+from apps.chat.models import Message, RoomReadState
 
 User = get_user_model()
 
@@ -138,3 +143,172 @@ class RoomMessagesListViewTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertGreaterEqual(len(response.data['results']), 1)
 
+
+
+class RoomMessagesExportViewTest(TestCase):
+    """Test RoomMessagesExportView"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='user@example.com',
+            name='Test User',
+            password='pass123'
+        )
+        self.room = Room.objects.create(
+            name='Test Room',
+            creator=self.user,
+            room_type='chat'
+        )
+        base = timezone.now() - timedelta(hours=3)
+        for i in range(3):
+            msg = Message.objects.create(room=self.room, user=self.user, content=f'Message {i}')
+            Message.objects.filter(id=msg.id).update(created_at=base + timedelta(hours=i))
+        self.base = base
+        self.url = f'/api/rooms/{self.room.id}/messages/export/'
+
+    def _lines(self, response):
+        body = b''.join(response.streaming_content)
+        return [json.loads(line) for line in body.decode().splitlines()]
+
+    def test_export_streams_ndjson(self):
+        """Test export returns every message as one JSON object per line"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = self._lines(response)
+        self.assertEqual([r['content'] for r in rows], ['Message 0', 'Message 1', 'Message 2'])
+        self.assertEqual(rows[0]['user'], {'id': self.user.id, 'email': 'user@example.com', 'name': 'Test User'})
+
+    def test_export_gzip(self):
+        """Test export can be downloaded as a gzip file"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {'gzip': '1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('.ndjson.gz', response['Content-Disposition'])
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(len(body.decode().splitlines()), 3)
+
+    def test_export_time_range(self):
+        """Test export honours after/before bounds"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {
+            'after': (self.base + timedelta(minutes=30)).isoformat(),
+            'before': (self.base + timedelta(hours=2)).isoformat(),
+        })
+        rows = self._lines(response)
+        self.assertEqual([r['content'] for r in rows], ['Message 1'])
+
+    def test_export_invalid_timestamp(self):
+        """Test export rejects an invalid bound"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {'after': 'not-a-date'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_inactive_room(self):
+        """Test export of an inactive room returns 404"""
+        self.room.is_active = False
+        self.room.save()
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_export_unauthorized(self):
+        """Test export requires authentication"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_export_async_iterator_under_asgi(self):
+        """Test ASGI requests get an async iterator instead of a buffered list"""
+        token = str(AccessToken.for_user(self.user))
+        client = AsyncClient()
+        response = await client.get(self.url, headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_async)
+        body = b''
+        async for chunk in response.streaming_content:
+            body += chunk
+        self.assertEqual(len(body.decode().splitlines()), 3)
+
+
+class RoomUnreadCountsViewTest(TestCase):
+    """Test RoomUnreadCountsView"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='user@example.com',
+            name='Test User',
+            password='pass123'
+        )
+        self.quiet_room = Room.objects.create(name='Quiet', creator=self.user)
+        self.busy_room = Room.objects.create(name='Busy', creator=self.user)
+        quiet = [Message.objects.create(room=self.quiet_room, user=self.user, content=f'q{i}') for i in range(3)]
+        busy = [Message.objects.create(room=self.busy_room, user=self.user, content=f'b{i}') for i in range(6)]
+        RoomReadState.objects.create(room=self.quiet_room, user=self.user, last_read_message_id=quiet[0].id)
+        RoomReadState.objects.create(room=self.busy_room, user=self.user, last_read_message_id=busy[0].id)
+
+    def test_unread_counts(self):
+        """Test unread counts are returned per room"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/rooms/unread/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        counts = {r['room_id']: (r['unread'], r['capped']) for r in response.data['results']}
+        self.assertEqual(counts, {self.quiet_room.id: (2, False), self.busy_room.id: (5, False)})
+
+    def test_unread_counts_capped(self):
+        """Test counts above the cap are reported as capped"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/rooms/unread/', {'cap': 3})
+        self.assertEqual(response.data['cap'], 3)
+        counts = {r['room_id']: (r['unread'], r['capped']) for r in response.data['results']}
+        self.assertEqual(counts, {self.quiet_room.id: (2, False), self.busy_room.id: (3, True)})
+
+    def test_unread_counts_single_query(self):
+        """Test all rooms are counted in one query"""
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(1):
+            self.client.get('/api/rooms/unread/')
+
+    def test_unread_counts_skip_inactive_rooms(self):
+        """Test inactive rooms are left out"""
+        self.busy_room.is_active = False
+        self.busy_room.save()
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/rooms/unread/')
+        self.assertEqual([r['room_id'] for r in response.data['results']], [self.quiet_room.id])
+
+    def test_unread_counts_unauthorized(self):
+        """Test unread counts require authentication"""
+        response = self.client.get('/api/rooms/unread/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class RoomWebSocketTicketViewTest(TestCase):
+    """Test RoomWebSocketTicketView"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='user@example.com', name='Test User', password='pass123')
+        self.room = Room.objects.create(name='Test Room', creator=self.user, room_type='chat')
+        self.client.force_authenticate(user=self.user)
+
+    def test_issue_ticket(self):
+        response = self.client.post(f'/api/rooms/{self.room.id}/ws-ticket/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data['ticket'])
+        self.assertGreater(response.data['expires_in'], 0)
+
+    def test_inactive_room_not_found(self):
+        self.room.is_active = False
+        self.room.save()
+        response = self.client.post(f'/api/rooms/{self.room.id}/ws-ticket/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_requires_authentication(self):
+        response = APIClient().post(f'/api/rooms/{self.room.id}/ws-ticket/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
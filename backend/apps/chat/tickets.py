@@ -0,0 +1,82 @@
+"""Single-use WebSocket connect tickets.
+
+POST /api/rooms/<id>/ws-ticket/ checks the JWT, the user and the room once
+and returns a random ticket that is valid for WS_TICKET_TTL seconds. The
+client connects with `?ticket=...`; TokenAuthMiddleware redeems it with one
+lookup and the consumer trusts the room it names, so a connect needs no JWT
+decode and no queries. Redeeming removes the ticket, so it works once.
+
+By default tickets live in this process (a dict), which is enough when
+HTTP and WebSocket traffic reach the same process. Set WS_TICKET_CACHE to a
+Django cache alias backed by a shared store (e.g. Redis) when they do not.
+"""
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+CACHE_PREFIX = 'ws-ticket:'
+
+
+def ticket_ttl() -> float:
+    return getattr(settings, 'WS_TICKET_TTL', 10)
+
+
+class LocalTicketStore:
+    PURGE_EVERY = 1024
+
+    def __init__(self):
+        self._tickets = {}  # ticket -> (user, room_id, expires)
+        self._issued = 0
+        self._lock = threading.Lock()
+
+    def issue(self, user, room_id: int, ttl: float) -> str:
+        ticket = secrets.token_urlsafe(24)
+        with self._lock:
+            self._issued += 1
+            if self._issued % self.PURGE_EVERY == 0:
+                # Tickets that were never redeemed
+                now = time.monotonic()
+                self._tickets = {t: entry for t, entry in self._tickets.items() if entry[2] > now}
+            self._tickets[ticket] = (user, room_id, time.monotonic() + ttl)
+        return ticket
+
+    async def redeem(self, ticket):
+        """(user, room_id) for a live ticket, or None; the ticket is used up either way"""
+        entry = self._tickets.pop(ticket, None)
+        if entry is None or entry[2] < time.monotonic():
+            return None
+        return entry[0], entry[1]
+
+    def __len__(self):
+        return len(self._tickets)
+
+
+class CacheTicketStore:
+    def __init__(self, alias: str):
+        self.alias = alias
+
+    def issue(self, user, room_id: int, ttl: float) -> str:
+        ticket = secrets.token_urlsafe(24)
+        caches[self.alias].set(CACHE_PREFIX + ticket, (user, room_id), timeout=ttl)
+        return ticket
+
+    async def redeem(self, ticket):
+        cache = caches[self.alias]
+        key = CACHE_PREFIX + ticket
+        entry = await cache.aget(key)
+        # Of two concurrent redeemers only one deletes the key
+        if entry is None or not await cache.adelete(key):
+            return None
+        return entry
+
+
+_local_store = LocalTicketStore()
+
+
+def get_store():
+    alias = getattr(settings, 'WS_TICKET_CACHE', '')
+    return CacheTicketStore(alias) if alias else _local_store
@@ -0,0 +1,16 @@
+from asgiref.sync import sync_to_async
+
+from apps.common.logging_utils import start_log_queues, stop_log_queues
+
+
+async def lifespan_app(scope, receive, send):
+    """ASGI lifespan protocol: start/stop process-wide background services"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            start_log_queues()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await sync_to_async(stop_log_queues, thread_sensitive=False)()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
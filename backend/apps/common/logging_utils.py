@@ -1,47 +1,287 @@
+import atexit
+import contextlib
+import contextvars
+import functools
+import json
 import logging
+import queue
+import random
 import re
 import threading
+import weakref
+from logging.handlers import QueueHandler, QueueListener
 
-_local = threading.local()
+# One immutable dict per context. asyncio tasks (one per socket) and
+# asgiref's sync_to_async copy contexts, so values follow the work across
+# coroutines and executor threads without leaking between connections.
+_context = contextvars.ContextVar('request_context', default={})
 
 SENSITIVE_KEYS = {"password", "confirm_password", "token", "refresh", "authorization"}
 
+
+class Redactor:
+    """Precompiled masking of credentials in log messages.
+
+    Almost no log line carries anything to mask, so the work is front-loaded
+    into cheap rejections: a substring precheck, then one combined regex
+    search. Only messages that do contain a secret go through the masking
+    passes, which are compiled once and applied in the same order as before
+    so the output is unchanged.
+    """
+
+    HEADER = r'(Authorization|Cookie)\s*=\s*[^\s,;]+(?:\s+[^\s,;]+)*'
+    KEY = r'(\"?{key}\"?\s*[:=]\s*)(\".*?\"|[^,}}\s]+)'
+    BARE_TOKEN = r'\btoken\w+\b'
+
+    def __init__(self, keys=SENSITIVE_KEYS):
+        keys = [k.lower() for k in keys]
+        self.header_re = re.compile(self.HEADER, re.IGNORECASE)
+        self.key_res = [re.compile(self.KEY.format(key=re.escape(k)), re.IGNORECASE) for k in keys]
+        self.bare_token_re = re.compile(self.BARE_TOKEN, re.IGNORECASE)
+        key_alt = '|'.join(re.escape(k) for k in sorted(keys, key=len, reverse=True))
+        self.detect_re = re.compile(
+            '|'.join([self.HEADER, self.KEY.format(key=f'(?:{key_alt})'), self.BARE_TOKEN] if keys
+                     else [self.HEADER, self.BARE_TOKEN]),
+            re.IGNORECASE,
+        )
+        self.triggers = tuple(sorted(set(keys) | {'authorization', 'cookie', 'token'}))
+
+    def redact(self, msg: str) -> str:
+        lowered = msg.lower()
+        if not any(trigger in lowered for trigger in self.triggers):
+            return msg
+        if self.detect_re.search(msg) is None:
+            return msg
+        msg = self.header_re.sub(r'\1=***', msg)
+        for key_re in self.key_res:
+            msg = key_re.sub(r'\1***', msg)
+        return self.bare_token_re.sub('***', msg)
+
+
+@functools.lru_cache(maxsize=None)
+def get_redactor(keys=None) -> Redactor:
+    return Redactor(SENSITIVE_KEYS if keys is None else keys)
+
+
 class RequestContextFilter(logging.Filter):
     def filter(self, record: logging.LogRecord) -> bool:
-        record.req_id = getattr(_local, 'req_id', '-')
-        record.user_id = getattr(_local, 'user_id', '-')
-        record.room_id = getattr(_local, 'room_id', '-')
+        ctx = _context.get()
+        record.req_id = ctx.get('req_id', '-')
+        record.user_id = ctx.get('user_id', '-')
+        record.room_id = ctx.get('room_id', '-')
         return True
 
 class SensitiveDataFilter(logging.Filter):
-    header_re = re.compile(r"(Authorization|Cookie)\s*=\s*[^\s,;]+(?:\s+[^\s,;]+)*", re.IGNORECASE)
+    def __init__(self, name: str = '', keys=None):
+        super().__init__(name)
+        self.redactor = get_redactor(None if keys is None else frozenset(keys))
 
     def filter(self, record: logging.LogRecord) -> bool:
+        # The same record passes through every handler; mask it only once
+        if getattr(record, '_redacted', False):
+            return True
         try:
             msg = str(record.getMessage())
         except TypeError:
             msg = str(record.msg % record.args if record.args else record.msg)
         
-        msg = self.header_re.sub(r"\1=***", msg)
-        for key in SENSITIVE_KEYS:
-            pattern = re.compile(r'(\"?' + re.escape(key) + r'\"?\s*[:=]\s*)(\".*?\"|[^,}\s]+)', re.IGNORECASE)
-            msg = pattern.sub(r'\1***', msg)
-        msg = re.sub(r'\btoken\w+\b', '***', msg, flags=re.IGNORECASE)
-        record.msg = msg
+        record.msg = self.redactor.redact(msg)
         record.args = ()
+        record._redacted = True
         return True
 
 
-def set_request_context(req_id: str = None, user_id: str = None, room_id: str = None):
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_RECORD_ATTRS = frozenset(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {
+    'message', 'asctime', 'req_id', 'user_id', 'room_id',
+}
+
+
+def event_type(record: logging.LogRecord) -> str:
+    """`extra={'event': ...}` if given, else the first two words of the unformatted message ("WS SIGNAL")"""
+    event = getattr(record, 'event', None)
+    if event is None:
+        msg = record.msg
+        event = ' '.join(msg.split(' ', 2)[:2]).rstrip(':') if isinstance(msg, str) else type(msg).__name__
+    return event
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of records per event type.
+
+    Decided on the unformatted record, so a sampled-out record is never
+    formatted, redacted or queued. WARNING and above are always kept.
+    `rates` is a dict or a 'WS SIGNAL=0.01,WS CHAT=0.5' string.
+    """
+
+    def __init__(self, name: str = '', rates=None, default: float = 1.0):
+        super().__init__(name)
+        self.rates = parse_sample_rates(rates) if isinstance(rates, str) else dict(rates or {})
+        self.default = default
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rates.get(event_type(record), self.default)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.dropped += 1
+        return False
+
+
+def parse_sample_rates(value: str) -> dict:
+    """'WS SIGNAL=0.01,WS CHAT=0.5' -> {'WS SIGNAL': 0.01, 'WS CHAT': 0.5}"""
+    rates = {}
+    for item in (value or '').split(','):
+        event, sep, rate = item.rpartition('=')
+        if sep and event.strip():
+            rates[event.strip()] = float(rate)
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, event, message, request context and `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': event_type(record),
+            'message': record.getMessage(),
+            'req_id': getattr(record, 'req_id', '-'),
+            'user_id': getattr(record, 'user_id', '-'),
+            'room_id': getattr(record, 'room_id', '-'),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key not in data and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exc_info'] = record.exc_text
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+def _merged(req_id, user_id, room_id) -> dict:
+    ctx = dict(_context.get())
     if req_id is not None:
-        _local.req_id = req_id
+        ctx['req_id'] = req_id
     if user_id is not None:
-        _local.user_id = user_id
+        ctx['user_id'] = user_id
     if room_id is not None:
-        _local.room_id = room_id
+        ctx['room_id'] = room_id
+    return ctx
+
+
+def set_request_context(req_id: str = None, user_id: str = None, room_id: str = None):
+    _context.set(_merged(req_id, user_id, room_id))
 
 
 def clear_request_context():
-    for k in ('req_id', 'user_id', 'room_id'):
-        if hasattr(_local, k):
-            delattr(_local, k)
+    _context.set({})
+
+
+def get_request_context() -> dict:
+    return dict(_context.get())
+
+
+@contextlib.contextmanager
+def request_context(req_id: str = None, user_id: str = None, room_id: str = None):
+    """Scope context values to a block and restore the previous ones afterwards"""
+    token = _context.set(_merged(req_id, user_id, room_id))
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def bind_context(func):
+    """Wrap `func` to run in a copy of the caller's context.
+
+    sync_to_async and asyncio.to_thread already do this; use it for plain
+    executors, e.g. loop.run_in_executor(None, bind_context(fn)).
+    """
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+_queue_handlers = weakref.WeakSet()
+
+
+class _BlockingSentinelListener(QueueListener):
+    # The stock listener uses put_nowait() for its stop sentinel, which fails
+    # on a full bounded queue; waiting for the drain is what we want there.
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Hands records to a background thread that owns the real handlers.
+
+    The calling thread (usually the event loop) only formats the message and
+    does a non-blocking put. When the queue is full the record is dropped and
+    counted instead of waiting on a slow disk.
+    """
+
+    def __init__(self, handlers, maxsize: int = 10000):
+        super().__init__(queue.Queue(maxsize))
+        # Resolve targets now and hold them: logging._handlers only keeps weak
+        # references. dictConfig builds handlers in name order, so targets must
+        # sort before the queue handlers that use them.
+        self.targets = []
+        for target in handlers:
+            if isinstance(target, str):
+                if target not in logging._handlers:
+                    raise ValueError(f'Log handler {target!r} is not configured (or sorts after this one)')
+                target = logging._handlers[target]
+            self.targets.append(target)
+        self.listener = None
+        self.dropped = 0
+        self._listener_lock = threading.Lock()
+        _queue_handlers.add(self)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        if self.listener is None:
+            self.start()
+        super().emit(record)
+
+    def start(self):
+        with self._listener_lock:
+            if self.listener is not None:
+                return
+            self.listener = _BlockingSentinelListener(self.queue, *self.targets, respect_handler_level=True)
+            self.listener.start()
+
+    def stop(self):
+        with self._listener_lock:
+            listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
+
+
+def start_log_queues():
+    for handler in list(_queue_handlers):
+        handler.start()
+
+
+def stop_log_queues():
+    """Drain every queue and join the listener threads"""
+    for handler in list(_queue_handlers):
+        handler.stop()
+
+
+def log_queue_stats() -> dict:
+    return {
+        handler.name or str(id(handler)): {'queued': handler.queue.qsize(), 'dropped': handler.dropped}
+        for handler in list(_queue_handlers)
+    }
+
+
+atexit.register(stop_log_queues)
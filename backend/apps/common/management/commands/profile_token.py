@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.common.profiling import TOKEN_MAX_AGE, make_token
+
+
+class Command(BaseCommand):
+    help = 'Print a signed X-Profile header value for on-demand request profiling'
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_token())
+        self.stderr.write(f'Valid for {TOKEN_MAX_AGE}s. Send it as "X-Profile: <token>" or as "token" in a WS profile frame.')
@@ -0,0 +1,282 @@
+"""In-process metrics with Prometheus text exposition.
+
+Recording is a dict lookup plus a few integer/float updates with no locks:
+under the GIL a concurrent increment can very rarely be lost, which is an
+acceptable trade for keeping the event loop and request threads unblocked.
+Children are created once per label value and cached, so steady-state
+recording does not allocate.
+"""
+import bisect
+import contextvars
+import time
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _fmt(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class _Metric:
+    kind = ''
+    child_class = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        if not self.labelnames:
+            self._default = self._children[()] = self._new_child()
+
+    def _new_child(self):
+        return self.child_class()
+
+    def labels(self, *values):
+        """Child for one label combination; a single label may be passed as a plain string key"""
+        key = values[0] if len(values) == 1 else values
+        child = self._children.get(key)
+        if child is None:
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _label_str(self, key, extra=()):
+        values = (key,) if len(self.labelnames) == 1 else key
+        pairs = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, values)]
+        pairs.extend(f'{n}="{_escape(v)}"' for n, v in extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def expose(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.kind}'
+        for key, child in list(self._children.items()):
+            yield from self._samples(key, child)
+
+    def _samples(self, key, child):
+        yield f'{self.name}{self._label_str(key)} {_fmt(child.value)}'
+
+
+class Counter(_Metric):
+    kind = 'counter'
+    child_class = _CounterChild
+
+    def inc(self, amount=1):
+        self._default.value += amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+    child_class = _GaugeChild
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def inc(self, amount=1):
+        self._default.value += amount
+
+    def dec(self, amount=1):
+        self._default.value -= amount
+
+    def set(self, value):
+        self._default.value = value
+
+    def expose(self):
+        if self.callback is not None and not self.labelnames:
+            self.set(self.callback())
+        elif self.callback is not None:
+            for key, value in self.callback().items():
+                self.labels(*(key if isinstance(key, tuple) else (key,))).set(value)
+        yield from super().expose()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def _samples(self, key, child):
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float('inf'),), child.counts):
+            cumulative += count
+            yield f'{self.name}_bucket{self._label_str(key, (("le", _fmt(float(bound))),))} {cumulative}'
+        yield f'{self.name}_sum{self._label_str(key)} {_fmt(child.sum)}'
+        yield f'{self.name}_count{self._label_str(key)} {cumulative}'
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f'Duplicate metric {metric.name}')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def expose(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def _log_queue_dropped():
+    from apps.common.logging_utils import log_queue_stats
+    return {name: stats['dropped'] for name, stats in log_queue_stats().items()}
+
+
+def _auth_user_cache_hit_rate():
+    from apps.users.user_cache import user_cache
+    return user_cache.hit_rate()
+
+
+http_request_duration = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ['route'],
+))
+http_request_db_duration = REGISTRY.register(Histogram(
+    'http_request_db_seconds', 'Time spent in database queries per HTTP request', ['route'],
+))
+ws_connections_active = REGISTRY.register(Gauge(
+    'ws_connections_active', 'Open chat WebSocket connections in this process',
+))
+chat_messages_received = REGISTRY.register(Counter(
+    'chat_messages_received_total', 'Chat messages received from clients',
+))
+chat_messages_sent = REGISTRY.register(Counter(
+    'chat_messages_sent_total', 'Chat messages delivered to clients',
+))
+channel_layer_group_send_duration = REGISTRY.register(Histogram(
+    'channel_layer_group_send_seconds', 'Latency of channel layer group_send calls',
+))
+channel_layer_send_failures = REGISTRY.register(Counter(
+    'channel_layer_send_failures_total', 'Channel layer sends that raised',
+))
+channel_layer_channel_full = REGISTRY.register(Counter(
+    'channel_layer_channel_full_total', 'Channel layer sends rejected because the channel was full', ['shard'],
+))
+chat_fanout_rooms = REGISTRY.register(Gauge(
+    'chat_fanout_rooms', 'Rooms this process is subscribed to once for local fan-out',
+))
+chat_fanout_events = REGISTRY.register(Counter(
+    'chat_fanout_events_total', 'Group events received once per process and delivered to local consumers',
+))
+password_hash_pending = REGISTRY.register(Gauge(
+    'password_hash_pending', 'Password hash/verify calls queued or running in the hashing pool',
+))
+password_hash_queue_duration = REGISTRY.register(Histogram(
+    'password_hash_queue_seconds', 'Time password hashing calls waited for a pool worker',
+))
+password_hash_duration = REGISTRY.register(Histogram(
+    'password_hash_seconds', 'Time spent hashing or verifying a password',
+))
+password_hash_rejected = REGISTRY.register(Counter(
+    'password_hash_rejected_total', 'Password hashing calls rejected because the pool queue was full',
+))
+auth_user_cache_lookups = REGISTRY.register(Counter(
+    'auth_user_cache_lookups_total', 'Authenticated user cache lookups by result', ['result'],
+))
+auth_user_cache_hit_ratio = REGISTRY.register(Gauge(
+    'auth_user_cache_hit_ratio', 'Share of authenticated user lookups served from the cache since start',
+    callback=_auth_user_cache_hit_rate,
+))
+user_representation_cache_lookups = REGISTRY.register(Counter(
+    'user_representation_cache_lookups_total', 'Serialized user representation cache lookups by result', ['result'],
+))
+log_records_dropped = REGISTRY.register(Gauge(
+    'log_records_dropped', 'Log records dropped because a log queue was full', ['handler'],
+    callback=_log_queue_dropped,
+))
+
+
+# DB time per request: a mutable accumulator in a ContextVar. It is shared
+# (not copied) with the threads sync_to_async hands work to, so queries run
+# anywhere on behalf of the request add to the same total.
+_db_time = contextvars.ContextVar('metrics_db_time', default=None)
+
+
+def start_db_timer() -> list:
+    acc = [0.0]
+    _db_time.set(acc)
+    return acc
+
+
+def stop_db_timer() -> None:
+    # set() rather than reset(token): under ASGI the request's middleware
+    # hooks run in different copies of the context.
+    _db_time.set(None)
+
+
+def _db_time_wrapper(execute, sql, params, many, context):
+    acc = _db_time.get()
+    if acc is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        acc[0] += time.perf_counter() - started
+
+
+def install_db_timer(sender, connection, **kwargs):
+    if _db_time_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_time_wrapper)
+
+
+connection_created.connect(install_db_timer, dispatch_uid='apps.common.metrics.install_db_timer')
+for _conn in connections.all(initialized_only=True):
+    install_db_timer(None, _conn)
@@ -1,12 +1,48 @@
 import time
 import uuid
 import logging
-from django.utils.deprecation import MiddlewareMixin
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+from . import profiling, query_profiler
 from .logging_utils import set_request_context, clear_request_context
+from .metrics import http_request_duration, http_request_db_duration, start_db_timer, stop_db_timer
 
 logger = logging.getLogger('apps.http')
 
-class RequestIDMiddleware(MiddlewareMixin):
+
+class HookMiddleware:
+    """process_request/process_response middleware that works in both handler modes.
+
+    Unlike MiddlewareMixin, the async path calls the hooks inline instead of
+    hopping to the sync thread for each of them, so hooks must not block.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        self.process_request(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        self.process_request(request)
+        return self.process_response(request, await self.get_response(request))
+
+    def process_request(self, request):
+        pass
+
+    def process_response(self, request, response):
+        return response
+
+
+class RequestIDMiddleware(HookMiddleware):
     def process_request(self, request):
         req_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:12]
         user_id = getattr(getattr(request, 'user', None), 'id', None)
@@ -20,16 +56,83 @@ class RequestIDMiddleware(MiddlewareMixin):
             clear_request_context()
         return response
 
-class RequestLoggingMiddleware(MiddlewareMixin):
+class RequestLoggingMiddleware(HookMiddleware):
     def process_request(self, request):
-        request._start_ts = time.time()
-        logger.debug(f"HTTP {request.method} {request.get_full_path()}")
+        request._start_ts = time.perf_counter_ns()
+        request._db_time = start_db_timer()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("HTTP %s %s", request.method, request.get_full_path())
 
     def process_response(self, request, response):
         try:
-            dur_ms = int((time.time() - getattr(request, '_start_ts', time.time())) * 1000)
+            now = time.perf_counter_ns()
+            elapsed = (now - getattr(request, '_start_ts', now)) / 1e9
+            dur_ms = int(elapsed * 1000)
             status = getattr(response, 'status_code', '-')
-            logger.info(f"HTTP {request.method} {request.path} -> {status} ({dur_ms} ms)")
+            logger.info("HTTP %s %s -> %s (%s ms)", request.method, request.path, status, dur_ms)
+            match = getattr(request, 'resolver_match', None)
+            route = match.route if match is not None else 'unmatched'
+            http_request_duration.labels(route).observe(elapsed)
+            db_time = getattr(request, '_db_time', None)
+            if db_time is not None:
+                http_request_db_duration.labels(route).observe(db_time[0])
         except Exception:
             pass
+        finally:
+            stop_db_timer()
+        return response
+
+
+class QueryProfilerMiddleware(HookMiddleware):
+    """Counts, times and groups the queries of each request (QUERY_PROFILER_ENABLED)"""
+
+    def __init__(self, get_response):
+        if not query_profiler.enabled():
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+        query_profiler.install()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with query_profiler.profile_queries(f'{request.method} {request.path}') as profile:
+            response = self.get_response(request)
+        return self.report(profile, response)
+
+    async def __acall__(self, request):
+        with query_profiler.profile_queries(f'{request.method} {request.path}') as profile:
+            response = await self.get_response(request)
+        return self.report(profile, response)
+
+    def report(self, profile, response):
+        profile.log(logger)
+        response['X-DB-Queries'] = profile.header()
+        return response
+
+
+class RequestProfilingMiddleware:
+    """Profiles single requests on demand (REQUEST_PROFILING_ENABLED, see apps.common.profiling)
+
+    Sync only: the collectors follow the calling thread and the staff check
+    may query the database.
+    """
+
+    def __init__(self, get_response):
+        if not profiling.enabled():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = profiling.requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        collector = profiling.make_collector(mode)
+        collector.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            collector.stop()
+        path = collector.write(profiling.profile_path(f'{request.method} {request.path}', collector.extension))
+        logger.info("PROFILE %s %s mode=%s -> %s", request.method, request.path, mode, path)
+        response['X-Profile-File'] = path.name
         return response
@@ -0,0 +1,178 @@
+"""On-demand profiling of single HTTP requests and WebSocket frames.
+
+Enabled with REQUEST_PROFILING_ENABLED. A request is profiled when it
+carries an `X-Profile` header holding a fresh signed token (see the
+profile_token command) or when a staff user adds `?_profile=1`. The mode is
+`cprofile` (deterministic, .prof file for pstats/snakeviz) or `sampling`
+(stack snapshots every few milliseconds, collapsed-stack .folded file for
+flame graphs); pick it with `X-Profile-Mode` or `?_profile=sampling`.
+Files are written under LOG_DIR/profiles. When disabled the middleware
+removes itself, so normal requests pay nothing.
+
+WebSocket frames are handled on the shared event loop thread, so a frame
+profile also records whatever other coroutines run while it is open, and
+two cProfile profilers cannot run at once (3.12 raises ValueError, earlier
+versions silently replace the first). One WebSocket connection per process
+may profile at a time; see claim_ws_profiler.
+"""
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+
+
+TOKEN_SALT = 'apps.common.profiling'
+TOKEN_VALUE = 'profile'
+TOKEN_MAX_AGE = 300
+QUERY_FLAG = '_profile'
+MAX_WS_FRAMES = 100
+
+
+def enabled() -> bool:
+    return getattr(settings, 'REQUEST_PROFILING_ENABLED', False)
+
+
+def make_token() -> str:
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(TOKEN_VALUE)
+
+
+def valid_token(value) -> bool:
+    if not value or not isinstance(value, str):
+        return False
+    try:
+        return signing.TimestampSigner(salt=TOKEN_SALT).unsign(value, max_age=TOKEN_MAX_AGE) == TOKEN_VALUE
+    except signing.BadSignature:
+        return False
+
+
+class CProfileCollector:
+    extension = '.prof'
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def write(self, path: Path) -> Path:
+        self.profiler.dump_stats(str(path))
+        return path
+
+
+class StackSampler:
+    """Snapshots the calling thread's stack from a helper thread at a fixed interval"""
+
+    extension = '.folded'
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(target,), name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, target: int):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write(self, path: Path) -> Path:
+        with open(path, 'w', encoding='utf-8') as fh:
+            for stack, count in self.stacks.most_common():
+                fh.write(f'{stack} {count}\n')
+        return path
+
+
+COLLECTORS = {
+    'cprofile': CProfileCollector,
+    'sampling': StackSampler,
+}
+
+
+_ws_profiler_lock = threading.Lock()
+_ws_profiler_owner = None  # weakref to the connection profiling its frames
+
+
+def claim_ws_profiler(owner) -> bool:
+    """Reserve this process's WebSocket profiler for `owner`; False if another holds it"""
+    global _ws_profiler_owner
+    with _ws_profiler_lock:
+        current = _ws_profiler_owner() if _ws_profiler_owner is not None else None
+        if current is not None and current is not owner:
+            return False
+        _ws_profiler_owner = weakref.ref(owner)
+        return True
+
+
+def release_ws_profiler(owner):
+    global _ws_profiler_owner
+    with _ws_profiler_lock:
+        if _ws_profiler_owner is not None and _ws_profiler_owner() in (owner, None):
+            _ws_profiler_owner = None
+
+
+def make_collector(mode: str):
+    return COLLECTORS.get(mode, CProfileCollector)()
+
+
+def profile_path(label: str, extension: str) -> Path:
+    directory = Path(settings.LOG_DIR) / 'profiles'
+    directory.mkdir(parents=True, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', label).strip('-')[:60]
+    return directory / f'{time.strftime("%Y%m%d-%H%M%S")}-{slug}-{uuid.uuid4().hex[:6]}{extension}'
+
+
+def _is_staff(request) -> bool:
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    # API clients authenticate with JWT inside the view; check it here too
+    from rest_framework.exceptions import AuthenticationFailed
+    from apps.users.authentication import RevocationCheckingJWTAuthentication
+    try:
+        result = RevocationCheckingJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return bool(result and result[0].is_staff)
+
+
+def requested_mode(request):
+    """Profiling mode asked for by this request, or None"""
+    header = request.META.get('HTTP_X_PROFILE')
+    if header is not None:
+        if valid_token(header):
+            return request.META.get('HTTP_X_PROFILE_MODE', 'cprofile')
+        return None
+    flag = request.GET.get(QUERY_FLAG)
+    if flag is not None and _is_staff(request):
+        return flag if flag in COLLECTORS else 'cprofile'
+    return None
@@ -0,0 +1,103 @@
+"""Opt-in per-request / per-frame database query profiling.
+
+Enabled with QUERY_PROFILER_ENABLED. When it is off the middleware removes
+itself from the stack and no execute wrapper is ever installed, so there is
+no per-query cost at all.
+"""
+import contextlib
+import contextvars
+import re
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+_active = contextvars.ContextVar('query_profile', default=None)
+
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+_NUMBER_RE = re.compile(r'\b\d+\b')
+
+
+def enabled() -> bool:
+    return getattr(settings, 'QUERY_PROFILER_ENABLED', False)
+
+
+def query_shape(sql: str) -> str:
+    """Collapse the parts of a statement that vary between otherwise identical queries"""
+    return _NUMBER_RE.sub('?', _IN_LIST_RE.sub('IN (...)', sql))
+
+
+class QueryProfile:
+    def __init__(self, label: str, threshold: int):
+        self.label = label
+        self.threshold = threshold
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = {}
+
+    def record(self, sql: str, elapsed: float):
+        self.count += 1
+        self.duration += elapsed
+        stats = self.shapes.get(sql)
+        if stats is None:
+            stats = self.shapes[sql] = [0, 0.0]
+        stats[0] += 1
+        stats[1] += elapsed
+
+    def grouped(self):
+        """[(shape, count, seconds)] with identical shapes merged, most frequent first"""
+        merged = {}
+        for sql, (count, elapsed) in self.shapes.items():
+            stats = merged.setdefault(query_shape(sql), [0, 0.0])
+            stats[0] += count
+            stats[1] += elapsed
+        return sorted(((shape, c, t) for shape, (c, t) in merged.items()), key=lambda row: -row[1])
+
+    def suspects(self):
+        """Shapes repeated often enough to look like a query per row (N+1)"""
+        return [row for row in self.grouped() if row[1] >= self.threshold]
+
+    def header(self) -> str:
+        return f'count={self.count}; time_ms={self.duration * 1000:.1f}; n_plus_one={len(self.suspects())}'
+
+    def log(self, logger):
+        suspects = self.suspects()
+        logger.info("DB %s queries=%s time_ms=%.1f shapes=%s", self.label, self.count, self.duration * 1000, len(self.shapes))
+        for shape, count, elapsed in suspects:
+            logger.warning("DB N+1 suspect %s x%s (%.1f ms): %s", self.label, count, elapsed * 1000, shape[:300])
+
+
+def _profile_wrapper(execute, sql, params, many, context):
+    profile = _active.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record(sql, time.perf_counter() - started)
+
+
+def _install_wrapper(sender, connection, **kwargs):
+    if _profile_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_profile_wrapper)
+
+
+def install():
+    connection_created.connect(_install_wrapper, dispatch_uid='apps.common.query_profiler.install')
+    for conn in connections.all(initialized_only=True):
+        _install_wrapper(None, conn)
+
+
+@contextlib.contextmanager
+def profile_queries(label: str):
+    """Collect every query issued in this context (including sync_to_async threads)"""
+    install()
+    profile = QueryProfile(label, getattr(settings, 'QUERY_PROFILER_N1_THRESHOLD', 5))
+    token = _active.set(profile)
+    try:
+        yield profile
+    finally:
+        _active.reset(token)
@@ -0,0 +1,27 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from apps.common.lifespan import lifespan_app
+
+
+class LifespanAppTest(SimpleTestCase):
+    """Test the ASGI lifespan handler"""
+
+    async def test_starts_and_stops_log_queues(self):
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        with mock.patch('apps.common.lifespan.start_log_queues') as start, \
+                mock.patch('apps.common.lifespan.stop_log_queues') as stop:
+            await lifespan_app({'type': 'lifespan'}, receive, send)
+
+        start.assert_called_once()
+        stop.assert_called_once()
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
@@ -1,12 +1,35 @@
 from django.test import TestCase
+import asyncio
 import logging
+import threading
+import gc
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
 
 from apps.common.logging_utils import (
     RequestContextFilter,
     SensitiveDataFilter,
+    Redactor,
+    SENSITIVE_KEYS,
     set_request_context,
-    clear_request_context
+    clear_request_context,
+    BoundedQueueHandler,
+    log_queue_stats,
+    get_request_context,
+    request_context,
+    bind_context,
+    SamplingFilter,
+    JsonFormatter,
+    event_type,
+    parse_sample_rates,
 )
+import json
+from asgiref.sync import sync_to_async
 
 
 class RequestContextFilterTest(TestCase):
@@ -148,30 +171,246 @@ class SensitiveDataFilterTest(TestCase):
         self.assertIn('action=create', record.msg)
 
 
+def legacy_redact(msg):
+    """The original multi-pass SensitiveDataFilter algorithm"""
+    msg = re.sub(r"(Authorization|Cookie)\s*=\s*[^\s,;]+(?:\s+[^\s,;]+)*", r"\1=***", msg, flags=re.IGNORECASE)
+    for key in SENSITIVE_KEYS:
+        pattern = re.compile(r'(\"?' + re.escape(key) + r'\"?\s*[:=]\s*)(\".*?\"|[^,}\s]+)', re.IGNORECASE)
+        msg = pattern.sub(r'\1***', msg)
+    return re.sub(r'\btoken\w+\b', '***', msg, flags=re.IGNORECASE)
+
+
+class RedactorTest(TestCase):
+    """Test the single-pass Redactor against the original algorithm"""
+
+    CASES = [
+        'password=secret123',
+        'confirm_password=abc password=def',
+        '{"password": "hunter2", "email": "a@b.c"}',
+        "{'token': 'abc.def', 'refresh': 'ghi'}",
+        'Authorization=Bearer token123, next=1',
+        'cookie = sessionid=abc; csrftoken=xyz',
+        'WS AUTH: failed token validation: Token is invalid or expired',
+        'tokenABC and tokens and token_x=1 and refresh_token=zz',
+        'AUTHORIZATION: Bearer eyJ0eXAi',
+        'user_id=5 room_id=10 action=create',
+        'HTTP GET /api/rooms/1/messages/?limit=50 -> 200 (3 ms)',
+        'WS CHAT msg_id=42 len=11',
+        '',
+    ]
+
+    def test_matches_legacy_output(self):
+        redactor = Redactor()
+        for msg in self.CASES:
+            with self.subTest(msg=msg):
+                self.assertEqual(redactor.redact(msg), legacy_redact(msg))
+
+    def test_matches_legacy_output_fuzzed(self):
+        redactor = Redactor()
+        rng = random.Random(1234)
+        words = ['password', 'Token', 'tokenX', 'refresh', 'Authorization', 'cookie', 'user', '=', ':',
+                 ' ', ',', '}', '"', ';', 'abc', 'Bearer', 'confirm_password', '123']
+        for _ in range(2000):
+            msg = ''.join(rng.choice(words) for _ in range(rng.randint(1, 12)))
+            self.assertEqual(redactor.redact(msg), legacy_redact(msg), msg)
+
+    def test_custom_keys(self):
+        redactor = Redactor(keys={'api_key'})
+        self.assertEqual(redactor.redact('api_key=abc password=def'), 'api_key=*** password=def')
+
+    def test_filter_runs_once_per_record(self):
+        record = logging.LogRecord('test', logging.INFO, 'test.py', 1, 'password=%s', ('x',), None)
+        SensitiveDataFilter().filter(record)
+        record.msg = 'password=leaked'
+        SensitiveDataFilter().filter(record)
+        self.assertEqual(record.msg, 'password=leaked')
+
+
 class LoggingUtilsTest(TestCase):
     """Test logging utility functions"""
     
     def test_set_request_context(self):
         """Test set_request_context sets values"""
         set_request_context(req_id='req-1', user_id='5', room_id='10')
-        from apps.common.logging_utils import _local
-        self.assertEqual(_local.req_id, 'req-1')
-        self.assertEqual(_local.user_id, '5')
-        self.assertEqual(_local.room_id, '10')
+        self.assertEqual(get_request_context(), {'req_id': 'req-1', 'user_id': '5', 'room_id': '10'})
     
     def test_clear_request_context(self):
         """Test clear_request_context removes values"""
         set_request_context(req_id='req-1', user_id='5', room_id='10')
         clear_request_context()
-        from apps.common.logging_utils import _local
-        self.assertFalse(hasattr(_local, 'req_id'))
-        self.assertFalse(hasattr(_local, 'user_id'))
-        self.assertFalse(hasattr(_local, 'room_id'))
+        self.assertEqual(get_request_context(), {})
     
     def test_partial_context_set(self):
         """Test set_request_context can set partial context"""
+        clear_request_context()
         set_request_context(req_id='req-1')
-        from apps.common.logging_utils import _local
-        self.assertEqual(_local.req_id, 'req-1')
-        self.assertFalse(hasattr(_local, 'user_id'))
+        self.assertEqual(get_request_context(), {'req_id': 'req-1'})
+
+    def test_request_context_block(self):
+        """Test request_context restores the previous values"""
+        clear_request_context()
+        set_request_context(req_id='outer')
+        with request_context(room_id='7'):
+            self.assertEqual(get_request_context(), {'req_id': 'outer', 'room_id': '7'})
+        self.assertEqual(get_request_context(), {'req_id': 'outer'})
+
+    async def test_context_isolated_between_tasks(self):
+        """Test concurrent coroutines on one loop thread keep their own context"""
+        async def connection(n):
+            set_request_context(user_id=str(n))
+            await asyncio.sleep(0)
+            return get_request_context()['user_id']
+
+        results = await asyncio.gather(*(asyncio.ensure_future(connection(n)) for n in range(5)))
+        self.assertEqual(results, ['0', '1', '2', '3', '4'])
+
+    async def test_context_follows_sync_to_async(self):
+        """Test context reaches executor threads without thread pinning"""
+        set_request_context(req_id='req-async')
+        seen = await sync_to_async(lambda: get_request_context()['req_id'], thread_sensitive=False)()
+        self.assertEqual(seen, 'req-async')
+        loop = asyncio.get_running_loop()
+        seen = await loop.run_in_executor(None, bind_context(lambda: get_request_context()['req_id']))
+        self.assertEqual(seen, 'req-async')
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.records.append(record)
+        self.threads.add(threading.get_ident())
+
+
+class BoundedQueueHandlerTest(TestCase):
+    """Test BoundedQueueHandler"""
+
+    def setUp(self):
+        self.target = ListHandler()
+        self.target.name = 'test_list_target'
+        self.addCleanup(logging._handlers.pop, 'test_list_target', None)
+        self.logger = logging.getLogger('apps.tests.queue')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+
+    def make_handler(self, maxsize=100):
+        handler = BoundedQueueHandler(['test_list_target'], maxsize=maxsize)
+        handler.name = 'test_queue'
+        handler.addFilter(RequestContextFilter())
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        self.addCleanup(handler.stop)
+        return handler
+
+    def test_records_delivered_on_listener_thread(self):
+        """Test records reach the target handler off the calling thread"""
+        handler = self.make_handler()
+        set_request_context(req_id='req-q')
+        self.logger.info('hello %s', 'world')
+        clear_request_context()
+        handler.stop()
+        self.assertEqual([r.getMessage() for r in self.target.records], ['hello world'])
+        self.assertEqual(self.target.records[0].req_id, 'req-q')
+        self.assertNotIn(threading.get_ident(), self.target.threads)
+
+    def test_targets_kept_alive(self):
+        """Test the queue handler holds its targets after other references go away"""
+        handler = self.make_handler()
+        self.target = None
+        gc.collect()
+        self.assertEqual(len(handler.targets), 1)
+        self.logger.info('still here')
+        handler.stop()
+        self.assertEqual([r.getMessage() for r in handler.targets[0].records], ['still here'])
+
+    def test_real_config_writes_log_file(self):
+        """Test a record logged with the LOGGING setting reaches the log file"""
+        backend = Path(__file__).resolve().parents[3]
+        with tempfile.TemporaryDirectory() as log_dir:
+            env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'config.settings', 'LOG_DIR': log_dir}
+            subprocess.run(
+                [sys.executable, '-c',
+                 "import django, logging; django.setup(); logging.getLogger('apps.chat').warning('PROBE %s', 42)"],
+                cwd=backend, env=env, check=True, capture_output=True, timeout=60,
+            )
+            with open(os.path.join(log_dir, 'channels.log'), encoding='utf-8') as f:
+                self.assertIn('PROBE 42', f.read())
+
+    def test_full_queue_drops_and_counts(self):
+        """Test a full queue drops records instead of blocking"""
+        handler = self.make_handler(maxsize=2)
+        handler.listener = object()  # pretend started so nothing drains the queue
+        for i in range(5):
+            self.logger.info('message %s', i)
+        self.assertEqual(handler.dropped, 3)
+        self.assertEqual(log_queue_stats()['test_queue'], {'queued': 2, 'dropped': 3})
+        handler.listener = None
+
+
+def make_record(msg, args=(), level=logging.INFO, **extra):
+    record = logging.LogRecord('apps.chat', level, 'test.py', 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class SamplingFilterTest(TestCase):
+    """Test SamplingFilter and event types"""
+
+    def test_event_type_from_template_or_extra(self):
+        """Test the event is the first two words of the unformatted message unless given"""
+        self.assertEqual(event_type(make_record('WS SIGNAL type=%s', ('x',))), 'WS SIGNAL')
+        self.assertEqual(event_type(make_record('WS AUTH: success user_id=%s', (1,))), 'WS AUTH')
+        self.assertEqual(event_type(make_record('anything', event='custom')), 'custom')
+
+    def test_rates_per_event(self):
+        """Test sampled-out events are dropped and counted, others kept"""
+        f = SamplingFilter(rates={'WS SIGNAL': 0.0})
+        self.assertFalse(f.filter(make_record('WS SIGNAL type=%s', ('x',), level=logging.DEBUG)))
+        self.assertTrue(f.filter(make_record('WS CHAT msg_id=%s', (1,))))
+        self.assertEqual(f.dropped, 1)
+
+    def test_warnings_always_kept(self):
+        """Test warnings and errors bypass sampling"""
+        f = SamplingFilter(rates={'WS SIGNAL': 0.0}, default=0.0)
+        self.assertTrue(f.filter(make_record('WS SIGNAL failed', level=logging.ERROR)))
+
+    def test_partial_rate(self):
+        """Test a fractional rate keeps roughly that share"""
+        random.seed(1)
+        f = SamplingFilter(rates={'WS SIGNAL': 0.1})
+        kept = sum(f.filter(make_record('WS SIGNAL type=%s', ('x',))) for _ in range(2000))
+        self.assertTrue(100 < kept < 300)
+
+    def test_rates_from_string(self):
+        """Test rates parse from the LOG_SAMPLE_RATES format"""
+        self.assertEqual(parse_sample_rates('WS SIGNAL=0.01, WS CHAT=0.5,'), {'WS SIGNAL': 0.01, 'WS CHAT': 0.5})
+        self.assertEqual(SamplingFilter(rates='WS SIGNAL=0').rates, {'WS SIGNAL': 0.0})
+
+
+class JsonFormatterTest(TestCase):
+    """Test JsonFormatter"""
+
+    def test_structured_output(self):
+        """Test context, event and extra fields become JSON keys"""
+        record = make_record('WS CHAT msg_id=%s len=%s', (7, 5), msg_id=7, length=5)
+        set_request_context(req_id='ws-1', user_id='2', room_id='3')
+        RequestContextFilter().filter(record)
+        clear_request_context()
+        data = json.loads(JsonFormatter().format(record))
+        self.assertEqual(data['message'], 'WS CHAT msg_id=7 len=5')
+        self.assertEqual(data['event'], 'WS CHAT')
+        self.assertEqual((data['req_id'], data['user_id'], data['room_id']), ('ws-1', '2', '3'))
+        self.assertEqual((data['msg_id'], data['length']), (7, 5))
+        self.assertEqual(data['level'], 'INFO')
 
+    def test_exception_included(self):
+        """Test exception text is included"""
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            record = logging.LogRecord('apps.chat', logging.ERROR, 'test.py', 1, 'WS RECEIVE parse_error', (), sys.exc_info())
+        data = json.loads(JsonFormatter().format(record))
+        self.assertIn('ValueError: boom', data['exc_info'])
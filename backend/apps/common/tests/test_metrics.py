@@ -0,0 +1,87 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+
+from apps.common.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+    REGISTRY,
+    http_request_db_duration,
+    http_request_duration,
+)
+
+User = get_user_model()
+
+
+class MetricsRegistryTest(TestCase):
+    """Test metric types and text exposition"""
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter(self):
+        counter = self.registry.register(Counter('test_total', 'A counter'))
+        counter.inc()
+        counter.inc(2)
+        text = self.registry.expose()
+        self.assertIn('# TYPE test_total counter', text)
+        self.assertIn('test_total 3', text)
+
+    def test_labelled_gauge_callback(self):
+        self.registry.register(Gauge('test_gauge', 'A gauge', ['name'], callback=lambda: {'a"b': 4}))
+        self.assertIn('test_gauge{name="a\\"b"} 4', self.registry.expose())
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.register(Histogram('test_seconds', 'A histogram', ['route'], buckets=(0.1, 1.0)))
+        child = histogram.labels('r')
+        self.assertIs(child, histogram.labels('r'))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            child.observe(value)
+        text = self.registry.expose()
+        self.assertIn('test_seconds_bucket{route="r",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{route="r",le="1.0"} 3', text)
+        self.assertIn('test_seconds_bucket{route="r",le="+Inf"} 4', text)
+        self.assertIn('test_seconds_count{route="r"} 4', text)
+        self.assertIn('test_seconds_sum{route="r"} 4.05', text)
+
+    def test_duplicate_metric(self):
+        self.registry.register(Counter('dup_total', 'x'))
+        with self.assertRaises(ValueError):
+            self.registry.register(Counter('dup_total', 'x'))
+
+
+class MetricsEndpointTest(TestCase):
+    """Test the /metrics endpoint and HTTP instrumentation"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='user@example.com',
+            name='Test User',
+            password='pass123'
+        )
+
+    def test_exposes_registry(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'# TYPE http_request_duration_seconds histogram', response.content)
+        self.assertIn(b'ws_connections_active', response.content)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token_required_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_records_latency_and_db_time_by_route(self):
+        route = 'api/rooms/$'
+        before = http_request_duration.labels(route).counts[:]
+        db_before = http_request_db_duration.labels(route).sum
+        self.client.force_authenticate(user=self.user)
+        self.client.get('/api/rooms/')
+        self.assertEqual(sum(http_request_duration.labels(route).counts), sum(before) + 1)
+        self.assertGreater(http_request_db_duration.labels(route).sum, db_before)
+        self.assertIn(route, REGISTRY.expose())
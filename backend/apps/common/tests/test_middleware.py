@@ -1,6 +1,8 @@
 from django.test import TestCase, RequestFactory
 from django.contrib.auth import get_user_model
+from django.core.handlers.base import BaseHandler
 from django.http import HttpResponse
+from asgiref.sync import iscoroutinefunction
 
 from apps.common.middleware import RequestIDMiddleware, RequestLoggingMiddleware
 
@@ -81,3 +83,35 @@ class RequestLoggingMiddlewareTest(TestCase):
         response = self.middleware.process_response(request, response)
         self.assertIsNotNone(response)
 
+
+
+class AsyncMiddlewareTest(TestCase):
+    """Test the middleware in async mode"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    async def test_async_chain_sets_headers(self):
+        """Test async get_response keeps the middleware async and headers intact"""
+        async def view(request):
+            return HttpResponse(status=201)
+
+        middleware = RequestIDMiddleware(RequestLoggingMiddleware(view))
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = self.factory.get('/test/', HTTP_X_REQUEST_ID='async-id')
+        response = await middleware(request)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['X-Request-ID'], 'async-id')
+        self.assertIsInstance(request._start_ts, int)
+
+    def test_sync_chain_stays_sync(self):
+        middleware = RequestIDMiddleware(RequestLoggingMiddleware(lambda request: HttpResponse()))
+        self.assertFalse(iscoroutinefunction(middleware))
+        self.assertIn('X-Request-ID', middleware(self.factory.get('/test/')))
+
+    def test_async_stack_needs_no_adaptation(self):
+        """Test no middleware in MIDDLEWARE is wrapped with a sync/async adapter"""
+        with self.settings(QUERY_PROFILER_ENABLED=True), self.assertNoLogs('django.request', level='DEBUG'):
+            handler = BaseHandler()
+            handler.load_middleware(is_async=True)
+        self.assertTrue(iscoroutinefunction(handler._middleware_chain))
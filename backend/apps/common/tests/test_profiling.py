@@ -0,0 +1,124 @@
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.common import profiling
+
+User = get_user_model()
+
+
+class ProfileTokenTest(TestCase):
+    """Test signed profiling tokens"""
+
+    def test_round_trip(self):
+        self.assertTrue(profiling.valid_token(profiling.make_token()))
+
+    def test_rejects_tampered_and_expired(self):
+        token = profiling.make_token()
+        self.assertFalse(profiling.valid_token(token[:-2] + 'xx'))
+        self.assertFalse(profiling.valid_token(None))
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + profiling.TOKEN_MAX_AGE + 5):
+            self.assertFalse(profiling.valid_token(token))
+
+
+class StackSamplerTest(TestCase):
+    """Test the sampling collector"""
+
+    def test_collects_stacks_of_calling_thread(self):
+        sampler = profiling.StackSampler(interval=0.001)
+        sampler.start()
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        sampler.stop()
+        self.assertTrue(sampler.stacks)
+        self.assertTrue(any('test_collects_stacks_of_calling_thread' in stack for stack in sampler.stacks))
+
+
+class WebSocketProfilerSlotTest(TestCase):
+    """Test only one WebSocket connection per process profiles at a time"""
+
+    class Connection:
+        pass
+
+    def test_second_owner_refused_until_released(self):
+        first, second = self.Connection(), self.Connection()
+        self.assertTrue(profiling.claim_ws_profiler(first))
+        try:
+            self.assertTrue(profiling.claim_ws_profiler(first))
+            self.assertFalse(profiling.claim_ws_profiler(second))
+            profiling.release_ws_profiler(second)
+            self.assertFalse(profiling.claim_ws_profiler(second))
+            profiling.release_ws_profiler(first)
+            self.assertTrue(profiling.claim_ws_profiler(second))
+        finally:
+            profiling.release_ws_profiler(first)
+            profiling.release_ws_profiler(second)
+
+    def test_collected_owner_frees_the_slot(self):
+        self.assertTrue(profiling.claim_ws_profiler(self.Connection()))
+        other = self.Connection()
+        self.assertTrue(profiling.claim_ws_profiler(other))
+        profiling.release_ws_profiler(other)
+
+
+class RequestProfilingMiddlewareTest(TestCase):
+    """Test RequestProfilingMiddleware"""
+
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir, ignore_errors=True)
+        override = override_settings(REQUEST_PROFILING_ENABLED=True, LOG_DIR=Path(self.log_dir))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.staff = User.objects.create_user(email='staff@example.com', name='Staff', password='pass123', is_staff=True)
+        self.user = User.objects.create_user(email='user@example.com', name='User', password='pass123')
+
+    def profile_files(self):
+        directory = Path(self.log_dir) / 'profiles'
+        return sorted(p.name for p in directory.iterdir()) if directory.exists() else []
+
+    def test_unflagged_request_not_profiled(self):
+        response = self.client.get('/api/rooms/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.staff)}')
+        self.assertNotIn('X-Profile-File', response)
+        self.assertEqual(self.profile_files(), [])
+
+    def test_signed_header_profiles_request(self):
+        """Test a valid X-Profile header writes a cProfile file"""
+        response = self.client.get('/api/rooms/', HTTP_X_PROFILE=profiling.make_token())
+        self.assertEqual(self.profile_files(), [response['X-Profile-File']])
+        self.assertTrue(response['X-Profile-File'].endswith('.prof'))
+
+    def test_invalid_header_ignored(self):
+        response = self.client.get('/api/rooms/', HTTP_X_PROFILE='nope')
+        self.assertNotIn('X-Profile-File', response)
+
+    def test_staff_query_flag_with_sampling(self):
+        """Test a staff JWT user can ask for a sampling profile"""
+        response = self.client.get(
+            '/api/rooms/?_profile=sampling',
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.staff)}',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['X-Profile-File'].endswith('.folded'))
+
+    def test_query_flag_ignored_for_non_staff(self):
+        response = self.client.get(
+            '/api/rooms/?_profile=1',
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}',
+        )
+        self.assertNotIn('X-Profile-File', response)
+        self.assertEqual(self.profile_files(), [])
+
+    def test_disabled_by_default(self):
+        with self.settings(REQUEST_PROFILING_ENABLED=False):
+            response = APIClient().get('/api/rooms/', HTTP_X_PROFILE=profiling.make_token())
+        self.assertNotIn('X-Profile-File', response)
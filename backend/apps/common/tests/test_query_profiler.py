@@ -0,0 +1,82 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+
+from apps.common.query_profiler import QueryProfile, profile_queries, query_shape
+from apps.rooms.api.serializers import RoomSerializer
+from apps.rooms.models import Room
+
+User = get_user_model()
+
+
+class QueryShapeTest(TestCase):
+    """Test query shape normalization"""
+
+    def test_collapses_in_lists_and_numbers(self):
+        self.assertEqual(
+            query_shape('SELECT * FROM t WHERE id IN (%s, %s, %s) LIMIT 21'),
+            'SELECT * FROM t WHERE id IN (...) LIMIT ?',
+        )
+        self.assertEqual(query_shape('SELECT 1 FROM t WHERE id IN (%s)'), 'SELECT ? FROM t WHERE id IN (...)')
+
+
+class QueryProfileTest(TestCase):
+    """Test QueryProfile grouping and N+1 detection"""
+
+    def test_flags_repeated_shapes(self):
+        profile = QueryProfile('test', threshold=3)
+        for _ in range(4):
+            profile.record('SELECT * FROM users WHERE id = %s LIMIT 21', 0.001)
+        profile.record('SELECT * FROM rooms', 0.002)
+        suspects = profile.suspects()
+        self.assertEqual(len(suspects), 1)
+        self.assertEqual(suspects[0][1], 4)
+        self.assertEqual(profile.count, 5)
+        self.assertIn('n_plus_one=1', profile.header())
+
+    def test_profile_queries_collects_orm_queries(self):
+        with profile_queries('block') as profile:
+            list(Room.objects.all())
+            Room.objects.count()
+        self.assertEqual(profile.count, 2)
+
+
+@override_settings(QUERY_PROFILER_ENABLED=True, QUERY_PROFILER_N1_THRESHOLD=3)
+class QueryProfilerMiddlewareTest(TestCase):
+    """Test QueryProfilerMiddleware"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='user@example.com',
+            name='Test User',
+            password='pass123'
+        )
+        for i in range(3):
+            creator = User.objects.create_user(email=f'c{i}@example.com', name=f'C{i}', password='pass123')
+            Room.objects.create(name=f'Room {i}', creator=creator)
+
+    def test_header_reports_queries(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/rooms/')
+        self.assertIn('X-DB-Queries', response)
+        self.assertIn('count=', response['X-DB-Queries'])
+
+    def test_detects_creator_lookup_per_room(self):
+        """Test a per-room creator lookup in the room list is flagged"""
+        self.client.force_authenticate(user=self.user)
+        per_row_lookup = lambda serializer, room: room.creator.name  # noqa: E731
+        with mock.patch.object(RoomSerializer, 'get_creator_name', per_row_lookup), \
+                self.assertLogs('apps.http', level='WARNING') as logs:
+            self.client.get('/api/rooms/')
+        self.assertTrue(any('N+1 suspect' in line for line in logs.output))
+
+
+class QueryProfilerDisabledTest(TestCase):
+    """Test the middleware drops out when disabled"""
+
+    def test_no_header_when_disabled(self):
+        response = APIClient().get('/metrics')
+        self.assertNotIn('X-DB-Queries', response)
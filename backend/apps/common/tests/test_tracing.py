@@ -0,0 +1,64 @@
+import json
+
+from django.test import TestCase, override_settings
+
+from apps.common import tracing
+
+
+@override_settings(TRACE_SAMPLE_RATE=1.0)
+class TracingTest(TestCase):
+    """Test spans, propagation and OTLP export"""
+
+    def test_nested_spans_exported_once(self):
+        """Test child spans share the trace and the root exports them together"""
+        with self.assertLogs('apps.traces', level='INFO') as logs:
+            with tracing.start_trace('root', room_id='1') as root:
+                with tracing.span('child') as child:
+                    child.set('size', 3)
+                self.assertIs(tracing.current_span(), root)
+        self.assertIsNone(tracing.current_span())
+        self.assertEqual(len(logs.records), 1)
+        spans = json.loads(logs.records[0].getMessage())['resourceSpans'][0]['scopeSpans'][0]['spans']
+        self.assertEqual([s['name'] for s in spans], ['root', 'child'])
+        self.assertEqual(spans[1]['parentSpanId'], spans[0]['spanId'])
+        self.assertEqual(spans[0]['traceId'], spans[1]['traceId'])
+        self.assertEqual(spans[1]['attributes'], [{'key': 'size', 'value': {'intValue': '3'}}])
+        self.assertLessEqual(int(spans[0]['startTimeUnixNano']), int(spans[1]['startTimeUnixNano']))
+
+    def test_error_status(self):
+        """Test an exception marks the span as failed and propagates"""
+        with self.assertLogs('apps.traces', level='INFO') as logs:
+            with self.assertRaises(ValueError):
+                with tracing.start_trace('root'):
+                    raise ValueError('boom')
+        span = json.loads(logs.records[0].getMessage())['resourceSpans'][0]['scopeSpans'][0]['spans'][0]
+        self.assertEqual(span['status'], {'code': 2, 'message': 'ValueError: boom'})
+
+    def test_continue_trace_from_traceparent(self):
+        """Test a remote parent keeps the trace id and links the parent span"""
+        with tracing.start_trace('root') as root:
+            traceparent = root.traceparent()
+        with tracing.continue_trace('deliver', traceparent) as span:
+            self.assertEqual(span.trace.trace_id, root.trace.trace_id)
+            self.assertEqual(span.parent_id, root.span_id)
+
+    def test_malformed_traceparent_ignored(self):
+        """Test a bad traceparent from a client is ignored instead of raising"""
+        for traceparent in ('00-abc-def-zz', '00-abc-def-', 'garbage', 42):
+            with tracing.continue_trace('deliver', traceparent) as span:
+                self.assertIsNone(span)
+
+    def test_noop_when_unsampled(self):
+        """Test nothing is recorded without sampling or a sampled parent"""
+        with self.settings(TRACE_SAMPLE_RATE=0.0):
+            with tracing.start_trace('root') as root:
+                with tracing.span('child') as child:
+                    pass
+        self.assertIsNone(root)
+        self.assertIsNone(child)
+        with tracing.continue_trace('deliver', None) as span:
+            self.assertIsNone(span)
+        with tracing.continue_trace('deliver', f'00-{"a" * 32}-{"b" * 16}-00') as span:
+            self.assertIsNone(span)
+        with tracing.continue_trace('deliver', 'garbage') as span:
+            self.assertIsNone(span)
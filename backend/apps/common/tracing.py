@@ -0,0 +1,157 @@
+"""Minimal in-process tracing for the chat path.
+
+A trace is started at an entry point with start_trace() (sampled at
+TRACE_SAMPLE_RATE) or continued from a W3C-style `traceparent` carried in a
+channel layer event with continue_trace(). span() opens a child of the
+current span and is a no-op outside a sampled trace, so unsampled work only
+pays for a ContextVar lookup. When the local root span ends, the spans
+recorded in this process are written as one OTLP/JSON line to the
+'apps.traces' logger (LOG_DIR/traces.jsonl), through its log queue.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import random
+import time
+
+from django.conf import settings
+
+
+exporter = logging.getLogger('apps.traces')
+
+_current = contextvars.ContextVar('trace_span', default=None)
+_NOOP = contextlib.nullcontext()
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+class Trace:
+    __slots__ = ('trace_id', 'spans')
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans = []
+
+
+class Span:
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'attributes', 'error', '_token')
+
+    def __init__(self, trace: Trace, name: str, parent_id: str = '', attributes=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.start_ns = self.end_ns = 0
+        self.error = None
+        self._token = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def traceparent(self) -> str:
+        return f'00-{self.trace.trace_id}-{self.span_id}-01'
+
+    def __enter__(self):
+        self.trace.spans.append(self)
+        self._token = _current.set(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            self.error = f'{exc_type.__name__}: {exc}'
+        _current.reset(self._token)
+        if self.trace.spans[0] is self:
+            export(self.trace)
+        return False
+
+
+def _sampled() -> bool:
+    rate = getattr(settings, 'TRACE_SAMPLE_RATE', 0.0)
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+def start_trace(name: str, **attributes):
+    """Root span for an entry point; a no-op unless sampled"""
+    if _current.get() is not None:
+        return span(name, **attributes)
+    if not _sampled():
+        return _NOOP
+    return Span(Trace(_new_id(16)), name, attributes=attributes)
+
+
+def continue_trace(name: str, traceparent, **attributes):
+    """Root span whose parent is a span from another consumer or process"""
+    if not traceparent:
+        return _NOOP
+    try:
+        _version, trace_id, parent_id, flags = traceparent.split('-')
+        sampled = int(flags, 16) & 1
+    except (AttributeError, ValueError):
+        return _NOOP
+    if not sampled:
+        return _NOOP
+    return Span(Trace(trace_id), name, parent_id=parent_id, attributes=attributes)
+
+
+def span(name: str, **attributes):
+    """Child of the current span, or a no-op outside a sampled trace"""
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+    return Span(parent.trace, name, parent_id=parent.span_id, attributes=attributes)
+
+
+def current_span():
+    return _current.get()
+
+
+def _attr(key, value) -> dict:
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+def to_otlp(trace: Trace) -> dict:
+    """OTLP/JSON ExportTraceServiceRequest for the spans of one trace"""
+    spans = []
+    for s in trace.spans:
+        data = {
+            'traceId': trace.trace_id,
+            'spanId': s.span_id,
+            'name': s.name,
+            'kind': 1,
+            'startTimeUnixNano': str(s.start_ns),
+            'endTimeUnixNano': str(s.end_ns or s.start_ns),
+            'attributes': [_attr(k, v) for k, v in s.attributes.items()],
+            'status': {'code': 2, 'message': s.error} if s.error else {'code': 1},
+        }
+        if s.parent_id:
+            data['parentSpanId'] = s.parent_id
+        spans.append(data)
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [
+                _attr('service.name', getattr(settings, 'TRACE_SERVICE_NAME', 'rooms-backend')),
+                _attr('process.pid', os.getpid()),
+            ]},
+            'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}],
+        }]
+    }
+
+
+def export(trace: Trace):
+    try:
+        exporter.info(json.dumps(to_otlp(trace), separators=(',', ':')))
+    except Exception:
+        logging.getLogger('apps.chat').exception('TRACE export failed')
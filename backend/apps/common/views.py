@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from apps.common.metrics import REGISTRY
+
+
+def metrics_view(request):
+    """Prometheus text exposition of this process's metrics"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        header = request.headers.get('Authorization', '')
+        if not constant_time_compare(header, f'Bearer {token}'):
+            return HttpResponseForbidden()
+    return HttpResponse(REGISTRY.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
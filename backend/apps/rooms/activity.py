@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import time
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from asgiref.sync import sync_to_async
+
+
+# A quiet room gets its counters written with the message; under load the
+# per-room deltas are folded together and written at most once per interval.
+ACTIVITY_FLUSH_INTERVAL = 1.0
+
+
+def apply_activity(deltas):
+    """Apply {room_id: (count, last_message_at)} to Room with F-expressions"""
+    from apps.rooms.models import Room
+    if not deltas:
+        return
+    with transaction.atomic():
+        for room_id, (count, last_at) in deltas.items():
+            Room.objects.filter(id=room_id).update(
+                message_count=F('message_count') + count,
+                last_message_at=Greatest(Coalesce(F('last_message_at'), Value(last_at)), Value(last_at)),
+            )
+
+
+class RoomActivityCounter:
+    """Process-wide buffer of per-room message deltas"""
+
+    def __init__(self, flush_interval: float = ACTIVITY_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = 0.0
+        self._timer = None
+
+    def record(self, room_id: int, created_at) -> bool:
+        """Buffer one message; returns True when the caller should flush now"""
+        with self._lock:
+            count, last_at = self._pending.get(room_id, (0, created_at))
+            self._pending[room_id] = (count + 1, max(last_at, created_at))
+            return time.monotonic() - self._last_flush >= self.flush_interval
+
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def flush(self):
+        with self._lock:
+            deltas, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        try:
+            apply_activity(deltas)
+        except Exception:
+            with self._lock:
+                for room_id, (count, last_at) in deltas.items():
+                    pending_count, pending_at = self._pending.get(room_id, (0, last_at))
+                    self._pending[room_id] = (pending_count + count, max(pending_at, last_at))
+            raise
+
+    def schedule_flush(self):
+        """From async code: make sure buffered deltas are written within one interval"""
+        loop = asyncio.get_running_loop()
+        if self._timer is not None and not self._timer.done() and self._timer.get_loop() is loop:
+            return
+        self._timer = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        if self.has_pending():
+            await sync_to_async(self.flush, thread_sensitive=True)()
+
+
+room_activity = RoomActivityCounter()
@@ -1,18 +1,23 @@
 from rest_framework import serializers
 from apps.rooms.models import Room
-from apps.users.api.serializers import UserSerializer
+from apps.users.api.serializers import CachedUserField, CachedUserListSerializer, UserSerializer
 
 
 class RoomSerializer(serializers.ModelSerializer):
     """Serializer for room details (GET responses)"""
-    creator = UserSerializer(read_only=True)
-    creator_name = serializers.CharField(source='creator.name', read_only=True)
+    creator = CachedUserField('creator_id')
+    creator_name = serializers.SerializerMethodField()
     
     class Meta:
         model = Room
         fields = ['id', 'name', 'description', 'creator', 'creator_name', 
-                  'created_at', 'is_active', 'room_type']
-        read_only_fields = ['id', 'created_at', 'creator']
+                  'created_at', 'is_active', 'room_type', 'message_count', 'last_message_at']
+        read_only_fields = ['id', 'created_at', 'creator', 'message_count', 'last_message_at']
+        list_serializer_class = CachedUserListSerializer
+
+    def get_creator_name(self, obj):
+        creator = self.fields['creator'].to_representation(obj)
+        return creator['name'] if creator else ''
 
 
 class RoomCreateSerializer(serializers.ModelSerializer):
@@ -56,3 +61,10 @@ class RoomUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Room type must be 'chat' or 'video'.")
         return value
 
+    def update(self, instance, validated_data):
+        """Save only the edited columns, leaving the activity counters to their F() updates"""
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
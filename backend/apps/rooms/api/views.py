@@ -1,5 +1,7 @@
 import logging
 
+from django.db.models import F
+
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
@@ -21,7 +23,11 @@ class RoomViewSet(viewsets.ModelViewSet):
     serializer_class = RoomSerializer
     
     def get_queryset(self):
-        return Room.objects.filter(is_active=True).order_by('-created_at')
+        queryset = Room.objects.filter(is_active=True)
+        if self.action == 'list' and self.request.query_params.get('ordering') == 'activity':
+            # Served by rooms_active_activity_idx; rooms without messages go last
+            return queryset.order_by(F('last_message_at').desc(nulls_last=True))
+        return queryset.order_by('-created_at')
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -40,7 +46,9 @@ class RoomViewSet(viewsets.ModelViewSet):
             logger.warning(f"ROOM delete denied room_id={room.id} user_id={request.user.id}")
             raise PermissionDenied("You can only delete rooms you created.")
         room.is_active = False
-        room.save()
+        # Only is_active (Room.save adds deactivated_at): a full save would write
+        # back activity counters that flushes may have moved since the load
+        room.save(update_fields=['is_active'])
         logger.info(f"ROOM delete room_id={room.id} user_id={request.user.id}")
         return Response(status=status.HTTP_204_NO_CONTENT)
 
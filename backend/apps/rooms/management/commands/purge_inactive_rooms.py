@@ -0,0 +1,81 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from apps.chat.models import Message, RoomReadState
+from apps.rooms.models import Room
+
+
+class Command(BaseCommand):
+    help = 'Hard-delete the messages of rooms that have been inactive longer than the grace period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-days', type=int, default=30, help='Days a room must be inactive before purging')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Messages deleted per transaction')
+        parser.add_argument('--sleep', type=float, default=0.05, help='Seconds to pause between chunks')
+        parser.add_argument('--max-rooms', type=int, help='Stop after purging this many rooms')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the rooms that would be purged')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        cutoff = timezone.now() - timedelta(days=options['grace_days'])
+        rooms = Room.objects.filter(is_active=False, deactivated_at__lt=cutoff).order_by('id')
+        if options['max_rooms']:
+            rooms = rooms[:options['max_rooms']]
+        room_ids = list(rooms.values_list('id', flat=True))
+
+        if options['dry_run']:
+            for room_id in room_ids:
+                self.stdout.write(f'room {room_id}: {Message.objects.filter(room_id=room_id).count()} messages')
+            self.stdout.write(self.style.SUCCESS(f'{len(room_ids)} rooms eligible for purge'))
+            return
+
+        total = 0
+        started = time.perf_counter()
+        for room_id in room_ids:
+            deleted = self.purge_room(room_id, chunk_size, options['sleep'])
+            total += deleted
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'room {room_id}: purged {deleted} messages ({total / elapsed:.0f} rows/s overall)')
+
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged {total} messages from {len(room_ids)} rooms in {elapsed:.1f}s ({rate:.0f} rows/s)'
+        ))
+
+    def purge_room(self, room_id, chunk_size, pause):
+        """Delete a room's messages in ascending id ranges, one short transaction per range"""
+        deleted = 0
+        last_id = 0
+        while True:
+            # Bail out if the room was reactivated while we were purging it
+            if not Room.objects.filter(id=room_id, is_active=False).exists():
+                self.stdout.write(self.style.WARNING(f'room {room_id}: reactivated, stopping'))
+                return deleted
+            ids = list(
+                Message.objects.filter(room_id=room_id, id__gt=last_id)
+                .order_by('id').values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                count, _ = Message.objects.filter(room_id=room_id, id__gte=ids[0], id__lte=ids[-1]).delete()
+            deleted += count
+            last_id = ids[-1]
+            if self.verbosity >= 2:
+                self.stdout.write(f'room {room_id}: {deleted} messages deleted')
+            if pause:
+                time.sleep(pause)
+
+        with transaction.atomic():
+            RoomReadState.objects.filter(room_id=room_id).delete()
+            Room.objects.filter(id=room_id).update(message_count=0, last_message_at=None)
+        return deleted
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Max
+
+from apps.chat.models import Message
+from apps.rooms.models import Room
+
+
+class Command(BaseCommand):
+    help = 'Recompute Room.message_count and Room.last_message_at and repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--room', type=int, action='append', dest='rooms', help='Only reconcile this room id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rooms checked per query')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        rooms = Room.objects.order_by('id')
+        if options['rooms']:
+            rooms = rooms.filter(id__in=options['rooms'])
+
+        checked = repaired = 0
+        last_id = 0
+        while True:
+            batch = list(rooms.filter(id__gt=last_id).values_list('id', 'message_count', 'last_message_at')[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            actual = {
+                row['room_id']: (row['count'], row['last_at'])
+                for row in Message.objects.filter(room_id__in=[room_id for room_id, _, _ in batch])
+                .order_by().values('room_id').annotate(count=Count('id'), last_at=Max('created_at'))
+            }
+            with transaction.atomic():
+                for room_id, count, last_at in batch:
+                    checked += 1
+                    expected = actual.get(room_id, (0, None))
+                    if (count, last_at) == expected:
+                        continue
+                    repaired += 1
+                    self.stdout.write(
+                        f'room {room_id}: message_count {count} -> {expected[0]}, '
+                        f'last_message_at {last_at} -> {expected[1]}'
+                    )
+                    if not options['dry_run']:
+                        Room.objects.filter(id=room_id).update(message_count=expected[0], last_message_at=expected[1])
+
+        verb = 'would repair' if options['dry_run'] else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} rooms, {verb} {repaired}'))
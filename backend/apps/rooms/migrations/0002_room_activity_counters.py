@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:49
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_activity(apps, schema_editor):
+    Room = apps.get_model('rooms', 'Room')
+    Message = apps.get_model('chat', 'Message')
+    per_room = Message.objects.filter(room_id=OuterRef('pk')).order_by().values('room_id')
+    Room.objects.update(
+        message_count=Coalesce(Subquery(per_room.annotate(c=Count('id')).values('c')), 0),
+        last_message_at=Subquery(per_room.annotate(m=Max('created_at')).values('m')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rooms', '0001_initial'),
+        ('chat', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['is_active', '-last_message_at'], name='rooms_active_activity_idx'),
+        ),
+        migrations.RunPython(backfill_activity, migrations.RunPython.noop),
+    ]
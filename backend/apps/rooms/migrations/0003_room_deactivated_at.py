@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-19 07:53
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def stamp_inactive_rooms(apps, schema_editor):
+    # Rooms soft-deleted before this migration start their grace period now
+    Room = apps.get_model('rooms', 'Room')
+    Room.objects.filter(is_active=False, deactivated_at__isnull=True).update(deactivated_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rooms', '0002_room_activity_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='deactivated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(stamp_inactive_rooms, migrations.RunPython.noop),
+    ]
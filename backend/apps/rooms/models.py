@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 
 class Room(models.Model):
@@ -19,16 +20,34 @@ class Room(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+    deactivated_at = models.DateTimeField(null=True, blank=True)
     room_type = models.CharField(
         max_length=10,
         choices=ROOM_TYPE_CHOICES,
         default='chat'
     )
+    # Denormalized activity counters, maintained by apps.rooms.activity
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         verbose_name = 'Room'
         verbose_name_plural = 'Rooms'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', '-last_message_at'], name='rooms_active_activity_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        # Stamp soft deletes so purge_inactive_rooms can honour a grace period
+        if self.is_active:
+            self.deactivated_at = None
+        elif self.deactivated_at is None:
+            self.deactivated_at = timezone.now()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'is_active' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'deactivated_at'}
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.name} ({self.get_room_type_display()})"
@@ -0,0 +1,98 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.rooms.activity import RoomActivityCounter, apply_activity
+from apps.rooms.models import Room
+from apps.chat.models import Message
+
+User = get_user_model()
+
+
+class RoomActivityTest(TestCase):
+    """Test incremental room activity counters"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='user@example.com',
+            name='Test User',
+            password='pass123'
+        )
+        self.room = Room.objects.create(
+            name='Test Room',
+            creator=self.user,
+            room_type='chat'
+        )
+
+    def test_apply_activity(self):
+        """Test deltas are added and last_message_at only moves forward"""
+        now = timezone.now()
+        apply_activity({self.room.id: (3, now)})
+        apply_activity({self.room.id: (2, now - timedelta(hours=1))})
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.message_count, 5)
+        self.assertEqual(self.room.last_message_at, now)
+
+    def test_counter_flushes_first_message(self):
+        """Test an idle counter asks for an immediate flush"""
+        counter = RoomActivityCounter(flush_interval=60)
+        self.assertTrue(counter.record(self.room.id, timezone.now()))
+        counter.flush()
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.message_count, 1)
+
+    def test_counter_batches_under_load(self):
+        """Test messages within the flush interval are folded into one write"""
+        counter = RoomActivityCounter(flush_interval=60)
+        counter.record(self.room.id, timezone.now())
+        counter.flush()
+        for _ in range(4):
+            self.assertFalse(counter.record(self.room.id, timezone.now()))
+        self.assertTrue(counter.has_pending())
+        with CaptureQueriesContext(connection) as ctx:
+            counter.flush()
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.message_count, 5)
+        self.assertFalse(counter.has_pending())
+
+
+class ReconcileRoomCountersCommandTest(TestCase):
+    """Test the reconcile_room_counters management command"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='user@example.com',
+            name='Test User',
+            password='pass123'
+        )
+        self.room = Room.objects.create(name='Test Room', creator=self.user)
+        self.empty_room = Room.objects.create(name='Empty Room', creator=self.user, message_count=7)
+        for i in range(3):
+            Message.objects.create(room=self.room, user=self.user, content=f'Message {i}')
+
+    def test_repairs_drift(self):
+        """Test drifted counters are recomputed"""
+        out = StringIO()
+        call_command('reconcile_room_counters', stdout=out)
+        self.room.refresh_from_db()
+        self.empty_room.refresh_from_db()
+        self.assertEqual(self.room.message_count, 3)
+        self.assertEqual(self.room.last_message_at, Message.objects.latest('created_at').created_at)
+        self.assertEqual(self.empty_room.message_count, 0)
+        self.assertIn('repaired 2', out.getvalue())
+
+    def test_dry_run(self):
+        """Test --dry-run reports drift without writing"""
+        out = StringIO()
+        call_command('reconcile_room_counters', dry_run=True, stdout=out)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.message_count, 0)
+        self.assertIn('would repair 2', out.getvalue())
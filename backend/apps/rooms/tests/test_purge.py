@@ -0,0 +1,80 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+
+from apps.rooms.models import Room
+from apps.chat.models import Message, RoomReadState
+
+User = get_user_model()
+
+
+class PurgeInactiveRoomsCommandTest(TestCase):
+    """Test the purge_inactive_rooms management command"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='user@example.com',
+            name='Test User',
+            password='pass123'
+        )
+        self.active_room = Room.objects.create(name='Active', creator=self.user)
+        self.old_room = Room.objects.create(name='Old', creator=self.user, is_active=False)
+        self.recent_room = Room.objects.create(name='Recent', creator=self.user, is_active=False)
+        Room.objects.filter(id=self.old_room.id).update(deactivated_at=timezone.now() - timedelta(days=40))
+        for room in (self.active_room, self.old_room, self.recent_room):
+            for i in range(5):
+                Message.objects.create(room=room, user=self.user, content=f'Message {i}')
+        RoomReadState.objects.create(room=self.old_room, user=self.user, last_read_message_id=1)
+
+    def run_command(self, **kwargs):
+        out = StringIO()
+        call_command('purge_inactive_rooms', stdout=out, sleep=0, **kwargs)
+        return out.getvalue()
+
+    def test_purges_rooms_past_grace_period(self):
+        """Test only rooms inactive longer than the grace period are purged"""
+        output = self.run_command(chunk_size=2)
+        self.assertEqual(Message.objects.filter(room=self.old_room).count(), 0)
+        self.assertEqual(Message.objects.filter(room=self.recent_room).count(), 5)
+        self.assertEqual(Message.objects.filter(room=self.active_room).count(), 5)
+        self.assertFalse(RoomReadState.objects.filter(room=self.old_room).exists())
+        self.assertIn('Purged 5 messages from 1 rooms', output)
+        self.assertIn('rows/s', output)
+
+    def test_dry_run(self):
+        """Test --dry-run deletes nothing"""
+        output = self.run_command(dry_run=True)
+        self.assertEqual(Message.objects.filter(room=self.old_room).count(), 5)
+        self.assertIn('1 rooms eligible', output)
+
+    def test_grace_days(self):
+        """Test a zero grace period includes recently deactivated rooms"""
+        self.run_command(grace_days=0)
+        self.assertEqual(Message.objects.filter(room=self.recent_room).count(), 0)
+        self.assertEqual(Message.objects.filter(room=self.active_room).count(), 5)
+
+
+class RoomDeactivatedAtTest(TestCase):
+    """Test Room.deactivated_at bookkeeping"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='user@example.com',
+            name='Test User',
+            password='pass123'
+        )
+
+    def test_deactivation_is_stamped_and_cleared(self):
+        room = Room.objects.create(name='Room', creator=self.user)
+        self.assertIsNone(room.deactivated_at)
+        room.is_active = False
+        room.save()
+        self.assertIsNotNone(room.deactivated_at)
+        room.is_active = True
+        room.save(update_fields=['is_active'])
+        room.refresh_from_db()
+        self.assertIsNone(room.deactivated_at)
@@ -1,4 +1,7 @@
+from datetime import timedelta
+
 from django.test import TestCase
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -44,6 +47,26 @@ class RoomViewSetTest(TestCase):
         self.assertIn(self.room.id, room_ids)
         self.assertNotIn(self.inactive_room.id, room_ids)
     
+    def test_list_rooms_by_activity(self):
+        """Test rooms can be ordered by most recent message"""
+        quiet = Room.objects.create(name='Quiet Room', creator=self.user)
+        busy = Room.objects.create(
+            name='Busy Room',
+            creator=self.user,
+            message_count=10,
+            last_message_at=timezone.now()
+        )
+        Room.objects.filter(id=self.room.id).update(
+            message_count=1,
+            last_message_at=timezone.now() - timedelta(days=1)
+        )
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/rooms/', {'ordering': 'activity'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        room_ids = [room['id'] for room in response.data]
+        self.assertEqual(room_ids, [busy.id, self.room.id, quiet.id])
+        self.assertEqual(response.data[0]['message_count'], 10)
+    
     def test_list_rooms_unauthorized(self):
         """Test listing rooms without authentication"""
         response = self.client.get('/api/rooms/')
@@ -143,6 +166,43 @@ class RoomViewSetTest(TestCase):
         self.room.refresh_from_db()
         self.assertTrue(self.room.is_active)
     
+    def _flush_after_load(self):
+        """Patch get_object to apply an activity flush right after the room is loaded"""
+        from unittest import mock
+        from apps.rooms.activity import apply_activity
+        from apps.rooms.api.views import RoomViewSet
+        get_object = RoomViewSet.get_object
+        self.last_at = timezone.now()
+
+        def load_then_flush(view):
+            room = get_object(view)
+            apply_activity({room.id: (5, self.last_at)})
+            return room
+
+        return mock.patch.object(RoomViewSet, 'get_object', load_then_flush)
+
+    def test_update_keeps_concurrent_activity(self):
+        """Test an update does not overwrite counters flushed while it ran"""
+        self.client.force_authenticate(user=self.user)
+        with self._flush_after_load():
+            response = self.client.patch(f'/api/rooms/{self.room.id}/', {'name': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.name, 'Renamed')
+        self.assertEqual(self.room.message_count, 5)
+        self.assertEqual(self.room.last_message_at, self.last_at)
+
+    def test_delete_keeps_concurrent_activity(self):
+        """Test a soft delete does not overwrite counters flushed while it ran"""
+        self.client.force_authenticate(user=self.user)
+        with self._flush_after_load():
+            response = self.client.delete(f'/api/rooms/{self.room.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.room.refresh_from_db()
+        self.assertFalse(self.room.is_active)
+        self.assertIsNotNone(self.room.deactivated_at)
+        self.assertEqual(self.room.message_count, 5)
+
     def test_delete_room_unauthorized(self):
         """Test deleting room without authentication"""
         response = self.client.delete(f'/api/rooms/{self.room.id}/')
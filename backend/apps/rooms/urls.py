@@ -1,13 +1,21 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from apps.rooms.api.views import RoomViewSet
-from apps.chat.api.views import RoomMessagesListView
+from apps.chat.api.views import (
+    RoomMessagesListView,
+    RoomMessagesExportView,
+    RoomUnreadCountsView,
+    RoomWebSocketTicketView,
+)
 
 router = DefaultRouter()
 router.register(r'', RoomViewSet, basename='room')
 
 urlpatterns = [
+    path('unread/', RoomUnreadCountsView.as_view(), name='room-unread'),
     path('', include(router.urls)),
     path('<int:room_id>/messages/', RoomMessagesListView.as_view(), name='room-messages'),
+    path('<int:room_id>/messages/export/', RoomMessagesExportView.as_view(), name='room-messages-export'),
+    path('<int:room_id>/ws-ticket/', RoomWebSocketTicketView.as_view(), name='room-ws-ticket'),
 ]
 
@@ -0,0 +1,24 @@
+import logging
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.views import exception_handler as drf_exception_handler
+
+from apps.users.hashing import PasswordHashingBusy
+
+logger = logging.getLogger('apps.users')
+
+
+class PasswordHashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-ins in progress, please retry shortly.'
+    default_code = 'password_hashing_busy'
+    wait = PasswordHashingBusy.retry_after  # sent as Retry-After by DRF's exception handler
+
+
+def exception_handler(exc, context):
+    """DRF's handler, plus a 503 for a saturated password hashing pool from any view"""
+    if isinstance(exc, PasswordHashingBusy):
+        logger.warning("AUTH password hashing busy: %s", exc)
+        exc = PasswordHashingUnavailable()
+    return drf_exception_handler(exc, context)
@@ -1,9 +1,15 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth import authenticate
+from django.contrib.auth.models import update_last_login
+from django.db import models
 
-from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.users.representations import user_representations
+from apps.users.revocation import revocations
 
 User = get_user_model()
 
@@ -77,8 +83,22 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         if not user.is_active:
             raise AuthenticationFailed('User account is disabled.')
         
-        attrs[self.username_field] = email
-        
+        # Issue the pair here: TokenObtainPairSerializer.validate would run
+        # authenticate() and the password hash a second time.
+        self.user = user
+        refresh = self.get_token(user)
+        if api_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+        return {'refresh': str(refresh), 'access': str(refresh.access_token)}
+
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuses refresh tokens revoked on logout"""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if revocations.is_revoked(refresh.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken('Token has been revoked')
         return super().validate(attrs)
 
 
@@ -88,4 +108,38 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'name', 'email', 'is_active', 'is_staff', 'is_superuser', 
                   'last_login', 'date_joined']
-        read_only_fields = ['id', 'last_login', 'date_joined']
\ No newline at end of file
+        read_only_fields = ['id', 'last_login', 'date_joined']
+
+class CachedUserField(serializers.Field):
+    """Read-only nested user served from the shared representation cache, by id only"""
+
+    def __init__(self, id_attr: str, kind: str = 'profile', **kwargs):
+        kwargs['read_only'] = True
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+        self.id_attr = id_attr
+        self.kind = kind
+
+    def to_representation(self, obj):
+        user_id = getattr(obj, self.id_attr)
+        primed = getattr(self.parent, '_primed_users', None)
+        if primed is not None:
+            return primed[self.kind].get(user_id)
+        return user_representations.get(self.kind, user_id)
+
+
+class CachedUserListSerializer(serializers.ListSerializer):
+    """Resolves the CachedUserFields of all rows with one cache pass (and at most one query) per kind"""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        primed = {}
+        for field in self.child.fields.values():
+            if isinstance(field, CachedUserField) and field.kind not in primed:
+                ids = [getattr(item, field.id_attr) for item in items]
+                primed[field.kind] = user_representations.get_many(field.kind, ids)
+        self.child._primed_users = primed
+        try:
+            return super().to_representation(items)
+        finally:
+            del self.child._primed_users
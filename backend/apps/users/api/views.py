@@ -1,16 +1,30 @@
+import hashlib
+import json
 import logging
+from itertools import islice
 
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from rest_framework.generics import CreateAPIView, RetrieveUpdateDestroyAPIView
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from apps.users.provisioning import decode_lines, provision, read_rows
+from apps.users.representations import user_representations
+from apps.users.revocation import revocations
 from apps.users.api.serializers import (
     UserRegistrationSerializer, 
     UserSerializer,
-    CustomTokenObtainPairSerializer
+    CustomTokenObtainPairSerializer,
+    CustomTokenRefreshSerializer,
 )
 
 logger = logging.getLogger('apps.users')
@@ -37,6 +51,11 @@ class UserLoginView(TokenObtainPairView):
     permission_classes = [AllowAny]
 
 
+class UserTokenRefreshView(TokenRefreshView):
+    """Refresh an access token unless the refresh token was revoked"""
+    serializer_class = CustomTokenRefreshSerializer
+
+
 class UserProfileView(RetrieveUpdateDestroyAPIView):
     """Get, update, or delete user profile"""
     permission_classes = [IsAuthenticated]
@@ -55,12 +74,91 @@ class UserProfileView(RetrieveUpdateDestroyAPIView):
 
 
 class UserLogoutView(APIView):
-    """Logout (frontend should delete token from storage)"""
+    """Logout: revoke the access token and, if sent, the refresh token"""
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
+        if request.auth is not None:
+            revocations.revoke(request.auth, user=request.user)
+        refresh = request.data.get('refresh') if hasattr(request.data, 'get') else None
+        if refresh:
+            try:
+                token = RefreshToken(refresh)
+            except TokenError:
+                token = None
+            if token is not None and str(token.get(api_settings.USER_ID_CLAIM)) == str(getattr(request.user, api_settings.USER_ID_FIELD)):
+                revocations.revoke(token, user=request.user)
         logger.info(f"AUTH logout user_id={request.user.id}")
         return Response(
             {'message': 'Successfully logged out'}, 
             status=status.HTTP_200_OK
-        )
\ No newline at end of file
+        )
+
+
+class BulkUserCreateView(APIView):
+    """Create many users at once from NDJSON, CSV or a JSON list (staff only)"""
+    permission_classes = [IsAdminUser]
+    parser_classes = [JSONParser, MultiPartParser]
+    STREAM_TYPES = {'text/csv': 'csv', 'application/x-ndjson': 'ndjson', 'application/jsonl': 'ndjson'}
+
+    def get_rows(self, request):
+        content_type = (request.content_type or '').split(';')[0].strip().lower()
+        if content_type in self.STREAM_TYPES:
+            stream = request.stream
+            return read_rows(decode_lines(stream) if stream is not None else [], self.STREAM_TYPES[content_type])
+        if content_type == 'multipart/form-data':
+            upload = request.FILES.get('file')
+            if upload is None:
+                return None
+            fmt = 'csv' if upload.name.lower().endswith('.csv') else 'ndjson'
+            return read_rows(decode_lines(upload), fmt)
+        data = request.data
+        if isinstance(data, dict):
+            data = data.get('users')
+        if not isinstance(data, list):
+            return None
+        return (row if isinstance(row, dict) else {'__error__': 'Each item must be a JSON object.'} for row in data)
+
+    def post(self, request):
+        rows = self.get_rows(request)
+        if rows is None:
+            return Response(
+                {'detail': 'Send a JSON list (or {"users": [...]}), NDJSON, CSV or a multipart "file".'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = settings.BULK_USERS_MAX_ROWS
+        rows = list(islice(rows, limit + 1))
+        if len(rows) > limit:
+            return Response(
+                {'detail': f'At most {limit} rows per request; use manage.py bulk_create_users for larger files.'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+        result = provision(rows)
+        logger.info("AUTH bulk create by user_id=%s created=%s failed=%s",
+                    request.user.id, result.created, len(result.errors))
+        return Response(result.as_dict(), status=status.HTTP_200_OK)
+
+
+class UserLookupView(APIView):
+    """Names of many users at once: GET ?ids=1,2,3 -> {"users": {"1": {"name": ...}, ...}}"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        raw = ','.join(request.query_params.getlist('ids'))
+        try:
+            ids = sorted({int(part) for part in raw.split(',') if part.strip()})
+        except ValueError:
+            return Response({'detail': '"ids" must be a comma-separated list of integers.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        limit = settings.USER_LOOKUP_MAX_IDS
+        if not ids or len(ids) > limit:
+            return Response({'detail': f'Pass between 1 and {limit} ids.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        found = user_representations.get_many('name', ids)
+        data = {'users': {str(user_id): found[user_id] for user_id in ids if user_id in found}}
+        body = json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+        etag = quote_etag(hashlib.md5(body, usedforsecurity=False).hexdigest())
+        response = get_conditional_response(request, etag=etag) or Response(data, status=status.HTTP_200_OK)
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, max_age=settings.USER_LOOKUP_MAX_AGE)
+        return response
@@ -0,0 +1,42 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from apps.users.revocation import revocations
+from apps.users.user_cache import user_cache
+
+
+class RevocationCheckingJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that also rejects tokens revoked on logout"""
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if revocations.is_revoked(token.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken('Token has been revoked')
+        return token
+
+
+class CachedUserJWTAuthentication(RevocationCheckingJWTAuthentication):
+    """Resolves the token's user from the per-process user cache when possible"""
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+        user = user_cache.get(user_id)
+        if user is not None and self._still_valid(user, validated_token):
+            return user
+        version = user_cache.version(user_id)
+        user = super().get_user(validated_token)
+        user_cache.put(user_id, user, version)
+        return user
+
+    @staticmethod
+    def _still_valid(user, validated_token) -> bool:
+        # Same checks as JWTAuthentication.get_user; failures fall back to it
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            return False
+        if api_settings.CHECK_REVOKE_TOKEN:
+            return validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) == get_md5_hash_password(user.password)
+        return True
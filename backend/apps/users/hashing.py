@@ -0,0 +1,181 @@
+"""Password hashing and verification in a size-capped process pool.
+
+PBKDF2 is pure CPU. Running it in a few dedicated worker processes keeps a
+burst of logins or registrations from competing with request threads and
+the event loop, and bounds how much CPU it can take. When more than
+PASSWORD_HASH_MAX_PENDING calls are queued or running, new ones fail fast
+with PasswordHashingBusy instead of piling up, as do calls that wait
+longer than PASSWORD_HASH_TIMEOUT; the API answers those with 503 and
+Retry-After (apps.users.api.exceptions). PASSWORD_HASH_WORKERS = 0 hashes
+inline.
+
+Only API requests use the pool (see PasswordHashPoolMiddleware). Management
+commands, the admin and the shell hash inline: there is no client there to
+retry a busy error.
+"""
+import contextvars
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from apps.common.metrics import (
+    password_hash_duration,
+    password_hash_pending,
+    password_hash_queue_duration,
+    password_hash_rejected,
+)
+
+
+class PasswordHashingBusy(Exception):
+    """The hashing pool is saturated or did not answer in time; retry shortly"""
+    retry_after = 1
+
+
+def _init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def _timed(func, *args):
+    started = time.time()
+    return started, func(*args), time.time() - started
+
+
+class PasswordHashPool:
+    def __init__(self, workers: int, max_pending: int, timeout: float = 30.0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that runs log and DB threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings'),),
+                )
+            return self._executor
+
+    def _release(self, _future=None):
+        with self._lock:
+            self.pending -= 1
+            password_hash_pending.set(self.pending)
+
+    def run(self, func, *args):
+        if self.workers <= 0:
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                password_hash_duration.observe(time.perf_counter() - started)
+
+        with self._lock:
+            if self.pending >= self.max_pending:
+                password_hash_rejected.inc()
+                raise PasswordHashingBusy()
+            self.pending += 1
+            password_hash_pending.set(self.pending)
+        submitted = time.time()
+        try:
+            future = self._get_executor().submit(_timed, func, *args)
+        except BaseException:
+            self._release()
+            raise
+        # Released when the work finishes, even if the caller gave up waiting
+        future.add_done_callback(self._release)
+        try:
+            started, result, elapsed = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise PasswordHashingBusy(f'no hashing worker answered within {self.timeout}s') from None
+        password_hash_queue_duration.observe(max(started - submitted, 0.0))
+        password_hash_duration.observe(elapsed)
+        return result
+
+    def map(self, func, items, chunksize: int = 8) -> list:
+        """Bulk work (provisioning); not subject to max_pending"""
+        items = list(items)
+        if self.workers <= 0:
+            return [func(item) for item in items]
+        return list(self._get_executor().map(func, items, chunksize=chunksize))
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> PasswordHashPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PasswordHashPool(
+                workers=getattr(settings, 'PASSWORD_HASH_WORKERS', 0),
+                max_pending=getattr(settings, 'PASSWORD_HASH_MAX_PENDING', 32),
+                timeout=getattr(settings, 'PASSWORD_HASH_TIMEOUT', 30.0),
+            )
+        return _pool
+
+
+_bulk_pool = None
+
+
+def get_bulk_pool() -> PasswordHashPool:
+    """Separate workers for bulk provisioning, so logins never queue behind it"""
+    global _bulk_pool
+    with _pool_lock:
+        if _bulk_pool is None:
+            _bulk_pool = PasswordHashPool(
+                workers=getattr(settings, 'PASSWORD_HASH_BULK_WORKERS', 0),
+                max_pending=0,
+            )
+        return _bulk_pool
+
+
+_use_pool = contextvars.ContextVar('password_hash_pool', default=False)
+
+
+def enable_pool():
+    """Hash in the pool for the rest of this context; returns a token for reset_pool"""
+    return _use_pool.set(True)
+
+
+def reset_pool(token):
+    _use_pool.reset(token)
+
+
+def _run(func, *args):
+    if _use_pool.get():
+        return get_pool().run(func, *args)
+    started = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        password_hash_duration.observe(time.perf_counter() - started)
+
+
+def make_password(raw_password) -> str:
+    if raw_password is None:
+        return hashers.make_password(None)  # unusable marker, no hashing
+    return _run(hashers.make_password, raw_password)
+
+
+def verify_password(raw_password, encoded):
+    """(is_correct, must_update) as django.contrib.auth.hashers.verify_password"""
+    return _run(hashers.verify_password, raw_password, encoded)
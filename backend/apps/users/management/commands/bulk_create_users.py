@@ -0,0 +1,56 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.users.hashing import PasswordHashPool
+from apps.users.provisioning import DEFAULT_CHUNK_SIZE, provision, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Create users in bulk from an NDJSON or CSV file with email, name and optional password'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file; rows without a password get an unusable one')
+        parser.add_argument('--format', choices=['ndjson', 'csv'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Password hashing processes (0 hashes inline)')
+        parser.add_argument('--errors', help='Write rejected rows as NDJSON to this file')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+
+        pool = PasswordHashPool(workers=options['workers'], max_pending=0)
+        started = time.perf_counter()
+
+        def progress(rows, result):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{rows} rows processed, {result.created} created ({result.created / elapsed:.0f} users/s)')
+
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as fh:
+                result = provision(read_rows(fh, fmt), options['chunk_size'], pool=pool, on_chunk=progress)
+        finally:
+            pool.shutdown()
+
+        if options['errors']:
+            with open(options['errors'], 'w', encoding='utf-8') as out:
+                for error in result.errors:
+                    out.write(json.dumps(error) + '\n')
+        elif result.errors:
+            for error in result.errors[:20]:
+                self.stderr.write(f"row {error['row']} {error['email']}: {json.dumps(error['errors'])}")
+            if len(result.errors) > 20:
+                self.stderr.write(f'... {len(result.errors) - 20} more (use --errors FILE)')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result.created} users, rejected {len(result.errors)} rows in {elapsed:.1f}s'
+        ))
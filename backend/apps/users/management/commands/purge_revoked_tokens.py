@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.users.revocation import revocations
+
+
+class Command(BaseCommand):
+    help = 'Delete RevokedToken rows of tokens that have expired'
+
+    def handle(self, *args, **options):
+        deleted = revocations.purge()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired revoked tokens'))
@@ -0,0 +1,22 @@
+from apps.common.middleware import HookMiddleware
+from apps.users import hashing
+
+API_PREFIX = '/api/'
+
+
+class PasswordHashPoolMiddleware(HookMiddleware):
+    """Hash passwords in the worker pool while serving API requests.
+
+    API clients get a 503 with Retry-After when the pool is busy
+    (apps.users.api.exceptions); other pages, such as the admin, hash inline.
+    """
+
+    def process_request(self, request):
+        if request.path_info.startswith(API_PREFIX):
+            request._hash_pool_token = hashing.enable_pool()
+
+    def process_response(self, request, response):
+        token = getattr(request, '_hash_pool_token', None)
+        if token is not None:
+            hashing.reset_pool(token)
+        return response
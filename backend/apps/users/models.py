@@ -1,6 +1,10 @@
+from asgiref.sync import sync_to_async
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 
+from apps.users import hashing
+from apps.users.user_cache import user_cache
+
 
 class UserManager(BaseUserManager):
     """Custom user manager for email-based authentication"""
@@ -56,3 +60,53 @@ class User(AbstractUser):
 
     def get_short_name(self):
         return self.name
+
+    # Invalidate this user in the authenticated user cache (apps.users.user_cache)
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # update_last_login saves on every sign-in; nothing cached depends on it
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) != {'last_login'}:
+            user_cache.bump(self.pk)
+
+    def delete(self, *args, **kwargs):
+        user_id = self.pk
+        result = super().delete(*args, **kwargs)
+        user_cache.bump(user_id)
+        return result
+
+    # Hashing and verification run in the password hashing pool (apps.users.hashing)
+    def set_password(self, raw_password):
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        is_correct, must_update = hashing.verify_password(raw_password, self.password)
+        if is_correct and must_update:
+            try:
+                self.set_password(raw_password)
+            except hashing.PasswordHashingBusy:
+                return is_correct  # upgrade the hash on a later sign-in
+            self._password = None
+            self.save(update_fields=['password'])
+        return is_correct
+
+    async def acheck_password(self, raw_password):
+        # Django's version verifies inline on the event loop; use the pool too
+        return await sync_to_async(self.check_password)(raw_password)
+
+
+class RevokedToken(models.Model):
+    """JWT ids revoked before they expire; mirrored in memory by apps.users.revocation"""
+    id = models.BigAutoField(primary_key=True)
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey('users.User', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Revoked token'
+        verbose_name_plural = 'Revoked tokens'
+
+    def __str__(self):
+        return self.jti
@@ -0,0 +1,173 @@
+"""Bulk user creation shared by POST /api/auth/users/bulk/ and `manage.py bulk_create_users`.
+
+Rows are handled in chunks: field validation is CPU-only, email uniqueness
+is one set-based query per chunk, passwords are hashed in parallel worker
+processes and users are inserted with bulk_create. A bad row is reported
+with its row number and never aborts the rest of the chunk.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.contrib.auth import get_user_model, hashers
+from django.core.exceptions import ValidationError
+from django.core.validators import EmailValidator
+from django.db import IntegrityError, transaction
+
+from apps.users.hashing import get_bulk_pool
+
+User = get_user_model()
+
+DEFAULT_CHUNK_SIZE = 1000
+DUPLICATE_EMAIL = 'A user with this email already exists.'
+PASSWORD_MIN_LENGTH = 8
+
+# field: (max length, required)
+ROW_FIELDS = {'email': (254, True), 'name': (255, True), 'password': (None, False)}
+_validate_email = EmailValidator()
+
+
+def validate_row(row: dict):
+    """(cleaned data, None) or (None, {field: [messages]}) for one row; uniqueness is checked per chunk"""
+    data, errors = {}, {}
+    for field, (max_length, required) in ROW_FIELDS.items():
+        value = row.get(field)
+        if value is None:
+            if required:
+                errors[field] = ['This field is required.']
+            continue
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            errors[field] = ['Not a valid string.']
+            continue
+        value = str(value).strip()
+        if not value:
+            errors[field] = ['This field may not be blank.']
+        elif max_length and len(value) > max_length:
+            errors[field] = [f'Ensure this field has no more than {max_length} characters.']
+        else:
+            data[field] = value
+    if 'password' in data and len(data['password']) < PASSWORD_MIN_LENGTH:
+        errors['password'] = [f'Ensure this field has at least {PASSWORD_MIN_LENGTH} characters.']
+    if 'email' in data:
+        try:
+            _validate_email(data['email'])
+        except ValidationError as e:
+            errors['email'] = list(e.messages)
+        else:
+            data['email'] = User.objects.normalize_email(data['email'])
+    return (None, errors) if errors else (data, None)
+
+
+def read_rows(fh, fmt: str):
+    """Yield dicts from an NDJSON or CSV text stream; an unparsable line yields its error"""
+    if fmt == 'csv':
+        yield from csv.DictReader(fh)
+        return
+    for line in fh:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            row = {'__error__': f'Invalid JSON: {e}'}
+        yield row if isinstance(row, dict) else {'__error__': 'Each line must be a JSON object.'}
+
+
+def _hash(password):
+    return hashers.make_password(password)
+
+
+class BulkResult:
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+
+    def error(self, row: int, email, errors):
+        self.errors.append({'row': row, 'email': email or '', 'errors': errors})
+
+    def as_dict(self) -> dict:
+        return {'created': self.created, 'failed': len(self.errors), 'errors': self.errors}
+
+
+def provision_chunk(rows, first_row: int, result: BulkResult, pool=None):
+    """Validate, hash and insert one chunk; rows are numbered from `first_row`"""
+    errors_before = len(result.errors)
+    valid = []
+    seen = set()
+    for number, row in enumerate(rows, start=first_row):
+        if '__error__' in row:
+            result.error(number, '', {'non_field_errors': [row['__error__']]})
+            continue
+        # CSV gives '' (or None for short lines) where NDJSON would omit the key
+        row = {k: v for k, v in row.items() if k is not None and v not in (None, '')}
+        data, errors = validate_row(row)
+        if errors:
+            result.error(number, row.get('email'), errors)
+            continue
+        if data['email'] in seen:
+            result.error(number, data['email'], {'email': ['Duplicate email in this upload.']})
+            continue
+        seen.add(data['email'])
+        valid.append((number, data))
+
+    existing = set(User.objects.filter(email__in=seen).values_list('email', flat=True))
+    fresh = []
+    for number, data in valid:
+        if data['email'] in existing:
+            result.error(number, data['email'], {'email': [DUPLICATE_EMAIL]})
+        else:
+            fresh.append((number, data))
+
+    pool = pool or get_bulk_pool()
+    with_password = [data['password'] for _, data in fresh if data.get('password')]
+    hashes = iter(pool.map(_hash, with_password))
+    unusable = hashers.make_password(None)
+    users = [
+        User(email=data['email'], name=data['name'],
+             password=next(hashes) if data.get('password') else unusable)
+        for _, data in fresh
+    ]
+    result.created += _insert(users, fresh, result)
+    result.errors[errors_before:] = sorted(result.errors[errors_before:], key=lambda e: e['row'])
+
+
+def _insert(users, fresh, result: BulkResult) -> int:
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+        return len(users)
+    except IntegrityError:
+        pass
+    # Someone registered one of these emails since the uniqueness check
+    taken = set(User.objects.filter(email__in=[u.email for u in users]).values_list('email', flat=True))
+    keep = []
+    for user, (number, data) in zip(users, fresh):
+        if user.email in taken:
+            result.error(number, user.email, {'email': [DUPLICATE_EMAIL]})
+        else:
+            keep.append(user)
+    with transaction.atomic():
+        User.objects.bulk_create(keep)
+    return len(keep)
+
+
+def provision(rows, chunk_size: int = DEFAULT_CHUNK_SIZE, pool=None, on_chunk=None) -> BulkResult:
+    result = BulkResult()
+    rows = iter(rows)
+    first_row = 1
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return result
+        provision_chunk(chunk, first_row, result, pool)
+        first_row += len(chunk)
+        if on_chunk is not None:
+            on_chunk(first_row - 1, result)
+
+
+def decode_lines(lines):
+    """Text lines from an iterable of UTF-8 byte lines (request body, uploaded file)"""
+    for number, line in enumerate(lines):
+        text = line.decode('utf-8', errors='replace')
+        yield text.lstrip('\ufeff') if number == 0 else text
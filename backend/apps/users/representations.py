@@ -0,0 +1,107 @@
+"""Shared cache of serialized users for nested representations.
+
+Rooms embed their creator and every chat message embeds its author, so the
+same few users are serialized over and over. Representations are cached
+per kind ('summary' for messages, 'profile' for room creators, 'name' for
+the user lookup endpoint) and keyed by (user id, profile version): the
+version is the counter apps.users.user_cache bumps whenever a user is saved
+or deleted, so a profile edit is visible on the next lookup in this
+process. Other processes see it within
+USER_REPRESENTATION_CACHE_TTL seconds. Cached dicts are shared between
+callers and must be treated as read-only.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from apps.common.metrics import user_representation_cache_lookups
+from apps.users.user_cache import user_cache
+
+
+def _summary(user) -> dict:
+    return {'id': user.id, 'email': user.email or '', 'name': user.name or ''}
+
+
+def _profile(user) -> dict:
+    from apps.users.api.serializers import UserSerializer
+    return dict(UserSerializer(user).data)
+
+
+KINDS = {
+    'name': lambda user: {'name': user.name or ''},
+    'summary': _summary,
+    'profile': _profile,
+}
+
+
+class UserRepresentationCache:
+    def __init__(self, ttl: float = None, max_size: int = None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = {}  # (kind, user id) -> (data, version, expires)
+        self._lock = threading.Lock()
+        self._hits = user_representation_cache_lookups.labels('hit')
+        self._misses = user_representation_cache_lookups.labels('miss')
+
+    def _ttl(self) -> float:
+        if self.ttl is not None:
+            return self.ttl
+        return getattr(settings, 'USER_REPRESENTATION_CACHE_TTL', 60)
+
+    def _max_size(self) -> int:
+        if self.max_size is not None:
+            return self.max_size
+        return getattr(settings, 'USER_REPRESENTATION_CACHE_SIZE', 20000)
+
+    def _cached(self, kind: str, user_id: int):
+        entry = self._entries.get((kind, user_id))
+        if entry is None or entry[1] != user_cache.version(user_id) or entry[2] < time.monotonic():
+            return None
+        return entry[0]
+
+    def _put(self, kind: str, user_id: int, data: dict, version: int):
+        ttl = self._ttl()
+        if ttl <= 0:
+            return
+        key = (kind, user_id)
+        with self._lock:
+            if len(self._entries) >= self._max_size() and key not in self._entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (data, version, time.monotonic() + ttl)
+
+    def get(self, kind: str, user_id):
+        """Representation of one user, loading it on a miss; None if the user does not exist"""
+        if user_id is None:
+            return None
+        return self.get_many(kind, (user_id,)).get(int(user_id))
+
+    def get_many(self, kind: str, user_ids) -> dict:
+        """{user id: representation}, loading all misses with one query"""
+        found, missing = {}, []
+        for user_id in {int(u) for u in user_ids if u is not None}:
+            data = self._cached(kind, user_id)
+            if data is None:
+                missing.append(user_id)
+            else:
+                found[user_id] = data
+        self._hits.inc(len(found))
+        if missing:
+            self._misses.inc(len(missing))
+            from django.contrib.auth import get_user_model
+            build = KINDS[kind]
+            versions = {user_id: user_cache.version(user_id) for user_id in missing}
+            for user_id, user in get_user_model().objects.in_bulk(missing).items():
+                data = found[user_id] = build(user)
+                self._put(kind, user_id, data, versions[user_id])
+        return found
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+user_representations = UserRepresentationCache()
@@ -0,0 +1,134 @@
+"""JWT revocation list: a durable RevokedToken table mirrored in every process.
+
+The question asked on every authenticated REST request and WS connect is
+"is this jti revoked?", and the answer is almost always no. Each process
+keeps the revoked jtis in a dict (jti -> expiry) and answers from memory.
+The first lookup loads the table; after that, every
+TOKEN_REVOCATION_SYNC_INTERVAL seconds a background thread pulls the rows
+revoked since the last sync, so other workers' revocations arrive within
+about one interval without a query on the request path. Rows are read by
+`revoked_at` with an overlap window rather than by id, since ids can commit
+out of order. Revocations made in this process apply immediately. Entries
+are dropped once the token would have expired anyway. The background thread
+also deletes expired rows from the table every TOKEN_REVOCATION_PURGE_INTERVAL
+seconds (or run `manage.py purge_revoked_tokens`); lookups never do.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, connection
+from django.utils import timezone
+
+logger = logging.getLogger('apps.users')
+
+# Re-read rows revoked this long before the newest one seen, to catch
+# transactions that committed after a later row
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+class RevocationList:
+    def __init__(self, sync_interval: float = None, background: bool = True):
+        self.sync_interval = sync_interval
+        self.background = background
+        self._revoked = {}
+        self._since = None  # revoked_at of the newest row seen
+        self._next_sync = 0.0
+        self._next_prune = 0.0
+        self._next_purge = 0.0
+        self._syncing = False
+        self._lock = threading.Lock()
+
+    def _interval(self) -> float:
+        if self.sync_interval is not None:
+            return self.sync_interval
+        return getattr(settings, 'TOKEN_REVOCATION_SYNC_INTERVAL', 5.0)
+
+    def is_revoked(self, jti) -> bool:
+        if time.monotonic() >= self._next_sync:
+            # Within a transaction another connection may not see, or may wait
+            # on, rows this one wrote: sync inline there
+            if self.background and self._since is not None and not connection.in_atomic_block:
+                self._sync_in_background()
+            else:
+                self.sync()
+        return jti in self._revoked
+
+    def _sync_in_background(self):
+        with self._lock:
+            if self._syncing:
+                return
+            self._syncing = True
+        threading.Thread(target=self._background_sync, name='revocation-sync', daemon=True).start()
+
+    def _background_sync(self):
+        try:
+            self.sync()
+            # Only here, off the request path: a purge deletes across the whole table
+            now = time.monotonic()
+            if now >= self._next_purge:
+                self._next_purge = now + getattr(settings, 'TOKEN_REVOCATION_PURGE_INTERVAL', 3600)
+                self.purge()
+        except Exception:
+            logger.exception("AUTH revocation sync failed")
+        finally:
+            self._syncing = False
+            connection.close()
+
+    def sync(self):
+        """Pull revocations added by any process since the last sync"""
+        from apps.users.models import RevokedToken
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+        # Set first so a failing database is retried once per interval, not per request
+        self._next_sync = now + self._interval()
+        if self._since is None:
+            rows = RevokedToken.objects.filter(expires_at__gt=timezone.now())
+        else:
+            rows = RevokedToken.objects.filter(revoked_at__gte=self._since - SYNC_OVERLAP)
+        fetched = list(rows.values_list('jti', 'expires_at', 'revoked_at').iterator(chunk_size=2000))
+        with self._lock:
+            for jti, expires_at, revoked_at in fetched:
+                self._revoked[jti] = expires_at.timestamp()
+                if self._since is None or revoked_at > self._since:
+                    self._since = revoked_at
+            if self._since is None:
+                self._since = timezone.now() - SYNC_OVERLAP
+            if now >= self._next_prune:
+                cutoff = time.time()
+                self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > cutoff}
+                self._next_prune = now + 60
+
+    def purge(self) -> int:
+        """Delete rows of tokens that have expired; they can no longer authenticate"""
+        from apps.users.models import RevokedToken
+        deleted, _ = RevokedToken.objects.filter(expires_at__lt=timezone.now()).delete()
+        if deleted:
+            logger.info("AUTH revocation purge deleted=%s", deleted)
+        return deleted
+
+    def revoke(self, token, user=None):
+        """Revoke a validated simplejwt token (access or refresh)"""
+        from apps.users.models import RevokedToken
+        jti = token.get('jti')
+        exp = token.get('exp')
+        if not jti or not exp:
+            return
+        try:
+            RevokedToken.objects.get_or_create(
+                jti=jti,
+                defaults={'user': user, 'expires_at': datetime.fromtimestamp(exp, tz=dt_timezone.utc)},
+            )
+        except IntegrityError:
+            pass  # revoked concurrently
+        with self._lock:
+            self._revoked[jti] = float(exp)
+
+    def __len__(self):
+        return len(self._revoked)
+
+
+revocations = RevocationList()
@@ -0,0 +1,153 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from apps.users.hashing import PasswordHashPool
+from apps.users.provisioning import BulkResult, provision_chunk, validate_row
+
+User = get_user_model()
+
+
+def ndjson(rows):
+    return ''.join(json.dumps(row) + '\n' for row in rows)
+
+
+class ValidateRowTest(TestCase):
+    """Test validate_row"""
+
+    def test_cleans_valid_row(self):
+        data, errors = validate_row({'email': ' Ann@EXAMPLE.com ', 'name': 'Ann', 'password': 'longenough'})
+        self.assertIsNone(errors)
+        self.assertEqual(data, {'email': 'Ann@example.com', 'name': 'Ann', 'password': 'longenough'})
+
+    def test_field_errors(self):
+        data, errors = validate_row({'email': 'nope', 'name': 'x' * 256, 'password': 'short'})
+        self.assertIsNone(data)
+        self.assertEqual(set(errors), {'email', 'name', 'password'})
+        self.assertEqual(validate_row({'name': True})[1], {'email': ['This field is required.'], 'name': ['Not a valid string.']})
+
+
+class ProvisionChunkTest(TestCase):
+    """Test provision_chunk"""
+
+    def setUp(self):
+        self.pool = PasswordHashPool(workers=0, max_pending=0)
+        User.objects.create_user(email='taken@example.com', name='Taken', password='pass12345')
+
+    def test_reports_row_errors_and_creates_the_rest(self):
+        """Test bad rows are reported by number while valid rows are inserted"""
+        rows = [
+            {'email': 'a@example.com', 'name': 'A', 'password': 'longenough'},
+            {'email': 'not-an-email', 'name': 'B'},
+            {'email': 'c@example.com', 'name': 'C', 'password': 'short'},
+            {'email': 'taken@example.com', 'name': 'D'},
+            {'email': 'a@example.com', 'name': 'A again'},
+            {'email': 'e@example.com', 'name': 'E'},
+        ]
+        result = BulkResult()
+        provision_chunk(rows, 1, result, self.pool)
+        self.assertEqual(result.created, 2)
+        self.assertEqual([e['row'] for e in result.errors], [2, 3, 4, 5])
+        self.assertIn('email', result.errors[0]['errors'])
+        self.assertIn('password', result.errors[1]['errors'])
+        self.assertIn('already exists', result.errors[2]['errors']['email'][0])
+        self.assertTrue(User.objects.get(email='a@example.com').check_password('longenough'))
+        self.assertFalse(User.objects.get(email='e@example.com').has_usable_password())
+
+    def test_one_existence_query_per_chunk(self):
+        """Test uniqueness is checked with a single query and users inserted in bulk"""
+        rows = [{'email': f'u{i}@example.com', 'name': f'U{i}'} for i in range(50)]
+        with CaptureQueriesContext(connection) as ctx:
+            provision_chunk(rows, 1, BulkResult(), self.pool)
+        selects = [q for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(selects), 1)
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(User.objects.filter(email__startswith='u').count(), 50)
+
+
+class BulkUserCreateViewTest(TestCase):
+    """Test POST /api/auth/users/bulk/"""
+
+    url = '/api/auth/users/bulk/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = User.objects.create_user(email='staff@example.com', name='Staff', password='pass12345', is_staff=True)
+        self.user = User.objects.create_user(email='user@example.com', name='User', password='pass12345')
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, [{'email': 'x@example.com', 'name': 'X'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_json_list(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.post(self.url, [
+            {'email': 'x@example.com', 'name': 'X'},
+            {'email': 'user@example.com', 'name': 'Dup'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+
+    def test_ndjson_body(self):
+        """Test an NDJSON body, including an unparsable line"""
+        self.client.force_authenticate(user=self.staff)
+        body = ndjson([{'email': 'n1@example.com', 'name': 'N1'}]) + 'not json\n' + ndjson([{'email': 'n2@example.com', 'name': 'N2'}])
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+
+    def test_csv_upload(self):
+        """Test a multipart CSV file upload"""
+        self.client.force_authenticate(user=self.staff)
+        upload = SimpleUploadedFile('users.csv', b'email,name,password\nc1@example.com,C1,\nc2@example.com,C2,\n')
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.data['created'], 2)
+        self.assertTrue(User.objects.filter(email='c2@example.com').exists())
+
+    @override_settings(BULK_USERS_MAX_ROWS=2)
+    def test_row_limit(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.post(self.url, [{'email': f'l{i}@example.com', 'name': 'L'} for i in range(3)], format='json')
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(User.objects.filter(email__startswith='l').exists())
+
+    def test_rejects_unknown_payload(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.post(self.url, {'foo': 'bar'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkCreateUsersCommandTest(TestCase):
+    """Test the bulk_create_users management command"""
+
+    def write(self, suffix, content):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            fh.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_creates_users_and_writes_errors(self):
+        path = self.write('.csv', 'email,name\nb1@example.com,B1\nbad,B2\nb3@example.com,B3\n')
+        errors = self.write('.ndjson', '')
+        out = StringIO()
+        call_command('bulk_create_users', path, '--workers', '0', '--chunk-size', '2', '--errors', errors, stdout=out)
+        self.assertEqual(User.objects.filter(email__in=['b1@example.com', 'b3@example.com']).count(), 2)
+        with open(errors, encoding='utf-8') as fh:
+            rejected = [json.loads(line) for line in fh]
+        self.assertEqual([r['row'] for r in rejected], [2])
+        self.assertIn('Created 2 users, rejected 1 rows', out.getvalue())
@@ -0,0 +1,90 @@
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model, hashers
+from django.test import TestCase
+
+from apps.common.metrics import password_hash_rejected
+from apps.users import hashing
+from apps.users.hashing import PasswordHashingBusy, PasswordHashPool
+
+
+class PasswordHashPoolTest(TestCase):
+    """Test PasswordHashPool"""
+
+    def test_inline_when_no_workers(self):
+        pool = PasswordHashPool(workers=0, max_pending=1)
+        encoded = pool.run(hashers.make_password, 'secret-pass')
+        self.assertEqual(pool.run(hashers.verify_password, 'secret-pass', encoded), (True, False))
+        self.assertIsNone(pool._executor)
+
+    def test_runs_in_worker_process(self):
+        """Test hashing and verification round-trip through a worker process"""
+        pool = PasswordHashPool(workers=1, max_pending=4)
+        self.addCleanup(pool.shutdown)
+        encoded = pool.run(hashers.make_password, 'secret-pass')
+        self.assertTrue(hashers.check_password('secret-pass', encoded))
+        self.assertEqual(pool.run(hashers.verify_password, 'wrong-pass', encoded), (False, False))
+        self.assertEqual(pool.pending, 0)
+
+    def test_fast_reject_when_full(self):
+        """Test calls beyond max_pending fail immediately and are counted"""
+        pool = PasswordHashPool(workers=1, max_pending=2)
+        pool.pending = 2
+        rejected = password_hash_rejected.labels().value
+        with self.assertRaises(PasswordHashingBusy):
+            pool.run(hashers.make_password, 'secret-pass')
+        self.assertEqual(password_hash_rejected.labels().value, rejected + 1)
+        self.assertIsNone(pool._executor)
+
+    def test_timeout_reported_as_busy(self):
+        """Test a call that outlives the timeout fails as busy and frees its slot when done"""
+        pool = PasswordHashPool(workers=1, max_pending=4, timeout=0.01)
+        self.addCleanup(pool.shutdown)
+        with self.assertRaises(PasswordHashingBusy):
+            pool.run(time.sleep, 0.5)
+        pool.shutdown()
+        self.assertEqual(pool.pending, 0)
+
+
+class UserPasswordTest(TestCase):
+    """Test the user model hashes through the pool"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com', name='Test', password='testpass123',
+        )
+
+    def busy_pool(self):
+        busy = PasswordHashPool(workers=1, max_pending=1)
+        busy.pending = 1
+        return mock.patch.object(hashing, 'get_pool', return_value=busy)
+
+    def test_busy_pool_raises_domain_error(self):
+        token = hashing.enable_pool()
+        self.addCleanup(hashing.reset_pool, token)
+        with self.busy_pool(), self.assertRaises(PasswordHashingBusy):
+            self.user.check_password('testpass123')
+
+    def test_inline_outside_api_requests(self):
+        """Test commands, the shell and the admin hash inline, never failing as busy"""
+        with self.busy_pool():
+            self.user.set_password('new-pass-123')
+            self.assertTrue(self.user.check_password('new-pass-123'))
+            response = self.client.post('/admin/login/', {'username': 'test@example.com', 'password': 'x'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_busy_rehash_keeps_sign_in(self):
+        """Test a correct password still signs in when its hash upgrade finds the pool busy"""
+        token = hashing.enable_pool()
+        self.addCleanup(hashing.reset_pool, token)
+        with mock.patch.object(hashing, 'verify_password', return_value=(True, True)), \
+                mock.patch.object(hashing, 'make_password', side_effect=PasswordHashingBusy()):
+            self.assertTrue(self.user.check_password('testpass123'))
+
+    def test_acheck_password_uses_pool(self):
+        with mock.patch.object(hashing, 'verify_password', wraps=hashing.verify_password) as verify:
+            self.assertTrue(async_to_sync(self.user.acheck_password)('testpass123'))
+            self.assertFalse(async_to_sync(self.user.acheck_password)('wrong-pass'))
+        self.assertEqual(verify.call_count, 2)
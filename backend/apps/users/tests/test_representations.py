@@ -0,0 +1,87 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.chat.models import Message
+from apps.rooms.models import Room
+from apps.users.representations import UserRepresentationCache, user_representations
+
+User = get_user_model()
+
+
+class UserRepresentationCacheTest(TestCase):
+    """Test UserRepresentationCache"""
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(email=f'u{i}@example.com', name=f'User {i}', password='pass12345')
+            for i in range(3)
+        ]
+        self.cache = UserRepresentationCache(ttl=60)
+
+    def test_get_many_loads_misses_in_one_query(self):
+        ids = [u.id for u in self.users]
+        with self.assertNumQueries(1):
+            first = self.cache.get_many('summary', ids)
+        with self.assertNumQueries(0):
+            second = self.cache.get_many('summary', ids)
+        self.assertEqual(first, second)
+        self.assertEqual(first[self.users[0].id], {'id': self.users[0].id, 'email': 'u0@example.com', 'name': 'User 0'})
+
+    def test_kinds_are_cached_separately(self):
+        profile = self.cache.get('profile', self.users[0].id)
+        self.assertIn('date_joined', profile)
+        self.assertNotIn('date_joined', self.cache.get('summary', self.users[0].id))
+
+    def test_profile_change_invalidates(self):
+        user = self.users[0]
+        self.cache.get('summary', user.id)
+        user.name = 'Renamed'
+        user.save()
+        self.assertEqual(self.cache.get('summary', user.id)['name'], 'Renamed')
+
+    def test_missing_user(self):
+        self.assertIsNone(self.cache.get('summary', 999999))
+
+
+class CachedUserSerializationTest(TestCase):
+    """Test nested users in room and message lists come from the cache"""
+
+    def setUp(self):
+        user_representations.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='user@example.com', name='User', password='pass12345')
+        self.client.force_authenticate(user=self.user)
+        self.room = None
+        for i in range(5):
+            creator = User.objects.create_user(email=f'c{i}@example.com', name=f'C{i}', password='pass12345')
+            self.room = Room.objects.create(name=f'Room {i}', creator=creator)
+            Message.objects.create(room=self.room, user=creator, content='hi')
+            Message.objects.create(room=self.room, user=self.user, content='hello')
+
+    def test_room_list_has_no_per_creator_queries(self):
+        with CaptureQueriesContext(connection) as cold:
+            response = self.client.get('/api/rooms/')
+        self.assertEqual(response.data[0]['creator']['name'], response.data[0]['creator_name'])
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get('/api/rooms/')
+        self.assertLess(len(warm), len(cold))
+        user_queries = [q for q in warm.captured_queries if 'users_user' in q['sql']]
+        self.assertEqual(user_queries, [])
+
+    def test_message_authors_serialized_once(self):
+        url = f'/api/rooms/{self.room.id}/messages/'
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as warm:
+            response = self.client.get(url)
+        self.assertEqual({m['user']['name'] for m in response.data['results']}, {'C4', 'User'})
+        self.assertFalse([q for q in warm.captured_queries if 'users_user' in q['sql']])
+
+    def test_profile_update_reflected_in_messages(self):
+        url = f'/api/rooms/{self.room.id}/messages/'
+        self.client.get(url)
+        self.client.patch('/api/auth/profile/', {'name': 'Renamed'}, format='json')
+        names = {m['user']['name'] for m in self.client.get(url).data['results']}
+        self.assertIn('Renamed', names)
@@ -0,0 +1,150 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from apps.users.models import RevokedToken
+from apps.users.revocation import RevocationList, revocations
+
+User = get_user_model()
+
+
+class RevocationListTest(TestCase):
+    """Test RevocationList"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', name='User', password='pass12345')
+
+    def test_revoke_applies_locally_and_persists(self):
+        """Test a revoked jti is known immediately and stored in the table"""
+        local = RevocationList(sync_interval=60)
+        token = AccessToken.for_user(self.user)
+        self.assertFalse(local.is_revoked(token['jti']))
+        local.revoke(token, user=self.user)
+        self.assertTrue(local.is_revoked(token['jti']))
+        self.assertTrue(RevokedToken.objects.filter(jti=token['jti'], user=self.user).exists())
+
+    def test_other_process_syncs_incrementally(self):
+        """Test another process picks revocations up on its next sync, reading only new rows"""
+        writer = RevocationList(sync_interval=60)
+        reader = RevocationList(sync_interval=0, background=False)
+        first, second = AccessToken.for_user(self.user), AccessToken.for_user(self.user)
+        writer.revoke(first)
+        self.assertTrue(reader.is_revoked(first['jti']))
+        writer.revoke(second)
+        with self.assertNumQueries(1):
+            self.assertTrue(reader.is_revoked(second['jti']))
+        self.assertEqual(reader._since, RevokedToken.objects.get(jti=second['jti']).revoked_at)
+
+    def test_rows_committed_out_of_order_not_skipped(self):
+        """Test a row revoked just before the newest one seen is still picked up"""
+        reader = RevocationList(sync_interval=0, background=False)
+        RevocationList(sync_interval=60).revoke(AccessToken.for_user(self.user))
+        reader.sync()
+        late = AccessToken.for_user(self.user)
+        RevocationList(sync_interval=60).revoke(late)
+        RevokedToken.objects.filter(jti=late['jti']).update(revoked_at=reader._since - timedelta(seconds=5))
+        self.assertTrue(reader.is_revoked(late['jti']))
+
+    def test_refresh_after_first_load_runs_in_background(self):
+        """Test only the first lookup queries on the calling thread"""
+        reader = RevocationList(sync_interval=0)
+        reader.is_revoked('warm-up')
+        with mock.patch.object(reader, '_sync_in_background') as background, \
+                mock.patch.object(connection, 'in_atomic_block', False):
+            with self.assertNumQueries(0):
+                reader.is_revoked('some-jti')
+        background.assert_called_once()
+
+    def test_purge_deletes_expired_rows(self):
+        """Test rows of expired tokens are deleted from the table"""
+        expired, live = AccessToken.for_user(self.user), AccessToken.for_user(self.user)
+        expired['exp'] = int(time.time()) - 10
+        revocation_list = RevocationList(sync_interval=60)
+        revocation_list.revoke(expired)
+        revocation_list.revoke(live)
+        self.assertEqual(revocation_list.purge(), 1)
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), [live['jti']])
+
+    def test_lookup_never_purges(self):
+        """Test syncs on the request path leave expired rows to the background purge"""
+        expired = AccessToken.for_user(self.user)
+        expired['exp'] = int(time.time()) - 10
+        RevocationList(sync_interval=60).revoke(expired)
+        reader = RevocationList(sync_interval=0)
+        reader.is_revoked('first-load')
+        reader.is_revoked('inline-refresh')
+        self.assertTrue(RevokedToken.objects.filter(jti=expired['jti']).exists())
+
+    def test_purge_command(self):
+        """Test purge_revoked_tokens deletes expired rows"""
+        from io import StringIO
+        from django.core.management import call_command
+        expired = AccessToken.for_user(self.user)
+        expired['exp'] = int(time.time()) - 10
+        RevocationList(sync_interval=60).revoke(expired)
+        out = StringIO()
+        call_command('purge_revoked_tokens', stdout=out)
+        self.assertIn('Deleted 1', out.getvalue())
+        self.assertFalse(RevokedToken.objects.exists())
+
+    def test_no_queries_between_syncs(self):
+        """Test lookups between syncs are answered from memory"""
+        reader = RevocationList(sync_interval=60)
+        reader.is_revoked('warm-up')
+        with self.assertNumQueries(0):
+            for _ in range(100):
+                self.assertFalse(reader.is_revoked('some-jti'))
+
+    def test_expired_entries_pruned(self):
+        """Test revocations of already expired tokens are dropped from memory"""
+        reader = RevocationList(sync_interval=0, background=False)
+        token = AccessToken.for_user(self.user)
+        token['exp'] = int(time.time()) - 10
+        reader.revoke(token)
+        reader.sync()
+        self.assertEqual(len(reader), 0)
+
+
+class LogoutRevocationTest(TestCase):
+    """Test logout revokes tokens for REST, refresh and WebSocket auth"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='user@example.com', name='User', password='pass12345')
+        self.refresh = RefreshToken.for_user(self.user)
+        self.access = str(self.refresh.access_token)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+    def test_access_token_rejected_after_logout(self):
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, status.HTTP_200_OK)
+        response = self.client.post('/api/auth/logout/', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_token_rejected_after_logout(self):
+        self.client.post('/api/auth/logout/', {'refresh': str(self.refresh)}, format='json')
+        response = APIClient().post('/api/auth/token/refresh/', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_other_users_refresh_token_not_revoked(self):
+        """Test logout only revokes a refresh token belonging to the caller"""
+        other = User.objects.create_user(email='other@example.com', name='Other', password='pass12345')
+        other_refresh = RefreshToken.for_user(other)
+        self.client.post('/api/auth/logout/', {'refresh': str(other_refresh)}, format='json')
+        self.assertFalse(revocations.is_revoked(other_refresh['jti']))
+
+    def test_ws_auth_rejects_revoked_token(self):
+        """Test the WebSocket token check uses the revocation list"""
+        from apps.chat.middleware import TokenAuthMiddleware
+        middleware = TokenAuthMiddleware(None)
+        self.assertEqual(middleware._validate_and_get_user(self.access), self.user)
+        self.client.post('/api/auth/logout/')
+        with self.assertRaises(Exception):
+            middleware._validate_and_get_user(self.access)
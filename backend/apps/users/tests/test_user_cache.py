@@ -0,0 +1,121 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.common.metrics import REGISTRY
+from apps.users.user_cache import UserCache, user_cache
+
+User = get_user_model()
+
+
+class UserCacheTest(TestCase):
+    """Test UserCache"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', name='User', password='pass12345')
+        self.cache = UserCache(ttl=30, max_size=2)
+
+    def test_put_and_get_returns_copy(self):
+        """Test cached users come back as separate instances"""
+        self.cache.put(self.user.id, self.user, self.cache.version(self.user.id))
+        first, second = self.cache.get(self.user.id), self.cache.get(str(self.user.id))
+        self.assertEqual(first, self.user)
+        self.assertIsNot(first, second)
+        first.name = 'Changed'
+        self.assertEqual(self.cache.get(self.user.id).name, 'User')
+
+    def test_bump_invalidates_entry(self):
+        self.cache.put(self.user.id, self.user, self.cache.version(self.user.id))
+        self.cache.bump(self.user.id)
+        self.assertIsNone(self.cache.get(self.user.id))
+
+    def test_fill_racing_with_bump_is_ignored(self):
+        """Test a user loaded before a bump is not served after it"""
+        version = self.cache.version(self.user.id)
+        self.cache.bump(self.user.id)
+        self.cache.put(self.user.id, self.user, version)
+        self.assertIsNone(self.cache.get(self.user.id))
+
+    def test_old_versions_are_pruned(self):
+        """Test versions are dropped once every cache entry they guard has expired"""
+        from unittest import mock
+        cache = UserCache(ttl=30)
+        with self.settings(USER_REPRESENTATION_CACHE_TTL=60), \
+                mock.patch('apps.users.user_cache.time.monotonic', return_value=1000.0):
+            for user_id in range(100):
+                cache.bump(user_id)
+        with self.settings(USER_REPRESENTATION_CACHE_TTL=60), \
+                mock.patch('apps.users.user_cache.time.monotonic', return_value=1061.0):
+            cache.bump('new')
+        self.assertEqual(list(cache._versions), ['new'])
+        self.assertEqual(cache.version(1), 0)
+
+    def test_expired_entry_is_a_miss(self):
+        cache = UserCache(ttl=-1)
+        cache.put(self.user.id, self.user, 0)
+        self.assertIsNone(cache.get(self.user.id))
+        self.assertEqual(len(cache), 0)
+
+    def test_size_is_bounded(self):
+        for user_id in (1, 2, 3):
+            self.cache.put(user_id, self.user, 0)
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.get(1))
+
+
+@override_settings(AUTH_USER_CACHE_TTL=30)
+class CachedUserAuthenticationTest(TestCase):
+    """Test REST authentication through the user cache"""
+
+    def setUp(self):
+        user_cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='user@example.com', name='User', password='pass12345')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_second_request_skips_user_lookup(self):
+        self.client.get('/api/auth/profile/')
+        hits = user_cache._hits.value
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(user_cache._hits.value, hits + 1)
+
+    def test_profile_update_invalidates(self):
+        self.client.get('/api/auth/profile/')
+        self.client.patch('/api/auth/profile/', {'name': 'Renamed'}, format='json')
+        response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.data['name'], 'Renamed')
+
+    def test_login_keeps_cached_user(self):
+        """Test the last_login save of a sign-in does not invalidate the user"""
+        self.client.get('/api/auth/profile/')
+        version = user_cache.version(self.user.id)
+        response = APIClient().post('/api/auth/login/', {'email': 'user@example.com', 'password': 'pass12345'},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(user_cache.version(self.user.id), version)
+        with self.assertNumQueries(0):
+            self.client.get('/api/auth/profile/')
+
+    def test_deactivation_invalidates(self):
+        """Test a deactivated user is rejected on the next request"""
+        self.client.get('/api/auth/profile/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_delete_invalidates(self):
+        self.client.get('/api/auth/profile/')
+        self.client.delete('/api/auth/profile/')
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_hit_rate_exported(self):
+        self.client.get('/api/auth/profile/')
+        self.client.get('/api/auth/profile/')
+        exposition = REGISTRY.expose()
+        self.assertIn('auth_user_cache_lookups_total{result="hit"}', exposition)
+        self.assertIn('auth_user_cache_hit_ratio ', exposition)
+        self.assertGreater(user_cache.hit_rate(), 0)
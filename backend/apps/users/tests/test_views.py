@@ -70,6 +70,24 @@ class UserRegistrationViewTest(TestCase):
         self.assertIn('password', response.data)
 
 
+    def test_register_busy_hashing_pool(self):
+        """Test a saturated hashing pool answers registrations with 503 and Retry-After"""
+        from unittest import mock
+        from apps.users import hashing
+        busy = hashing.PasswordHashPool(workers=1, max_pending=1)
+        busy.pending = 1
+        data = {
+            'name': 'Busy User',
+            'email': 'busy@example.com',
+            'password': 'testpass123',
+            'confirm_password': 'testpass123',
+        }
+        with mock.patch.object(hashing, 'get_pool', return_value=busy):
+            response = self.client.post(self.register_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+
+
 class UserLoginViewTest(TestCase):
     """Test user login endpoint"""
     
@@ -111,6 +129,34 @@ class UserLoginViewTest(TestCase):
         response = self.client.post(self.login_url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
     
+    def test_login_verifies_password_once(self):
+        """Test a login runs a single password verification"""
+        from unittest import mock
+        from apps.users import hashing
+        data = {
+            'email': 'test@example.com',
+            'password': 'testpass123'
+        }
+        with mock.patch.object(hashing, 'verify_password', wraps=hashing.verify_password) as verify:
+            response = self.client.post(self.login_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(verify.call_count, 1)
+
+    def test_login_busy_hashing_pool(self):
+        """Test a saturated hashing pool rejects logins with 503 and Retry-After"""
+        from unittest import mock
+        from apps.users import hashing
+        busy = hashing.PasswordHashPool(workers=1, max_pending=1)
+        busy.pending = 1
+        data = {
+            'email': 'test@example.com',
+            'password': 'testpass123'
+        }
+        with mock.patch.object(hashing, 'get_pool', return_value=busy):
+            response = self.client.post(self.login_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+
     def test_login_inactive_user(self):
         """Test login with inactive user returns 401"""
         self.user.is_active = False
@@ -205,3 +251,51 @@ class UserLogoutViewTest(TestCase):
         response = self.client.post(self.logout_url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+
+
+class UserLookupViewTest(TestCase):
+    """Test UserLookupView"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.users = [
+            User.objects.create_user(email=f'u{i}@example.com', name=f'User {i}', password='pass12345')
+            for i in range(3)
+        ]
+        self.client.force_authenticate(user=self.users[0])
+        self.url = '/api/auth/users/'
+
+    def test_lookup_names(self):
+        ids = ','.join(str(u.id) for u in self.users)
+        response = self.client.get(f'{self.url}?ids={ids},999999')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['users'], {str(u.id): {'name': u.name} for u in self.users})
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('max-age=', response['Cache-Control'])
+
+    def test_etag_not_modified(self):
+        url = f'{self.url}?ids={self.users[1].id}'
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_etag_changes_with_name(self):
+        url = f'{self.url}?ids={self.users[1].id}'
+        etag = self.client.get(url)['ETag']
+        self.users[1].name = 'Renamed'
+        self.users[1].save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_invalid_and_too_many_ids(self):
+        self.assertEqual(self.client.get(f'{self.url}?ids=1,x').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        with self.settings(USER_LOOKUP_MAX_IDS=2):
+            response = self.client.get(f'{self.url}?ids=1,2,3')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_requires_authentication(self):
+        response = APIClient().get(f'{self.url}?ids=1')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
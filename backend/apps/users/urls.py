@@ -1,11 +1,15 @@
 from django.urls import path
-from apps.users.api.views import UserRegistrationView, UserLoginView, UserProfileView, UserLogoutView
-from rest_framework_simplejwt.views import TokenRefreshView
+from apps.users.api.views import (
+    UserRegistrationView, UserLoginView, UserProfileView, UserLogoutView, BulkUserCreateView,
+    UserTokenRefreshView, UserLookupView,
+)
 
 urlpatterns = [
     path('register/', UserRegistrationView.as_view(), name='user-registration'),
     path('login/', UserLoginView.as_view(), name='user-login'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('token/refresh/', UserTokenRefreshView.as_view(), name='token-refresh'),
     path('profile/', UserProfileView.as_view(), name='user-profile'),
     path('logout/', UserLogoutView.as_view(), name='user-logout'),
+    path('users/', UserLookupView.as_view(), name='user-lookup'),
+    path('users/bulk/', BulkUserCreateView.as_view(), name='user-bulk-create'),
 ]
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""Per-process cache of the users resolved by JWT authentication.
+
+Every authenticated REST call would otherwise start with a primary-key
+lookup of the token's user. Resolved users are kept for AUTH_USER_CACHE_TTL
+seconds (0 disables the cache). Each user id has a version counter that is
+bumped whenever that user is saved or deleted (profile edits, deactivation,
+password changes); an entry filled under an older version is ignored, even
+if the fill raced with the bump. Other processes see such changes once
+their entry expires. Hits and misses are exported on /metrics.
+
+Versions are kept only until every cache that checks them (this one and
+apps.users.representations) has expired the entries filled before the bump;
+after that an id falls back to version 0, so the table stays as small as
+the set of recently saved users.
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+
+from apps.common.metrics import auth_user_cache_lookups
+
+
+class UserCache:
+    def __init__(self, ttl: float = None, max_size: int = None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = {}  # user id -> (user, version, expires)
+        self._versions = {}  # user id -> (version, monotonic time of the bump)
+        self._next_prune = 0.0
+        self._lock = threading.Lock()
+        self._hits = auth_user_cache_lookups.labels('hit')
+        self._misses = auth_user_cache_lookups.labels('miss')
+
+    def _ttl(self) -> float:
+        if self.ttl is not None:
+            return self.ttl
+        return getattr(settings, 'AUTH_USER_CACHE_TTL', 0)
+
+    def _max_size(self) -> int:
+        if self.max_size is not None:
+            return self.max_size
+        return getattr(settings, 'AUTH_USER_CACHE_SIZE', 10000)
+
+    def _retention(self) -> float:
+        # Entries filled before a bump must have expired in every cache using versions
+        return max(self._ttl(), getattr(settings, 'USER_REPRESENTATION_CACHE_TTL', 60), 0)
+
+    def version(self, user_id) -> int:
+        entry = self._versions.get(str(user_id))
+        return entry[0] if entry is not None else 0
+
+    def get(self, user_id):
+        """A private copy of the cached user, or None"""
+        if self._ttl() <= 0:
+            return None
+        key = str(user_id)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] != self.version(key) or entry[2] < time.monotonic():
+            self._misses.inc()
+            return None
+        self._hits.inc()
+        # Views may modify request.user; never hand out the shared instance
+        return copy.copy(entry[0])
+
+    def put(self, user_id, user, version: int):
+        """Store a user loaded while version() returned `version`"""
+        ttl = self._ttl()
+        if ttl <= 0:
+            return
+        key = str(user_id)
+        with self._lock:
+            if len(self._entries) >= self._max_size() and key not in self._entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (copy.copy(user), version, time.monotonic() + ttl)
+
+    def bump(self, user_id):
+        key = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            version = self._versions[key][0] if key in self._versions else 0
+            self._versions[key] = (version + 1, now)
+            self._entries.pop(key, None)
+            if now >= self._next_prune:
+                retention = self._retention()
+                cutoff = now - retention
+                self._versions = {k: v for k, v in self._versions.items() if v[1] >= cutoff}
+                self._next_prune = now + max(retention, 1.0)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def hit_rate(self) -> float:
+        total = self._hits.value + self._misses.value
+        return self._hits.value / total if total else 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+user_cache = UserCache()
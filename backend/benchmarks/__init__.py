@@ -0,0 +1 @@
+"""Micro-benchmarks. Run from the backend directory, e.g. `python -m benchmarks.bench_redaction`."""
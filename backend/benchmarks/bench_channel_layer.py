@@ -0,0 +1,99 @@
+"""Group fan-out throughput and latency of the channel layers.
+
+Each room has --members receivers looping on receive(), like ChatConsumer
+instances, and one sender doing group_send. Compares Channels'
+InMemoryChannelLayer, apps.chat.layers.LocalChannelLayer and, when
+channels_redis is installed and --redis points at a reachable server,
+RedisChannelLayer. Use a local stand-in such as
+`docker run --rm -p 6379:6379 redis:7` rather than a shared instance:
+
+    python -m benchmarks.bench_channel_layer --rooms 20 --members 50 --messages 200 --redis 127.0.0.1:6379
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from channels.layers import InMemoryChannelLayer  # noqa: E402
+
+from apps.chat.layers import LocalChannelLayer  # noqa: E402
+
+
+async def receiver(layer, channel, expected, latencies):
+    for _ in range(expected):
+        message = await layer.receive(channel)
+        latencies.append(time.perf_counter() - message['sent'])
+
+
+async def sender(layer, group, messages):
+    for i in range(messages):
+        await layer.group_send(group, {'type': 'chat.message', 'sent': time.perf_counter(),
+                                       'message': {'id': i, 'content': 'x' * 80}})
+        await asyncio.sleep(0)  # let receivers drain, as a real sender would yield between frames
+
+
+async def run(layer, rooms, members, messages):
+    latencies = []
+    receivers = []
+    for room in range(rooms):
+        for _ in range(members):
+            channel = await layer.new_channel()
+            await layer.group_add(f'room_{room}', channel)
+            receivers.append(asyncio.ensure_future(receiver(layer, channel, messages, latencies)))
+    started = time.perf_counter()
+    await asyncio.gather(*(sender(layer, f'room_{room}', messages) for room in range(rooms)))
+    await asyncio.wait_for(asyncio.gather(*receivers), timeout=120)
+    elapsed = time.perf_counter() - started
+    await layer.flush()
+    latencies.sort()
+    return len(latencies) / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.99)]
+
+
+def redis_layer(address):
+    if not address:
+        return None
+    try:
+        from channels_redis.core import RedisChannelLayer
+    except ImportError:
+        print('channels_redis is not installed; skipping the Redis layer')
+        return None
+    host, _, port = address.partition(':')
+    try:
+        socket.create_connection((host, int(port or 6379)), timeout=1).close()
+    except OSError:
+        print(f'No Redis at {address}; skipping the Redis layer')
+        return None
+    return RedisChannelLayer(hosts=[(host, int(port or 6379))], capacity=1000)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--members', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--redis', default='', help='host:port of a local Redis to compare against')
+    args = parser.parse_args()
+
+    print(f'{args.rooms} rooms x {args.members} members, {args.messages} messages per room')
+    layers = [
+        ('InMemoryChannelLayer', InMemoryChannelLayer(capacity=1000)),
+        ('LocalChannelLayer', LocalChannelLayer(capacity=1000)),
+    ]
+    redis = redis_layer(args.redis)
+    if redis is not None:
+        layers.append(('RedisChannelLayer', redis))
+    for label, layer in layers:
+        rate, median, p99 = asyncio.run(run(layer, args.rooms, args.members, args.messages))
+        print(f'{label:<22}: {rate:>10.0f} deliveries/s  latency median {median * 1000:.2f} ms, p99 {p99 * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Logging cost per chat message: eager f-strings vs. lazy arguments, level guards and sampling."""
+import io
+import logging
+import time
+
+from apps.common.logging_utils import JsonFormatter, RequestContextFilter, SamplingFilter, set_request_context
+
+VERBOSE = '%(asctime)s | %(levelname)s | %(name)s | req=%(req_id)s user=%(user_id)s room=%(room_id)s | %(message)s'
+SIGNALS_PER_MESSAGE = 3  # ICE candidates usually outnumber chat lines during a call
+
+
+def make_logger(level, formatter=None, rates=None):
+    logger = logging.getLogger(f'bench.chat.{id(formatter)}.{level}.{bool(rates)}')
+    logger.handlers.clear()
+    logger.propagate = False
+    logger.setLevel(level)
+    handler = logging.StreamHandler(io.StringIO())
+    handler.setFormatter(formatter or logging.Formatter(VERBOSE))
+    handler.addFilter(SamplingFilter(rates=rates))
+    handler.addFilter(RequestContextFilter())
+    logger.addHandler(handler)
+    return logger, handler
+
+
+def eager(logger, i, text):
+    for _ in range(SIGNALS_PER_MESSAGE):
+        logger.debug(f"WS SIGNAL type={'webrtc-ice-candidate'} size={len(text)}")
+    logger.info(f"WS CHAT msg_id={i} len={len(text)}")
+
+
+def lazy(logger, i, text):
+    for _ in range(SIGNALS_PER_MESSAGE):
+        if logger.isEnabledFor(logging.DEBUG):
+            size = len(text)
+            logger.debug("WS SIGNAL type=%s size=%s", 'webrtc-ice-candidate', size,
+                         extra={'signal_type': 'webrtc-ice-candidate', 'size': size})
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("WS CHAT msg_id=%s len=%s", i, len(text), extra={'msg_id': i, 'length': len(text)})
+
+
+def run(emit, logger, messages: int) -> float:
+    text = 'hello there ' * 8
+    started = time.perf_counter()
+    for i in range(messages):
+        emit(logger, i, text)
+    return (time.perf_counter() - started) / messages * 1e6
+
+
+def main(messages: int = 50_000):
+    set_request_context(req_id='ws-bench', user_id='1', room_id='1')
+    scenarios = [
+        ('WARNING, eager f-strings', eager, make_logger(logging.WARNING)),
+        ('WARNING, lazy + guards', lazy, make_logger(logging.WARNING)),
+        ('DEBUG text, eager, no sampling', eager, make_logger(logging.DEBUG)),
+        ('DEBUG text, lazy, SIGNAL 1%', lazy, make_logger(logging.DEBUG, rates={'WS SIGNAL': 0.01})),
+        ('DEBUG json, lazy, SIGNAL 1%', lazy, make_logger(logging.DEBUG, JsonFormatter(), {'WS SIGNAL': 0.01})),
+    ]
+    for label, emit, (logger, handler) in scenarios:
+        us = run(emit, logger, messages)
+        print(f'{label:<32}: {us:>7.2f} us/message  ({len(handler.stream.getvalue().splitlines())} lines)')
+
+
+if __name__ == '__main__':
+    main()
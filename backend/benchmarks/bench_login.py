@@ -0,0 +1,87 @@
+"""Login verification throughput, and how late other work gets, with inline hashing vs. the hashing pool.
+
+Pinned to a fixed number of cores (worker processes inherit the affinity):
+
+    python -m benchmarks.bench_login --cores 2 --clients 16 --workers 2
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import hashers  # noqa: E402
+
+from apps.users.hashing import PasswordHashingBusy, PasswordHashPool  # noqa: E402
+
+
+def probe(stop, lateness):
+    """Stands in for everything else on the server: wake every 5 ms and record how late we are"""
+    while not stop.is_set():
+        due = time.perf_counter() + 0.005
+        time.sleep(0.005)
+        lateness.append(time.perf_counter() - due)
+
+
+def run(pool, encoded, clients, seconds):
+    stop = threading.Event()
+    done, rejected, lateness = [0], [0], []
+
+    def client():
+        while not stop.is_set():
+            try:
+                pool.run(hashers.verify_password, 'correct horse', encoded)
+                done[0] += 1
+            except PasswordHashingBusy:
+                rejected[0] += 1
+                time.sleep(0.01)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    threads.append(threading.Thread(target=probe, args=(stop, lateness)))
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    lateness.sort()
+    p99 = lateness[int(len(lateness) * 0.99)] if lateness else 0.0
+    return done[0] / seconds, rejected[0], statistics.median(lateness or [0.0]), p99
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cores', type=int, default=2)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--max-pending', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--iterations', type=int, default=hashers.PBKDF2PasswordHasher.iterations)
+    args = parser.parse_args()
+
+    cores = sorted(os.sched_getaffinity(0))[:args.cores]
+    os.sched_setaffinity(0, cores)
+    encoded = hashers.PBKDF2PasswordHasher().encode('correct horse', hashers.PBKDF2PasswordHasher().salt(), args.iterations)
+    print(f'{len(cores)} cores, {args.clients} concurrent clients, {args.iterations} PBKDF2 iterations')
+
+    pool = PasswordHashPool(workers=args.workers, max_pending=args.max_pending)
+    pool.run(hashers.make_password, 'warm-up')  # start the workers outside the measurement
+    scenarios = [
+        ('inline (request threads)', PasswordHashPool(workers=0, max_pending=0)),
+        (f'pool {args.workers} workers / {args.max_pending} pending', pool),
+    ]
+    for label, candidate in scenarios:
+        rate, rejected, median, p99 = run(candidate, encoded, args.clients, args.seconds)
+        print(f'{label:<30}: {rate:>7.1f} logins/s  {rejected:>6} rejected  '
+              f'probe lateness median {median * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms')
+    pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
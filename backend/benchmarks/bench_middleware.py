@@ -0,0 +1,79 @@
+"""Per-request cost of RequestID + RequestLogging middleware under an async handler.
+
+Compares the previous MiddlewareMixin classes, whose hooks each hop to the
+sync thread via sync_to_async, with the current dual-mode ones.
+"""
+import asyncio
+import os
+import time
+import uuid
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.http import HttpResponse  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django.utils.deprecation import MiddlewareMixin  # noqa: E402
+
+from apps.common.logging_utils import clear_request_context, set_request_context  # noqa: E402
+from apps.common.middleware import RequestIDMiddleware, RequestLoggingMiddleware, logger  # noqa: E402
+from apps.common.metrics import http_request_duration, start_db_timer, stop_db_timer  # noqa: E402
+
+
+class LegacyRequestIDMiddleware(MiddlewareMixin):
+    def process_request(self, request):
+        req_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:12]
+        set_request_context(req_id=req_id, user_id='-')
+        request._req_id = req_id
+
+    def process_response(self, request, response):
+        try:
+            response['X-Request-ID'] = getattr(request, '_req_id', '-')
+        finally:
+            clear_request_context()
+        return response
+
+
+class LegacyRequestLoggingMiddleware(MiddlewareMixin):
+    def process_request(self, request):
+        request._start_ts = time.time()
+        request._db_time = start_db_timer()
+
+    def process_response(self, request, response):
+        try:
+            elapsed = time.time() - getattr(request, '_start_ts', time.time())
+            logger.info(f"HTTP {request.method} {request.path} -> {response.status_code} ({int(elapsed * 1000)} ms)")
+            http_request_duration.labels('bench').observe(elapsed)
+        finally:
+            stop_db_timer()
+        return response
+
+
+async def view(request):
+    return HttpResponse()
+
+
+async def run(chain, requests) -> float:
+    started = time.perf_counter_ns()
+    for request in requests:
+        await chain(request)
+    return (time.perf_counter_ns() - started) / len(requests) / 1000
+
+
+def main(requests: int = 5_000):
+    factory = RequestFactory()
+    batch = [factory.get('/api/rooms/') for _ in range(requests)]
+    legacy = LegacyRequestIDMiddleware(LegacyRequestLoggingMiddleware(view))
+    current = RequestIDMiddleware(RequestLoggingMiddleware(view))
+    logger.disabled = True  # measure the middleware, not the log queue
+    legacy_us = asyncio.run(run(legacy, batch))
+    current_us = asyncio.run(run(current, batch))
+    print(f'MiddlewareMixin (4 thread hops): {legacy_us:>8.1f} us/request')
+    print(f'dual sync/async               : {current_us:>8.1f} us/request  ({legacy_us / current_us:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Records/sec through SensitiveDataFilter, old multi-pass filter vs. the precompiled Redactor."""
+import logging
+import re
+import time
+
+from apps.common.logging_utils import SENSITIVE_KEYS, SensitiveDataFilter
+
+
+class LegacySensitiveDataFilter(logging.Filter):
+    header_re = re.compile(r"(Authorization|Cookie)\s*=\s*[^\s,;]+(?:\s+[^\s,;]+)*", re.IGNORECASE)
+
+    def filter(self, record):
+        msg = str(record.getMessage())
+        msg = self.header_re.sub(r"\1=***", msg)
+        for key in SENSITIVE_KEYS:
+            pattern = re.compile(r'(\"?' + re.escape(key) + r'\"?\s*[:=]\s*)(\".*?\"|[^,}\s]+)', re.IGNORECASE)
+            msg = pattern.sub(r'\1***', msg)
+        msg = re.sub(r'\btoken\w+\b', '***', msg, flags=re.IGNORECASE)
+        record.msg = msg
+        record.args = ()
+        return True
+
+
+MESSAGES = [
+    'WS CHAT msg_id=%s len=%s',
+    'WS SIGNAL type=webrtc-ice-candidate size=%s room=%s',
+    'HTTP GET /api/rooms/%s/messages/ -> 200 (%s ms)',
+    'WS AUTH: failed token validation: Token is invalid or expired %s %s',
+]
+
+HANDLERS = 2  # every logger in LOGGING fans out to console + one file handler
+
+
+def run(filter_factory, records: int) -> float:
+    filters = [filter_factory() for _ in range(HANDLERS)]
+    started = time.perf_counter()
+    for i in range(records):
+        record = logging.LogRecord('apps.chat', logging.INFO, __file__, 1, MESSAGES[i % len(MESSAGES)], (i, i % 97), None)
+        for f in filters:
+            f.filter(record)
+    return records / (time.perf_counter() - started)
+
+
+def main(records: int = 200_000):
+    legacy = run(LegacySensitiveDataFilter, records)
+    current = run(SensitiveDataFilter, records)
+    print(f'legacy filter : {legacy:>12,.0f} records/s')
+    print(f'redactor      : {current:>12,.0f} records/s  ({current / legacy:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
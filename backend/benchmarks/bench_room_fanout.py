@@ -0,0 +1,132 @@
+"""Channel layer traffic of one large room, per listener vs process-local fan-out.
+
+Simulates --processes server processes sharing one layer, with --listeners
+spread evenly over them, and counts how many messages each group_send puts
+through the layer. With a consumer per group member that is one delivery per
+listener; with CHAT_LOCAL_FANOUT each process's RoomFanout gets one delivery
+and hands the event to its listeners in memory. Uses LocalChannelLayer, or
+RedisChannelLayer when channels_redis is installed and --redis points at a
+reachable local server:
+
+    python -m benchmarks.bench_room_fanout --listeners 5000 --processes 8 --messages 20 --redis 127.0.0.1:6379
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from apps.chat.fanout import RoomFanout  # noqa: E402
+from apps.chat.layers import LocalChannelLayer  # noqa: E402
+from benchmarks.bench_channel_layer import redis_layer  # noqa: E402
+
+GROUP = 'room_1'
+
+
+class Listener:
+    """Stands in for a ChatConsumer: renders and 'sends' each frame"""
+
+    def __init__(self, done, expected):
+        self.received = 0
+        self.frame = None
+        self.done = done
+        self.expected = expected
+
+    @staticmethod
+    def render_event(event):
+        return str(event['message'])
+
+    async def chat_message(self, event):
+        self.frame = event.get('text') or self.render_event(event)
+        self.received += 1
+        if self.received == self.expected:
+            self.done()
+
+
+def count_receives(layer):
+    counts = {'deliveries': 0}
+    receive = layer.receive
+
+    async def counting_receive(channel):
+        message = await receive(channel)
+        counts['deliveries'] += 1
+        return message
+
+    layer.receive = counting_receive
+    return counts
+
+
+async def per_listener(layer, listeners, messages, done):
+    tasks = []
+    for _ in range(listeners):
+        listener = Listener(done, messages)
+        channel = await layer.new_channel()
+        await layer.group_add(GROUP, channel)
+
+        async def loop(listener=listener, channel=channel):
+            for _ in range(messages):
+                await listener.chat_message(await layer.receive(channel))
+
+        tasks.append(asyncio.ensure_future(loop()))
+    return tasks
+
+
+async def local_fanout(layer, listeners, processes, messages, done):
+    fanouts = [RoomFanout(layer) for _ in range(processes)]
+    for i in range(listeners):
+        await fanouts[i % processes].join(GROUP, Listener(done, messages))
+    return [task for fanout in fanouts for task in (fanout.reader, fanout.refresher)]
+
+
+async def run(layer, mode, listeners, processes, messages):
+    counts = count_receives(layer)
+    finished = asyncio.Event()
+    remaining = [listeners]
+
+    def done():
+        remaining[0] -= 1
+        if not remaining[0]:
+            finished.set()
+
+    if mode == 'fanout':
+        tasks = await local_fanout(layer, listeners, processes, messages, done)
+    else:
+        tasks = await per_listener(layer, listeners, messages, done)
+    started = time.perf_counter()
+    for i in range(messages):
+        await layer.group_send(GROUP, {'type': 'chat.message', 'room_group': GROUP,
+                                       'message': {'id': i, 'content': 'x' * 80}})
+        await asyncio.sleep(0)
+    await asyncio.wait_for(finished.wait(), timeout=300)
+    elapsed = time.perf_counter() - started
+    for task in tasks:
+        task.cancel()
+    await layer.flush()
+    return counts['deliveries'] / messages, listeners * messages / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--listeners', type=int, default=5000)
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--messages', type=int, default=20)
+    parser.add_argument('--redis', default='', help='host:port of a local Redis to measure instead of LocalChannelLayer')
+    args = parser.parse_args()
+
+    def make_layer():
+        # Capacity covers a burst of every message to one queue
+        return redis_layer(args.redis) or LocalChannelLayer(capacity=max(args.messages, 100))
+
+    print(f'{args.listeners} listeners over {args.processes} processes, {args.messages} messages')
+    for mode in ('per-listener', 'fanout'):
+        per_message, rate = asyncio.run(run(make_layer(), mode, args.listeners, args.processes, args.messages))
+        print(f'{mode:<13}: {per_message:>7.0f} layer deliveries per message  {rate:>10.0f} frames/s to listeners')
+
+
+if __name__ == '__main__':
+    main()
@@ -14,12 +14,18 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.security.websocket import AllowedHostsOriginValidator
 
 from apps.chat.routing import websocket_urlpatterns
+from apps.chat.drain import drainer
 from apps.chat.middleware import TokenAuthMiddlewareStack
+from apps.common.lifespan import lifespan_app
 
 
 _ws_app = TokenAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+drainer.install_signal_handler()
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": (_ws_app if getattr(settings, 'DEBUG', False) else AllowedHostsOriginValidator(_ws_app)),
+    # Servers without lifespan support (daphne) start the log queues lazily on
+    # the first record and drain them at exit.
+    "lifespan": lifespan_app,
 })
@@ -52,6 +52,7 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'apps.common.middleware.RequestIDMiddleware',
     'apps.common.middleware.RequestLoggingMiddleware',
+    'apps.common.middleware.QueryProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,6 +60,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.common.middleware.RequestProfilingMiddleware',
+    'apps.users.middleware.PasswordHashPoolMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -91,6 +94,15 @@ DATABASES = {
 AUTH_USER_MODEL = 'users.User'
 
 
+# PBKDF2 runs in a capped process pool; 0 workers hashes inline
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 32))
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 30))
+PASSWORD_HASH_BULK_WORKERS = int(os.getenv('PASSWORD_HASH_BULK_WORKERS', 2))
+# Rows accepted per POST /api/auth/users/bulk/. Every row with a password is a
+# PBKDF2 hash inside that one request; larger imports go through manage.py bulk_create_users
+BULK_USERS_MAX_ROWS = int(os.getenv('BULK_USERS_MAX_ROWS', 100))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -129,7 +141,12 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG' if DEBUG else 'INFO')
 
-LOG_DIR = BASE_DIR / 'logs'
+LOG_DIR = Path(os.getenv('LOG_DIR', BASE_DIR / 'logs'))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+# 'text' or 'json' (one object per line)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+# Fraction of INFO/DEBUG records kept per event type; warnings and errors are always kept
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', 'WS SIGNAL=0.01')
 try:
     os.makedirs(LOG_DIR, exist_ok=True)
 except Exception:
@@ -145,23 +162,33 @@ LOGGING = {
         'sensitive': {
             '()': 'apps.common.logging_utils.SensitiveDataFilter',
         },
+        'sampling': {
+            '()': 'apps.common.logging_utils.SamplingFilter',
+            'rates': LOG_SAMPLE_RATES,
+        },
     },
     'formatters': {
         'verbose': {
             'format': '%(asctime)s | %(levelname)s | %(name)s | req=%(req_id)s user=%(user_id)s room=%(room_id)s | %(message)s'
         },
+        'json': {
+            '()': 'apps.common.logging_utils.JsonFormatter',
+        },
+        'raw': {
+            'format': '%(message)s',
+        },
     },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
-            'filters': ['request_context', 'sensitive'],
-            'formatter': 'verbose',
+            'filters': ['sensitive'],
+            'formatter': 'json' if LOG_FORMAT == 'json' else 'verbose',
             'level': LOG_LEVEL,
         },
         'file_app': {
             'class': 'logging.handlers.RotatingFileHandler',
-            'filters': ['request_context', 'sensitive'],
-            'formatter': 'verbose',
+            'filters': ['sensitive'],
+            'formatter': 'json' if LOG_FORMAT == 'json' else 'verbose',
             'level': LOG_LEVEL,
             'filename': str(LOG_DIR / 'app.log'),
             'maxBytes': 5 * 1024 * 1024,
@@ -170,61 +197,136 @@ LOGGING = {
         },
         'file_channels': {
             'class': 'logging.handlers.RotatingFileHandler',
-            'filters': ['request_context', 'sensitive'],
-            'formatter': 'verbose',
+            'filters': ['sensitive'],
+            'formatter': 'json' if LOG_FORMAT == 'json' else 'verbose',
             'level': LOG_LEVEL,
             'filename': str(LOG_DIR / 'channels.log'),
             'maxBytes': 5 * 1024 * 1024,
             'backupCount': 3,
             'encoding': 'utf-8',
         },
+        'file_traces': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'formatter': 'raw',
+            'filename': str(LOG_DIR / 'traces.jsonl'),
+            'maxBytes': 20 * 1024 * 1024,
+            'backupCount': 3,
+            'encoding': 'utf-8',
+        },
+        # Loggers only talk to these: the request context is captured on the
+        # calling thread, everything else (redaction, console and file I/O,
+        # rotation) happens on a listener thread.
+        'queue_app': {
+            '()': 'apps.common.logging_utils.BoundedQueueHandler',
+            'handlers': ['console', 'file_app'],
+            'maxsize': LOG_QUEUE_SIZE,
+            'filters': ['sampling', 'request_context'],
+        },
+        'queue_channels': {
+            '()': 'apps.common.logging_utils.BoundedQueueHandler',
+            'handlers': ['console', 'file_channels'],
+            'maxsize': LOG_QUEUE_SIZE,
+            'filters': ['sampling', 'request_context'],
+        },
+        'queue_traces': {
+            '()': 'apps.common.logging_utils.BoundedQueueHandler',
+            'handlers': ['file_traces'],
+            'maxsize': LOG_QUEUE_SIZE,
+        },
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file_app'],
+            'handlers': ['queue_app'],
             'level': 'INFO',
             'propagate': True,
         },
         'django.server': {
-            'handlers': ['console', 'file_app'],
+            'handlers': ['queue_app'],
             'level': 'INFO',
             'propagate': False,
         },
         'channels': {
-            'handlers': ['console', 'file_channels'],
+            'handlers': ['queue_channels'],
             'level': 'INFO',
             'propagate': False,
         },
         'apps.http': {
-            'handlers': ['console', 'file_app'],
+            'handlers': ['queue_app'],
             'level': LOG_LEVEL,
             'propagate': False,
         },
         'apps.chat': {
-            'handlers': ['console', 'file_channels'],
+            'handlers': ['queue_channels'],
             'level': LOG_LEVEL,
             'propagate': False,
         },
         'apps.users': {
-            'handlers': ['console', 'file_app'],
+            'handlers': ['queue_app'],
             'level': LOG_LEVEL,
             'propagate': False,
         },
         'apps.rooms': {
-            'handlers': ['console', 'file_app'],
+            'handlers': ['queue_app'],
             'level': LOG_LEVEL,
             'propagate': False,
         },
+        'apps.traces': {
+            'handlers': ['queue_traces'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     }
 }
 
+# Fraction of chat messages / WS connects traced to LOG_DIR/traces.jsonl (OTLP JSON)
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 0.0))
+
+# Profile single requests / WS frames on demand (signed X-Profile header or staff ?_profile=1)
+REQUEST_PROFILING_ENABLED = os.getenv('REQUEST_PROFILING', 'False').lower() == 'true'
+
+# Per-request query counting and N+1 detection (removes itself when off)
+QUERY_PROFILER_ENABLED = os.getenv('QUERY_PROFILER', 'False').lower() == 'true'
+QUERY_PROFILER_N1_THRESHOLD = int(os.getenv('QUERY_PROFILER_N1_THRESHOLD', 5))
+
+# Bearer token required by /metrics; leave empty to expose it without auth
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Seconds between incremental syncs of revoked token ids from the database
+TOKEN_REVOCATION_SYNC_INTERVAL = float(os.getenv('TOKEN_REVOCATION_SYNC_INTERVAL', 5))
+# How often each process deletes revocation rows of tokens that have expired
+TOKEN_REVOCATION_PURGE_INTERVAL = float(os.getenv('TOKEN_REVOCATION_PURGE_INTERVAL', 3600))
+
+# Seconds an authenticated user stays in the per-process cache (0 disables it)
+AUTH_USER_CACHE_TTL = float(os.getenv('AUTH_USER_CACHE_TTL', 30))
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', 10000))
+
+# Seconds a serialized user (message author, room creator) stays cached per process
+USER_REPRESENTATION_CACHE_TTL = float(os.getenv('USER_REPRESENTATION_CACHE_TTL', 60))
+USER_REPRESENTATION_CACHE_SIZE = int(os.getenv('USER_REPRESENTATION_CACHE_SIZE', 20000))
+
+# GET /api/auth/users/?ids=: most ids per request, and Cache-Control max-age in seconds
+USER_LOOKUP_MAX_IDS = int(os.getenv('USER_LOOKUP_MAX_IDS', 500))
+USER_LOOKUP_MAX_AGE = int(os.getenv('USER_LOOKUP_MAX_AGE', 60))
+
+# WebSocket connect tickets: lifetime in seconds, and an optional shared cache alias
+WS_TICKET_TTL = float(os.getenv('WS_TICKET_TTL', 10))
+WS_TICKET_CACHE = os.getenv('WS_TICKET_CACHE', '')
+
+# Draining before a restart: clients reconnect at random within this many
+# seconds; the signal (name, '' to disable) starts a drain in a server process
+WS_DRAIN_WINDOW = float(os.getenv('WS_DRAIN_WINDOW', 30))
+WS_DRAIN_SIGNAL = os.getenv('WS_DRAIN_SIGNAL', 'SIGUSR1')
+# A drained process that was not restarted accepts sockets again after this many seconds
+WS_DRAIN_TIMEOUT = float(os.getenv('WS_DRAIN_TIMEOUT', 120))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.CachedUserJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'EXCEPTION_HANDLER': 'apps.users.api.exceptions.exception_handler',
 }
 
 SIMPLE_JWT = {
@@ -239,11 +341,36 @@ SIMPLE_JWT = {
 }
 
 
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        'CONFIG': {
-            'hosts': [(os.getenv('REDIS_HOST', '127.0.0.1'), int(os.getenv('REDIS_PORT', 6379)))],
-        },
-    },
+# Subscribe each process once per room and fan events out to its local
+# consumers in memory, instead of one layer delivery per listener
+CHAT_LOCAL_FANOUT = os.getenv('CHAT_LOCAL_FANOUT', 'False').lower() == 'true'
+
+# 'redis' (default) or 'local': an in-process layer for a single server process
+CHANNEL_LAYER = os.getenv('CHANNEL_LAYER', 'redis')
+
+_channel_layer_config = {
+    'capacity': int(os.getenv('CHANNEL_LAYER_CAPACITY', 100)),
+    'expiry': int(os.getenv('CHANNEL_LAYER_EXPIRY', 60)),
+    'group_expiry': int(os.getenv('CHANNEL_LAYER_GROUP_EXPIRY', 86400)),
+    # 'pattern=capacity, ...', e.g. 'websocket.send!*=20'
+    'channel_capacity': os.getenv('CHANNEL_LAYER_CHANNEL_CAPACITY', ''),
 }
+
+if CHANNEL_LAYER == 'local':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'apps.chat.layers.LocalChannelLayer',
+            'CONFIG': _channel_layer_config,
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'apps.chat.redis_layer.ShardedRedisChannelLayer',
+            'CONFIG': {
+                # Comma-separated Redis URLs or host:port pairs, placed by consistent hashing
+                'shards': os.getenv('CHANNEL_REDIS_SHARDS') or f"{os.getenv('REDIS_HOST', '127.0.0.1')}:{os.getenv('REDIS_PORT', 6379)}",
+                **_channel_layer_config,
+            },
+        },
+    }
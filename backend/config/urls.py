@@ -1,8 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from apps.common.views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('apps.users.urls')),
     path('api/rooms/', include('apps.rooms.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
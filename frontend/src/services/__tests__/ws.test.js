@@ -1,5 +1,5 @@
 import { describe, it, expect, vi, beforeEach } from 'vitest';
-import { createRoomWebSocket } from '../ws';
+import { createRoomWebSocket, DRAIN_CLOSE_CODE } from '../ws';
 
 describe('WebSocket service', () => {
   let mockWebSocket;
@@ -194,5 +194,96 @@ describe('WebSocket service', () => {
 
     expect(mockWebSocket._sentMessages.length).toBe(0);
   });
-});
 
+  it('reconnects after the delay a draining server asks for', () => {
+    vi.useFakeTimers();
+    const onOpen = vi.fn();
+    const onMessage = vi.fn();
+    const socket = createRoomWebSocket({
+      baseWsUrl: 'ws://localhost:8000',
+      roomId: 1,
+      token: 'test-token',
+      onOpen,
+      onMessage,
+      onClose: () => {},
+      onError: () => {},
+    });
+    const first = mockWebSocket;
+
+    first._simulateMessage({ type: 'reconnect-after', delay_ms: 1500 });
+    first._simulateClose({ code: DRAIN_CLOSE_CODE, reason: '' });
+    expect(onMessage).not.toHaveBeenCalled();
+
+    vi.advanceTimersByTime(1499);
+    expect(mockWebSocket).toBe(first);
+    vi.advanceTimersByTime(1);
+    expect(mockWebSocket).not.toBe(first);
+    expect(socket.socket).toBe(mockWebSocket);
+
+    mockWebSocket._simulateOpen();
+    expect(onOpen).toHaveBeenCalled();
+    socket.close();
+    vi.useRealTimers();
+  });
+
+  it('retries a refused reconnect with backoff', () => {
+    vi.useFakeTimers();
+    vi.spyOn(Math, 'random').mockReturnValue(0);
+    const socket = createRoomWebSocket({
+      baseWsUrl: 'ws://localhost:8000',
+      roomId: 1,
+      token: 'test-token',
+      onMessage: () => {},
+      onOpen: () => {},
+      onClose: () => {},
+      onError: () => {},
+    });
+
+    mockWebSocket._simulateMessage({ type: 'reconnect-after', delay_ms: 100 });
+    mockWebSocket._simulateClose({ code: DRAIN_CLOSE_CODE, reason: '' });
+    vi.advanceTimersByTime(100);
+    const second = mockWebSocket;
+    second._simulateClose({ code: 1006, reason: '' });
+
+    vi.advanceTimersByTime(499);
+    expect(mockWebSocket).toBe(second);
+    vi.advanceTimersByTime(1);
+    const third = mockWebSocket;
+    expect(third).not.toBe(second);
+    third._simulateClose({ code: 1006, reason: '' });
+    vi.advanceTimersByTime(999);
+    expect(mockWebSocket).toBe(third);
+    vi.advanceTimersByTime(1);
+    expect(mockWebSocket).not.toBe(third);
+
+    mockWebSocket._simulateOpen();
+    const opened = mockWebSocket;
+    opened._simulateClose({ code: 1006, reason: '' });
+    vi.runAllTimers();
+    expect(mockWebSocket).toBe(opened);
+
+    socket.close();
+    vi.restoreAllMocks();
+    vi.useRealTimers();
+  });
+
+  it('does not reconnect after an ordinary close', () => {
+    vi.useFakeTimers();
+    createRoomWebSocket({
+      baseWsUrl: 'ws://localhost:8000',
+      roomId: 1,
+      token: 'test-token',
+      onMessage: () => {},
+      onOpen: () => {},
+      onClose: () => {},
+      onError: () => {},
+    });
+    const first = mockWebSocket;
+
+    first._simulateClose({ code: 1006, reason: '' });
+    vi.runAllTimers();
+
+    expect(mockWebSocket).toBe(first);
+    vi.useRealTimers();
+  });
+});
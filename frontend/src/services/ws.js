@@ -1,15 +1,59 @@
+// Close code of a server draining before a restart. It sends
+// {type: 'reconnect-after', delay_ms} first so clients spread their reconnects.
+export const DRAIN_CLOSE_CODE = 4503;
+
+// A reconnect can land on a process that is still draining, which refuses
+// the handshake (the browser reports 1006); retry with backoff until one opens.
+const RETRY_BASE_MS = 1000;
+const RETRY_MAX_MS = 30000;
+
 export function createRoomWebSocket({ baseWsUrl, roomId, token, onMessage, onOpen, onClose, onError }) {
   const url = `${baseWsUrl.replace(/\/$/, '')}/ws/chat/${roomId}/?token=${encodeURIComponent(token)}`;
-  let socket = new WebSocket(url);
+  let socket;
+  let reconnectDelay = null;
+  let reconnectTimer = null;
+  let reconnecting = false;
+  let retries = 0;
+  let closed = false;
 
-  socket.onopen = () => { onOpen && onOpen(); };
-  socket.onclose = (e) => { onClose && onClose(e); };
-  socket.onerror = (e) => { onError && onError(e); };
-  socket.onmessage = (event) => {
-    try {
-      const data = JSON.parse(event.data);
-      onMessage && onMessage(data);
-    } catch {}
+  const schedule = (delay) => {
+    reconnecting = true;
+    reconnectTimer = setTimeout(connect, delay);
+  };
+
+  const connect = () => {
+    let opened = false;
+    socket = new WebSocket(url);
+    socket.onopen = () => {
+      opened = true;
+      reconnecting = false;
+      retries = 0;
+      onOpen && onOpen();
+    };
+    socket.onclose = (e) => {
+      onClose && onClose(e);
+      if (!closed) {
+        if (e?.code === DRAIN_CLOSE_CODE && reconnectDelay !== null) {
+          schedule(reconnectDelay);
+        } else if (reconnecting && !opened) {
+          const backoff = Math.min(RETRY_MAX_MS, RETRY_BASE_MS * 2 ** retries);
+          retries += 1;
+          schedule(backoff / 2 + Math.random() * backoff / 2);
+        }
+      }
+      reconnectDelay = null;
+    };
+    socket.onerror = (e) => { onError && onError(e); };
+    socket.onmessage = (event) => {
+      try {
+        const data = JSON.parse(event.data);
+        if (data?.type === 'reconnect-after') {
+          reconnectDelay = Math.max(0, Number(data.delay_ms) || 0);
+          return;
+        }
+        onMessage && onMessage(data);
+      } catch {}
+    };
   };
 
   const sendJson = (obj) => {
@@ -19,9 +63,11 @@ export function createRoomWebSocket({ baseWsUrl, roomId, token, onMessage, onOpe
   };
 
   const close = () => {
+    closed = true;
+    clearTimeout(reconnectTimer);
     try { socket.close(); } catch {}
   };
 
-  return { sendJson, close, socket };
+  connect();
+  return { sendJson, close, get socket() { return socket; } };
 }
-